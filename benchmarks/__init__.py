@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import datetime
+import os
+import sys
+
+"""
+    benchmarks
+    ----------
+
+    Benchmarks of pg_fts write and query paths, run with::
+
+        python -m benchmarks --sizes 10000,1000000 --output results.json
+
+    and the concurrent load with::
+
+        python -m benchmarks.load --readers 8 --writers 2 --output load.json
+
+    @author: David Miguel
+
+"""
+
+
+def setup(database):
+    """
+    Configures django with the ``testapp`` models, the connection with the
+    environment variables ``PGUSER``, ``PGPASSWORD``, ``PGHOST`` and
+    ``PGPORT``, the test database is ``test_<database>``
+    """
+    import django
+    from django.conf import settings
+    settings.configure(
+        DEBUG=False,
+        DATABASES={
+            'default': {
+                'ENGINE': 'django.db.backends.postgresql_psycopg2',
+                'NAME': database,
+                'USER': os.environ.get('PGUSER', ''),
+                'PASSWORD': os.environ.get('PGPASSWORD', ''),
+                'HOST': os.environ.get('PGHOST', 'localhost'),
+                'PORT': os.environ.get('PGPORT', ''),
+            }
+        },
+        INSTALLED_APPS=(
+            'django.contrib.contenttypes',
+            'pg_fts',
+            'testapp'
+        ),
+    )
+    django.setup()
+
+
+def get_meta(**extra):
+    """
+    :returns: dict with the date and versions of pg_fts, django, python and
+        PostgreSQL, and ``extra``
+    """
+    import django
+    import pg_fts
+    from django.db import connection
+    with connection.cursor() as cursor:
+        cursor.execute('SHOW server_version')
+        server_version = cursor.fetchone()[0]
+    meta = {
+        'date': datetime.datetime.utcnow().isoformat(),
+        'pg_fts': pg_fts.__VERSION__,
+        'django': django.get_version(),
+        'python': sys.version.split()[0],
+        'postgresql': server_version,
+    }
+    meta.update(extra)
+    return meta
+
+
+def write(path, output):
+    """
+    Writes ``output`` to the file ``path``, ``'-'`` for stdout
+    """
+    if path == '-':
+        sys.stdout.write(output + '\n')
+    else:
+        with open(path, 'w') as f:
+            f.write(output + '\n')
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import argparse
+import json
+import sys
+from benchmarks import get_meta, setup, write
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Benchmarks of pg_fts, the results are written as JSON')
+    parser.add_argument('--sizes', default='10000',
+                        help='Comma separated number of rows, ex. '
+                             '10000,1000000,10000000, default 10000')
+    parser.add_argument('--models', default='TSQueryModel,TSMultidicModel',
+                        help='Comma separated testapp models')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Random seed of the corpus, default 0')
+    parser.add_argument('--repeat', type=int, default=20,
+                        help='Queries of each lookup and rank, default 20')
+    parser.add_argument('--database', default='bench',
+                        help='The test database is test_<database>, '
+                             'default bench')
+    parser.add_argument('--keepdb', action='store_true',
+                        help="Doesn't destroy the test database")
+    parser.add_argument('--output', default='-',
+                        help='JSON file, default stdout')
+    args = parser.parse_args(argv)
+
+    setup(args.database)
+    from django.apps import apps
+    from django.db import connection
+    from benchmarks.suite import Benchmark, LANGUAGES
+
+    connection.creation.create_test_db(verbosity=0, keepdb=args.keepdb)
+    results = []
+    try:
+        for name in args.models.split(','):
+            benchmark = Benchmark(apps.get_model('testapp', name),
+                                  LANGUAGES.get(name), args.seed, args.repeat)
+            for size in args.sizes.split(','):
+                sys.stderr.write('%s %s rows\n' % (name, size))
+                results.extend(benchmark.run(int(size)))
+        meta = get_meta(seed=args.seed, repeat=args.repeat)
+    finally:
+        if not args.keepdb:
+            connection.creation.destroy_test_db(
+                connection.settings_dict['NAME'], verbosity=0)
+
+    output = json.dumps({
+        'meta': meta,
+        'results': results,
+    }, indent=2, sort_keys=True)
+    write(args.output, output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import argparse
+import json
+import sys
+
+__all__ = ('compare', )
+
+"""
+    benchmarks.compare
+    ------------------
+
+    Compares two results of the benchmarks::
+
+        python -m benchmarks.compare before.json after.json
+
+    @author: David Miguel
+
+"""
+
+
+def load(path):
+    with open(path) as f:
+        data = json.load(f)
+    return dict(((r['model'], r['rows'], r['name']), r)
+                for r in data['results'])
+
+
+def metric(result):
+    """
+    :returns: ``p50_ms`` of the queries, ``seconds`` of the others
+    """
+    if 'p50_ms' in result:
+        return 'p50_ms', result['p50_ms']
+    return 'seconds', result['seconds']
+
+
+def compare(before, after, threshold=10.0):
+    """
+    :returns: list of ``(key, metric, before, after, change percentage,
+        regression)``, regression if slower more than ``threshold`` percent
+    """
+    rows = []
+    for key in sorted(set(before) & set(after)):
+        name, old = metric(before[key])
+        new = metric(after[key])[1]
+        change = 100.0 * (new - old) / old if old else 0.0
+        rows.append((key, name, old, new, change, change > threshold))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Compares two JSON results of the benchmarks')
+    parser.add_argument('before')
+    parser.add_argument('after')
+    parser.add_argument('--threshold', type=float, default=10.0,
+                        help='Percentage slower reported as regression, '
+                             'default 10')
+    args = parser.parse_args(argv)
+    regressions = 0
+    for key, name, old, new, change, regression in compare(
+            load(args.before), load(args.after), args.threshold):
+        regressions += regression
+        sys.stdout.write('%-18s %9d %-36s %-8s %10.3f %10.3f %+7.1f%%%s\n' % (
+            key + (name, old, new, change, ' REGRESSION' if regression
+                   else '')))
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
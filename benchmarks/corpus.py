@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import random
+
+__all__ = ('Corpus', )
+
+"""
+    benchmarks.corpus
+    -----------------
+
+    Reproducible synthetic multilingual corpus, the same seed generates the
+    same documents and query terms
+
+    @author: David Miguel
+
+"""
+
+WORDS = {
+    'english': (
+        'the of and to in is for on that with as are by this from be at or '
+        'search index query vector text database table column row trigger '
+        'update insert rank weight dictionary language document title body '
+        'postgres django model field lookup result page order limit offset '
+        'crazy same like me world hello article news report market city '
+        'house water music light green river mountain street school paper '
+        'running jumping reading writing building moving working playing'
+    ).split(),
+    'portuguese': (
+        'o a de e que do da em um para com não uma os no se na por mais as '
+        'pesquisa índice consulta vetor texto base tabela coluna linha '
+        'actualização inserção peso dicionário língua documento título corpo '
+        'malucos mesmo como eu mundo olá artigo notícia mercado cidade casa '
+        'água música luz verde rio montanha rua escola papel correndo '
+        'saltando lendo escrevendo construção trabalhando jogando'
+    ).split(),
+}
+
+SYLLABLES = {
+    'english': ('ther', 'ing', 'ent', 'ion', 'and', 'for', 'ver', 'all',
+                'tra', 'con', 'pro', 'ate', 'ous', 'ness', 'ble', 'pre'),
+    'portuguese': ('ção', 'dade', 'men', 'ro', 'ta', 'lha', 'nho', 'par',
+                   'des', 'com', 'pre', 'ar', 'ei', 'ões', 'vel', 'gem'),
+}
+
+
+class Corpus(object):
+    """
+    :param seed: Random seed
+
+    :param languages: dict of language and frequency of the documents
+
+    :param vocabulary: Number of words of each language, the common words
+        and synthetic words of the language syllables
+    """
+
+    def __init__(self, seed=0, languages=None, vocabulary=5000):
+        self.random = random.Random(seed)
+        self.languages = sorted((languages or {'english': 1}).items())
+        self.words = dict(
+            (language, self._vocabulary(language, vocabulary))
+            for language, frequency in self.languages)
+
+    def _vocabulary(self, language, size):
+        words = list(WORDS[language])
+        known = set(words)
+        syllables = SYLLABLES[language]
+        while len(words) < size:
+            word = ''.join(self.random.choice(syllables)
+                           for i in range(self.random.randint(2, 4)))
+            if word not in known:
+                known.add(word)
+                words.append(word)
+        return words
+
+    def language(self):
+        total = sum(frequency for language, frequency in self.languages)
+        value = self.random.random() * total
+        for language, frequency in self.languages:
+            value -= frequency
+            if value < 0:
+                return language
+        return self.languages[-1][0]
+
+    def word(self, language, skip=0):
+        # skewed to the first words, common words are frequent
+        words = self.words[language][skip:]
+        return words[int(len(words) * self.random.random() ** 3)]
+
+    def text(self, language, minimum, maximum):
+        return ' '.join(self.word(language) for i in range(
+            self.random.randint(minimum, maximum)))
+
+    def documents(self, count):
+        """
+        :returns: iterator of ``(title, body, language)``
+        """
+        for i in range(count):
+            language = self.language()
+            yield (self.text(language, 3, 6)[:50],
+                   self.text(language, 40, 200),
+                   language)
+
+    def terms(self, count, words=2):
+        """
+        :returns: list of ``(language, words)`` for the queries
+        """
+        terms = []
+        for i in range(count):
+            language = self.language()
+            # without the first words, the stop words
+            terms.append((language, [self.word(language, 20)
+                                     for j in range(words)]))
+        return terms
@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import argparse
+import json
+import sys
+import threading
+import time
+from django.db import connection
+from pg_fts.migrations import CreateFTSIndexOperation, DeleteFTSIndexOperation
+from benchmarks.corpus import Corpus
+from benchmarks.suite import Benchmark, percentile
+
+__all__ = ('LoadTest', 'parse_index')
+
+"""
+    benchmarks.load
+    ---------------
+
+    Concurrent mixed read/write load, reader threads search while writer
+    threads insert and update through the trigger, for each index
+    configuration::
+
+        python -m benchmarks.load --readers 8 --writers 2 --duration 30 \\
+            --indexes gin gin:fastupdate=off gist
+
+    @author: David Miguel
+
+"""
+
+
+def parse_index(value):
+    """
+    :param value: Index type and storage parameters, ex.
+        ``'gin:fastupdate=off,gin_pending_list_limit=512'``
+
+    :returns: ``(index, options)``
+    """
+    index, sep, parameters = value.partition(':')
+    options = {}
+    for parameter in parameters.split(',') if parameters else []:
+        name, sep, option = parameter.partition('=')
+        if option.lower() in ('on', 'true'):
+            option = True
+        elif option.lower() in ('off', 'false'):
+            option = False
+        elif option.isdigit():
+            option = int(option)
+        options[name] = option
+    return index, options
+
+
+class LoadTest(Benchmark):
+    """
+    :param model: Model of :class:`~benchmarks.suite.Benchmark`
+
+    :param languages: dict of language and frequency of the documents
+
+    :param readers: Number of threads issuing ``search``, ``isearch`` and
+        ranked ``search`` queries
+
+    :param writers: Number of threads issuing ``INSERT`` and ``UPDATE`` of
+        the indexed fields, the vectors are updated by the trigger
+
+    :param duration: Seconds of the load of each index configuration
+
+    :param seed: Random seed of the corpus and queries
+    """
+
+    READS = ('search', 'isearch', 'ranked')
+    WRITES = ('insert', 'update')
+
+    def __init__(self, model, languages=None, readers=4, writers=2,
+                 duration=10, seed=0):
+        super(LoadTest, self).__init__(model, languages, seed)
+        self.readers = readers
+        self.writers = writers
+        self.duration = duration
+
+    def run(self, rows, indexes=(('gin', {}), )):
+        """
+        :param rows: Number of rows in the table before the load
+
+        :param indexes: list of ``(index, options)`` of
+            :class:`~pg_fts.migrations.CreateFTSIndexOperation`
+
+        :returns: list of results of each index and operation
+        """
+        self.results = []
+        self.rows = rows
+        self.index_operation(DeleteFTSIndexOperation, 'gin')
+        for index, options in indexes:
+            name = index + ''.join(
+                '_%s_%s' % (k, {True: 'on', False: 'off'}.get(v, v))
+                for k, v in sorted(options.items()))
+            self.truncate()
+            self.insert(rows)
+            self.results.pop()  # the insert of the corpus isn't measured
+            self.index_operation(CreateFTSIndexOperation, index, **options)
+            self.execute('ANALYZE "%s"' % self.table)
+            self.load(name)
+            self.index_operation(DeleteFTSIndexOperation, index)
+        self.index_operation(CreateFTSIndexOperation, 'gin')
+        return self.results
+
+    def load(self, name):
+        """
+        Runs the readers and writers threads for ``duration`` seconds
+        """
+        stop = time.time() + self.duration
+        timings = []
+        threads = []
+        for i in range(self.readers + self.writers):
+            # each thread merges its own timings at the end, without locks
+            thread_timings = dict((op, []) for op in self.READS + self.WRITES)
+            thread_timings['errors'] = 0
+            timings.append(thread_timings)
+            target = self.read if i < self.readers else self.write
+            threads.append(threading.Thread(
+                target=self._thread, args=(target, stop, i, thread_timings)))
+        start = time.time()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        seconds = time.time() - start
+
+        for op in self.READS + self.WRITES:
+            times = [t for thread_timings in timings
+                     for t in thread_timings[op]]
+            if not times:
+                continue
+            self.add(
+                'load_%s_%s' % (name, op), seconds, len(times),
+                readers=self.readers,
+                writers=self.writers,
+                operations=len(times),
+                mean_ms=sum(times) / len(times),
+                p50_ms=percentile(times, 50),
+                p95_ms=percentile(times, 95),
+                p99_ms=percentile(times, 99),
+                max_ms=max(times))
+        errors = sum(thread_timings['errors'] for thread_timings in timings)
+        if errors:
+            self.add('load_%s_errors' % name, seconds, errors=errors)
+
+    def _thread(self, target, stop, number, timings):
+        try:
+            target(stop, Corpus(self.seed + number + 1, self.languages),
+                   timings)
+        finally:
+            # django connections are per thread
+            connection.close()
+
+    def read(self, stop, corpus, timings):
+        ranks = self.get_ranks()
+        while time.time() < stop:
+            op = self.READS[int(corpus.random.random() * len(self.READS))]
+            language, words = corpus.terms(1)[0]
+            if op == 'ranked':
+                qs = self.get_queryset('search', ranks[1], language, words)
+            else:
+                qs = self.get_queryset(op, None, language, words)
+            self.timed(timings, op, lambda: list(qs))
+
+    def write(self, stop, corpus, timings):
+        while time.time() < stop:
+            title, body, language = next(corpus.documents(1))
+            if corpus.random.random() < 0.5:
+                obj = self.model(title=title, body=body)
+                if self.multiple:
+                    obj.dictionary = language
+                self.timed(timings, 'insert', obj.save)
+            else:
+                pk = corpus.random.randint(1, self.rows)
+                self.timed(timings, 'update', lambda: self.model.objects.filter(
+                    pk=pk).update(body=body))
+
+    def timed(self, timings, op, function):
+        start = time.time()
+        try:
+            function()
+        except Exception:
+            timings['errors'] += 1
+            return
+        timings[op].append((time.time() - start) * 1000)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Concurrent read/write load of pg_fts, the results are '
+                    'written as JSON')
+    parser.add_argument('--model', default='TSQueryModel',
+                        help='testapp model, default TSQueryModel')
+    parser.add_argument('--rows', type=int, default=10000,
+                        help='Rows in the table before the load, '
+                             'default 10000')
+    parser.add_argument('--readers', type=int, default=4,
+                        help='Reader threads, default 4')
+    parser.add_argument('--writers', type=int, default=2,
+                        help='Writer threads, default 2')
+    parser.add_argument('--duration', type=float, default=10,
+                        help='Seconds of load of each index, default 10')
+    parser.add_argument('--indexes', nargs='+',
+                        default=['gin', 'gin:fastupdate=off', 'gist'],
+                        help='Index configurations, ex. gist '
+                             'gin:fastupdate=off,gin_pending_list_limit=512, '
+                             'default gin gin:fastupdate=off gist')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Random seed of the corpus, default 0')
+    parser.add_argument('--database', default='bench',
+                        help='The test database is test_<database>, '
+                             'default bench')
+    parser.add_argument('--keepdb', action='store_true',
+                        help="Doesn't destroy the test database")
+    parser.add_argument('--output', default='-',
+                        help='JSON file, default stdout')
+    args = parser.parse_args(argv)
+
+    from benchmarks import get_meta, setup, write
+    setup(args.database)
+    from django.apps import apps
+    from benchmarks.suite import LANGUAGES
+
+    connection.creation.create_test_db(verbosity=0, keepdb=args.keepdb)
+    try:
+        test = LoadTest(apps.get_model('testapp', args.model),
+                        LANGUAGES.get(args.model), args.readers, args.writers,
+                        args.duration, args.seed)
+        results = test.run(args.rows, [parse_index(i) for i in args.indexes])
+        meta = get_meta(seed=args.seed, readers=args.readers,
+                        writers=args.writers, duration=args.duration)
+    finally:
+        if not args.keepdb:
+            connection.close()
+            connection.creation.destroy_test_db(
+                connection.settings_dict['NAME'], verbosity=0)
+
+    write(args.output, json.dumps({
+        'meta': meta,
+        'results': results,
+    }, indent=2, sort_keys=True))
+    for result in results:
+        if 'p50_ms' in result:
+            sys.stderr.write(
+                '%-56s %8.1f ops/s  p50 %8.2f  p95 %8.2f  p99 %8.2f ms\n' % (
+                    result['name'], result['rows_per_second'],
+                    result['p50_ms'], result['p95_ms'], result['p99_ms']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import time
+from django.apps import apps
+from django.db import connection
+from django.db.migrations.state import ProjectState
+from pg_fts.introspection import PgFTSIntrospection
+from pg_fts.migrations import (CreateFTSIndexOperation,
+                               DeleteFTSIndexOperation, PgFtsSQL,
+                               UpdateVectorOperation)
+from pg_fts.ranks import (FTSRank, FTSRankCd, FTSRankCdDictionary,
+                          FTSRankDictionay)
+from benchmarks.corpus import Corpus
+
+__all__ = ('Benchmark', 'LANGUAGES')
+
+"""
+    benchmarks.suite
+    ----------------
+
+    The benchmarks of the write and query paths of a model with a
+    :class:`~pg_fts.fields.TSVectorField`
+
+    @author: David Miguel
+
+"""
+
+# documents language frequency of the testapp models
+LANGUAGES = {
+    'TSQueryModel': None,
+    'TSMultidicModel': {'english': 7, 'portuguese': 3},
+}
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    index = int(round(percent / 100.0 * (len(values) - 1)))
+    return values[index]
+
+
+class Benchmark(object):
+    """
+    :param model: Model with a ``tsvector`` field updated by the trigger and
+        a ``gin`` index, a ``title``, ``body`` and ``sometext`` fields
+
+    :param languages: dict of language and frequency of the documents, the
+        ``dictionary`` field value in case of multiple dictionaries
+
+    :param seed: Random seed of the corpus and queries
+
+    :param repeat: Number of queries of each lookup and rank
+    """
+
+    LOOKUPS = ('search', 'isearch', 'tsquery')
+    INDEXES = ('gin', 'gist')
+    batch_size = 5000
+    update_rows = 10000
+    sql_creator = PgFtsSQL()
+    introspection = PgFTSIntrospection()
+
+    def __init__(self, model, languages=None, seed=0, repeat=20):
+        self.model = model
+        self.field = model._meta.get_field('tsvector')
+        self.multiple = languages is not None and len(languages) > 1
+        self.languages = languages
+        self.seed = seed
+        self.repeat = repeat
+        self.table = model._meta.db_table
+
+    def run(self, rows):
+        """
+        :returns: list of results of ``rows`` documents
+        """
+        self.results = []
+        self.rows = rows
+        self.truncate()
+        self.insert(rows)
+        self.update()
+        self.rebuild()
+        self.build_indexes()
+        self.queries()
+        return self.results
+
+    def add(self, name, seconds, rows=None, **extra):
+        result = {
+            'model': self.model._meta.object_name,
+            'rows': self.rows,
+            'name': name,
+            'seconds': seconds,
+        }
+        if rows is not None:
+            result['rows_per_second'] = rows / seconds if seconds else None
+        result.update(extra)
+        self.results.append(result)
+        return result
+
+    def execute(self, sql, params=None):
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+
+    def truncate(self):
+        self.execute('TRUNCATE "%s" RESTART IDENTITY CASCADE' % self.table)
+
+    def insert(self, rows):
+        """
+        Inserts the corpus with ``bulk_create``, the trigger computes the
+        vectors
+        """
+        corpus = Corpus(self.seed, self.languages)
+        objs = []
+        start = time.time()
+        for title, body, language in corpus.documents(rows):
+            obj = self.model(title=title, body=body)
+            if self.multiple:
+                obj.dictionary = language
+            objs.append(obj)
+            if len(objs) == self.batch_size:
+                self.model.objects.bulk_create(objs)
+                objs = []
+        if objs:
+            self.model.objects.bulk_create(objs)
+        self.add('insert', time.time() - start, rows)
+        self.execute('ANALYZE "%s"' % self.table)
+
+    def update(self):
+        """
+        ``UPDATE`` of a indexed field, the trigger computes the vectors, and
+        of other field, the trigger isn't called
+        """
+        rows = min(self.rows, self.update_rows)
+        for name, column in (('update', 'body'), ('update_other', 'sometext')):
+            start = time.time()
+            self.execute(
+                'UPDATE "%s" SET %s = COALESCE(%s, \'\') || \' \' '
+                'WHERE id <= %%s' % (self.table, column, column), [rows])
+            self.add(name, time.time() - start, rows)
+
+    def _state(self):
+        return ProjectState.from_apps(apps)
+
+    def rebuild(self):
+        """
+        :class:`~pg_fts.migrations.UpdateVectorOperation` of all the rows
+        """
+        state = self._state()
+        start = time.time()
+        with connection.schema_editor() as schema_editor:
+            # as a migration before the trigger
+            schema_editor.execute(
+                self.sql_creator.skip_trigger(self.model, self.field), ['on'])
+            UpdateVectorOperation(
+                self.model._meta.object_name, 'tsvector').database_forwards(
+                    self.model._meta.app_label, schema_editor, state, state)
+        self.add('rebuild', time.time() - start, self.rows)
+
+    def build_indexes(self):
+        """
+        Time and size of :class:`~pg_fts.migrations.CreateFTSIndexOperation`
+        of each index type, the ``gin`` index is created at the end
+        """
+        self.index_operation(DeleteFTSIndexOperation, 'gin')
+        for index in self.INDEXES:
+            start = time.time()
+            self.index_operation(CreateFTSIndexOperation, index)
+            seconds = time.time() - start
+            with connection.cursor() as cursor:
+                size = self.introspection.get_index_list(
+                    cursor, [self.sql_creator.get_index_name(
+                        self.model, self.field)])[0][3]
+            self.add('index_%s' % index, seconds, self.rows, size=size)
+            self.index_operation(DeleteFTSIndexOperation, index)
+        self.index_operation(CreateFTSIndexOperation, 'gin')
+        self.execute('ANALYZE "%s"' % self.table)
+
+    def index_operation(self, operation, index, **options):
+        state = self._state()
+        with connection.schema_editor() as schema_editor:
+            operation(self.model._meta.object_name, 'tsvector', index,
+                      **options).database_forwards(
+                self.model._meta.app_label, schema_editor, state, state)
+
+    def get_ranks(self):
+        if self.multiple:
+            return (None, FTSRankDictionay, FTSRankCdDictionary)
+        return (None, FTSRank, FTSRankCd)
+
+    def get_queryset(self, lookup, rank, language, words):
+        if lookup == 'tsquery':
+            value = ' | '.join(words)
+        else:
+            value = ' '.join(words)
+        if self.multiple:
+            lookup = 'tsvector__%s__%s' % (language, lookup)
+        else:
+            lookup = 'tsvector__%s' % lookup
+        if rank is None:
+            return self.model.objects.filter(**{lookup: value})[:10]
+        return self.model.objects.annotate(
+            rank=rank(**{lookup: value})).order_by('-rank')[:10]
+
+    def queries(self):
+        """
+        Latency of the lookups, without rank and with each rank class, the
+        first 10 rows
+        """
+        terms = Corpus(self.seed, self.languages).terms(self.repeat)
+        for lookup in self.LOOKUPS:
+            for rank in self.get_ranks():
+                times = []
+                found = 0
+                for language, words in terms:
+                    qs = self.get_queryset(lookup, rank, language, words)
+                    start = time.time()
+                    found += len(list(qs))
+                    times.append((time.time() - start) * 1000)
+                self.add(
+                    'query_%s_%s' % (lookup, rank.__name__ if rank else
+                                     'norank'),
+                    sum(times) / 1000,
+                    queries=len(times),
+                    found=found,
+                    mean_ms=sum(times) / len(times),
+                    p50_ms=percentile(times, 50),
+                    p95_ms=percentile(times, 95),
+                    max_ms=max(times))
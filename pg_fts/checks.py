@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+from django.apps import apps
+from django.core import checks
+from django.db import connections, models, router, DatabaseError
+from pg_fts.fields import TSVectorField
+from pg_fts.introspection import PgFTSIntrospection
+from pg_fts.migrations import PgFtsSQL
+
+__all__ = ('check_database', 'match_source')
+
+"""
+    pg_fts.checks
+    -------------
+
+    System check of the database objects of
+    :class:`~pg_fts.fields.TSVectorField`, runs with
+    ``manage.py check --deploy``
+
+    @author: David Miguel
+
+"""
+
+introspection = PgFTSIntrospection()
+sql_creator = PgFtsSQL()
+
+
+@checks.register('pg_fts', 'database', deploy=True)
+def check_database(app_configs=None, **kwargs):
+    """
+    Checks in the databases of the models that each
+    :class:`~pg_fts.fields.TSVectorField` has a gin or gist index, the
+    trigger or vector function of the current fields and the dictionaries
+    are installed
+    """
+    errors = []
+    if app_configs is None:
+        model_list = apps.get_models()
+    else:
+        model_list = [model for app_config in app_configs
+                      for model in app_config.get_models()]
+    for connection in connections.all():
+        if connection.vendor != 'postgresql':
+            continue
+        try:
+            with connection.cursor() as cursor:
+                errors.extend(
+                    check_connection(connection, cursor, model_list))
+        except DatabaseError:
+            # database not available
+            continue
+    return errors
+
+
+def check_connection(connection, cursor, model_list):
+    errors = []
+    tables = connection.introspection.table_names(cursor)
+    dictionaries = introspection.get_dictionay_list(cursor)
+    for model in model_list:
+        if (model._meta.db_table not in tables or
+                not router.allow_migrate_model(connection.alias, model)):
+            continue
+        for field in model._meta.local_fields:
+            if isinstance(field, TSVectorField):
+                errors.extend(check_dictionaries(field, dictionaries))
+                errors.extend(check_index(cursor, model, field))
+                errors.extend(check_trigger(cursor, model, field))
+    return errors
+
+
+def check_dictionaries(field, dictionaries):
+    try:
+        dict_field = field.model._meta.get_field(field.dictionary)
+        values = [value for value, label in dict_field.choices]
+    except models.FieldDoesNotExist:
+        values = [field.dictionary]
+    return [
+        checks.Error(
+            'Dictionary "%s" is not installed in the database.' % value,
+            hint='Available dictionaries in pg_catalog.pg_ts_config: %s' % (
+                ', '.join(sorted(dictionaries))),
+            obj=field,
+            id='fts.E002'
+        ) for value in values if value not in dictionaries
+    ]
+
+
+def check_index(cursor, model, field):
+    indexes = introspection.get_index_list(
+        cursor, sql_creator.get_index_names(model, field))
+    if any(method in ('gin', 'gist') and valid
+           for name, table, method, size, valid in indexes):
+        return []
+    return [
+        checks.Warning(
+            'No valid gin or gist index, the searches are sequential scans.',
+            hint='Add a migration with CreateFTSIndexOperation('
+                 "name='%s', fts_vector='%s', index='gin')" % (
+                     model._meta.object_name, field.name),
+            obj=field,
+            id='fts.W001'
+        )
+    ]
+
+
+def check_trigger(cursor, model, field):
+    """
+    The source of the trigger function, or vector function, must be the
+    source created by the current fields, weights and dictionary
+    """
+    sources = sql_creator.get_function_sources(model, field)
+    if sources is None:
+        return []
+    name, expected = sources
+    source = introspection.get_function_source(cursor, name)
+    if source is None:
+        return [
+            checks.Warning(
+                'The function "%s" does not exist, the vector is not '
+                'updated.' % name,
+                hint="Add a migration with CreateFTSTriggerOperation("
+                     "name='%s', fts_vector='%s')" % (
+                         model._meta.object_name, field.name),
+                obj=field,
+                id='fts.W002'
+            )
+        ]
+    if not match_source(source, expected):
+        return [
+            checks.Warning(
+                'The function "%s" is outdated, the fields, weights or '
+                'dictionary changed.' % name,
+                hint='Add a migration with DeleteFTSTriggerOperation and '
+                     'CreateFTSTriggerOperation, and update the vectors with '
+                     'UpdateVectorOperation or the fts_rebuild command',
+                obj=field,
+                id='fts.W003'
+            )
+        ]
+    return []
+
+
+def match_source(source, expected):
+    """
+    :returns: ``True`` if the function ``source`` is one of the ``expected``,
+        ignoring whitespace
+    """
+    return ' '.join(source.split()) in [' '.join(e.split()) for e in expected]
@@ -1,15 +1,19 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 from django.db.models import Field, Lookup, Transform
+from django.db.models.expressions import Col
+from django.db.models.sql.where import AND
+from django.utils.tree import Node
 from django.utils import six
 from django.core import checks, exceptions
 from django.utils.translation import ugettext_lazy as _
 from django.db import models
+from pg_fts import metrics, sqlcomment
 import re
 
 __all__ = ('TSVectorField', 'TSVectorBaseField', 'TSVectorTsQueryLookup',
            'TSVectorSearchLookup', 'TSVectorISearchLookup',
-           'DictionaryTransform')
+           'DictionaryTransform', 'TSQueryJoin', 'TSVectorExpression')
 
 """
     pg_fts.fields
@@ -107,6 +111,22 @@ class TSVectorField(TSVectorBaseField):
             Dictionary(ies) used must be installed in your database, check
                 ``pg_catalog.pg_ts_config``
 
+    :param storage: How the vector is updated, available options:
+
+        - ``trigger`` (default) a column updated by the trigger created with
+            :class:`~pg_fts.migrations.CreateFTSTriggerOperation`
+
+        - ``generated`` a ``GENERATED ALWAYS AS (...) STORED`` column
+            computed by PostgreSQL (12+), no trigger is needed. In case of
+            multiple dictionaries the dictionary field must have choices
+
+        - ``expression`` no column, the lookups and ranks use the vector
+            function created by
+            :class:`~pg_fts.migrations.CreateFTSTriggerOperation`, the same
+            expression of the index created by
+            :class:`~pg_fts.migrations.CreateFTSIndexOperation`. In case of
+            multiple dictionaries the dictionary field must have choices
+
     :raises: exceptions.FieldError if lookup isn't tsquery, search or isearch
         or not a valid option dictionary (in case of multiple dictionaries)
 
@@ -119,14 +139,51 @@ class TSVectorField(TSVectorBaseField):
 
     DEFAUL_RANK = 'D'
     RANK_LEVELS = ('A', 'B', 'C', 'D')
+    STORAGES = ('trigger', 'generated', 'expression')
     default_error_messages = {
         'fields_error': _('Fields must be tuple or list of fields:'),
         'index_error': _('Invalid index:'),
     }
 
-    def __init__(self, fields, dictionary='english', **kwargs):
+    def __init__(self, fields, dictionary='english', storage='trigger',
+                 **kwargs):
+        assert storage in self.STORAGES, "Invalid storage '%s'. Options %s" % (
+            storage, ', '.join(self.STORAGES))
         self.fields = fields
+        self.storage = storage
         super(TSVectorField, self).__init__(dictionary, **kwargs)
+        if storage == 'generated':
+            # a generated column can't have a default, with None the schema
+            # editor doesn't set or drop it
+            self.default = None
+
+    def set_attributes_from_name(self, name):
+        super(TSVectorField, self).set_attributes_from_name(name)
+        if self.storage != 'trigger':
+            # not in INSERT and UPDATE, the column can't be written
+            self.concrete = False
+
+    def contribute_to_class(self, cls, name, *args, **kwargs):
+        super(TSVectorField, self).contribute_to_class(
+            cls, name, *args, **kwargs)
+        if self.storage != 'trigger':
+            # isn't loaded from the database
+            setattr(cls, self.attname, None)
+
+    def db_type(self, connection):
+        if self.storage == 'generated':
+            # avoids circular import
+            from pg_fts.migrations import PgFtsSQL
+            return PgFtsSQL().generated_column(self.model, self)
+        if self.storage == 'expression':
+            # no column
+            return None
+        return super(TSVectorField, self).db_type(connection)
+
+    def get_col(self, alias, output_field=None):
+        if self.storage == 'expression':
+            return TSVectorExpression(alias, self, output_field)
+        return super(TSVectorField, self).get_col(alias, output_field)
 
     def _get_fields_and_ranks(self):
         for field in self.fields:
@@ -195,6 +252,21 @@ class TSVectorField(TSVectorBaseField):
                             id='fts.E001'
                         )
                     )
+        if self.storage != 'trigger':
+            try:
+                if not self.model._meta.get_field(self.dictionary).choices:
+                    errors.append(
+                        checks.Error(
+                            'Dictionary field must have choices for '
+                            '%s storage.' % self.storage,
+                            hint=('the vector must be immutable, '
+                                  '"dictionary::regconfig" is not'),
+                            obj=self,
+                            id='fts.E001'
+                        )
+                    )
+            except models.FieldDoesNotExist:
+                pass
 
         return errors
 
@@ -206,6 +278,8 @@ class TSVectorField(TSVectorBaseField):
         name, path, args, kwargs = super(TSVectorField, self).deconstruct()
         path = 'pg_fts.fields.TSVectorField'
         kwargs['fields'] = self.fields
+        if self.storage != 'trigger':
+            kwargs['storage'] = self.storage
         return name, path, args, kwargs
 
     def get_dictionary(self):
@@ -220,10 +294,11 @@ class TSVectorField(TSVectorBaseField):
         if transform:
             return transform
         try:
-            if name in map(
-                    lambda x: x[1],
-                    self.model._meta.get_field(self.dictionary).choices):
-                return DictionaryTransformFactory(name)
+            choices = dict(
+                (label, value) for value, label in
+                self.model._meta.get_field(self.dictionary).choices)
+            if name in choices:
+                return DictionaryTransformFactory(name, choices[name])
             else:
                 raise exceptions.FieldError("The '%s' is not in %s choices" % (
                     name, self.model._meta.get_field(self.dictionary))
@@ -232,6 +307,104 @@ class TSVectorField(TSVectorBaseField):
             pass
 
 
+class TSVectorExpression(Col):
+    """
+    The vector of a :class:`~pg_fts.fields.TSVectorField` with
+    ``expression`` storage
+
+    Compiles to the call of the vector function with the columns of the
+    table, the same expression of the index, ex::
+
+        testapp_article_tsvector_vector("testapp_article"."title",
+                                        "testapp_article"."body")
+    """
+
+    def as_sql(self, compiler, connection):
+        # avoids circular import
+        from pg_fts.migrations import PgFtsSQL
+        qn = compiler.quote_name_unless_alias
+        sql = PgFtsSQL()
+        model = self.target.model
+        columns = ['%s.%s' % (qn(self.alias), qn(column))
+                   for column in sql.get_vector_columns(model, self.target)]
+        return sql.call_vector_function(model, self.target, columns), []
+
+
+class TSQueryJoin(object):
+    """
+    Query ``FROM`` entry for a tsquery
+
+    Adds ``CROSS JOIN to_tsquery(dictionary, query) AS alias`` to the query,
+    the tsquery is parsed once per statement and is shared by the ranks and
+    lookups with same dictionary and query.
+
+    :param dictionary: Dictionary name as is in PostgreSQL
+
+    :param value: The query already processed by the lookup
+    """
+    join_type = None
+    parent_alias = None
+    nullable = False
+    table_name = 'pg_fts_tsquery'
+    sql_join = "CROSS JOIN to_tsquery('%s', %%s) %s"
+    sql_tsquery = "to_tsquery('%s', %%s)"
+
+    def __init__(self, dictionary, value, alias=None):
+        self.dictionary, self.value = dictionary, value
+        self.table_alias = alias
+
+    def as_sql(self, compiler, connection):
+        return self.sql_join % (
+            self.dictionary,
+            compiler.quote_name_unless_alias(self.table_alias)
+        ), [self.value]
+
+    def relabeled_clone(self, change_map):
+        return self.__class__(
+            self.dictionary, self.value,
+            change_map.get(self.table_alias, self.table_alias))
+
+    def __eq__(self, other):
+        return (self.__class__ is other.__class__ and
+                self.dictionary == other.dictionary and
+                self.value == other.value)
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def matches(self, dictionary, value):
+        return self.dictionary == dictionary and self.value == value
+
+    @classmethod
+    def get_tsquery_sql(cls, compiler, dictionary, value):
+        """
+        :returns: sql and params for the tsquery, a reference to the
+            joined tsquery if the query has one, or a to_tsquery call
+        """
+        query = compiler.query
+        for alias, table in query.alias_map.items():
+            if (isinstance(table, TSQueryJoin) and
+                    table.matches(dictionary, value) and
+                    query.alias_refcount[alias]):
+                alias = compiler.quote_name_unless_alias(alias)
+                return '%s.%s' % (alias, alias), []
+        return cls.sql_tsquery % dictionary, [value]
+
+
+def get_conjuncts(where):
+    """
+    :returns: Generator of the children of the ``AND`` clause ``where``, of
+        its not negated ``AND`` children recursively
+    """
+    for child in where.children:
+        if (isinstance(child, Node) and child.connector == AND and
+                not child.negated):
+            for conjunct in get_conjuncts(child):
+                yield conjunct
+        else:
+            yield child
+
+
 class TSVectorTsQueryLookup(Lookup):
     """
     TSVectorField Lookup tsquery
@@ -269,17 +442,59 @@ class TSVectorTsQueryLookup(Lookup):
     """
 
     lookup_name = 'tsquery'
-    lookup_sql = "%s @@ to_tsquery('%s', %s)"
+    lookup_sql = "%s @@ %s"
+    # added by a rank, skipped if the statement has the same lookup
+    rank_filter = False
 
     def as_sql(self, qn, connection):
+        sql, params, dictionary, value = self._get_sql(qn, connection)
+        if self.rank_filter and self._is_duplicate(qn, connection, sql,
+                                                   params):
+            return '', []
+        # the comment is added to the end of the statement
+        if metrics.registry.enabled or sqlcomment.is_enabled():
+            sql = metrics.registry.label(connection, sql, self.lhs,
+                                         self.lookup_name, dictionary, value)
+        return sql, params
+
+    def _is_duplicate(self, qn, connection, sql, params):
+        """
+        :returns: If the ``WHERE`` clause requires the same lookup, not added
+            by a rank or added by a previous rank
+        """
+        where = qn.query.where
+        if where.connector != AND or where.negated:
+            return False
+        previous = True
+        for child in get_conjuncts(where):
+            if child is self:
+                previous = False
+            elif (isinstance(child, TSVectorTsQueryLookup) and
+                    (previous or not child.rank_filter) and
+                    child._get_sql(qn, connection)[:2] == (sql, params)):
+                return True
+        return False
+
+    def _get_sql(self, qn, connection):
         lhs, lhs_params = self.process_lhs(qn, connection)
         rhs, rhs_params = self.process_rhs(qn, connection)
-        params = lhs_params + rhs_params
         if hasattr(self.lhs, 'dictionary'):
             dictionary = self.lhs.dictionary
         else:
-            dictionary = self.lhs.source.get_dictionary()
-        return self.lookup_sql % (lhs, dictionary, rhs), params
+            dictionary = self.lhs.output_field.get_dictionary()
+        # reuses the tsquery joined by a rank in the same statement
+        tsquery, tsquery_params = TSQueryJoin.get_tsquery_sql(
+            qn, dictionary, rhs_params[0])
+        sql = self.lookup_sql % (lhs, tsquery)
+        params = lhs_params + tsquery_params
+        if isinstance(self.lhs, DictionaryTransform):
+            # only the rows with the dictionary, uses the partial index
+            dictionary_sql, dictionary_params = (
+                self.lhs.get_dictionary_sql(qn, connection))
+            if dictionary_sql:
+                sql = '(%s AND %s)' % (sql, dictionary_sql)
+                params.extend(dictionary_params)
+        return sql, params, dictionary, rhs_params[0]
 
     @property
     def output_field(self):
@@ -392,8 +607,10 @@ class DictionaryTransform(Transform):
     >>> Article.objects.filter(
             tsvector__english__isearch="an and query"
         )
-    # will create a ts_query with english dictionary
-    # SQL -> to_tsquery('english', 'an | and | query')
+    # will create a ts_query with english dictionary, only in the english
+    # rows
+    # SQL -> ("fts_index" @@ to_tsquery('english', 'an | and | query')
+    #         AND "dictionary" = 'english')
 
     >>> Article.objects.filter(
             tsvector__portuguese__isearch="an and query"
@@ -419,6 +636,7 @@ class DictionaryTransform(Transform):
 
     def __init__(self, dictionary, *args,
                  **kwargs):
+        self.value = kwargs.pop('value', dictionary)
         super(DictionaryTransform, self).__init__(*args, **kwargs)
         self.dictionary = dictionary
 
@@ -426,6 +644,18 @@ class DictionaryTransform(Transform):
         lhs, params = qn.compile(self.lhs)
         return "%s" % lhs, params
 
+    def get_dictionary_sql(self, qn, connection):
+        """
+        :returns: sql and params of ``dictionary = %s``, the dictionary field
+            of the vector, an empty sql if the vector isn't a column
+        """
+        if not hasattr(self.lhs, 'alias'):
+            return '', []
+        field = self.lhs.output_field
+        dictionary_field = field.model._meta.get_field(field.dictionary)
+        lhs, params = qn.compile(dictionary_field.get_col(self.lhs.alias))
+        return '%s = %%s' % lhs, params + [self.value]
+
     @property
     def output_field(self):
         return TSVectorBaseField(self.dictionary)
@@ -433,8 +663,10 @@ class DictionaryTransform(Transform):
 
 class DictionaryTransformFactory(object):
 
-    def __init__(self, dictionary):
+    def __init__(self, dictionary, value=None):
         self.dictionary = dictionary
+        self.value = dictionary if value is None else value
 
     def __call__(self, *args, **kwargs):
+        kwargs['value'] = self.value
         return DictionaryTransform(self.dictionary, *args, **kwargs)
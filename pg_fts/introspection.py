@@ -13,7 +13,7 @@ class PgFTSIntrospection(object):
         :returns: A list of dictionaries names installed in postgres
         """
 
-        'SELECT cfgname FROM "pg_catalog"."pg_ts_config"'
+        cursor.execute('SELECT cfgname FROM "pg_catalog"."pg_ts_config"')
         return [row[0] for row in cursor.fetchall()]
 
     def get_trigger_list(self, cursor):
@@ -38,8 +38,190 @@ class PgFTSIntrospection(object):
         """
 
         cursor.execute('''SELECT p.proname AS function_name
-FROM   (SELECT oid, * FROM pg_proc p WHERE NOT p.proisagg) p
+FROM   (SELECT oid, * FROM pg_proc p WHERE NOT EXISTS (
+    SELECT 1 FROM pg_aggregate a WHERE a.aggfnoid = p.oid)) p
 JOIN   pg_namespace n ON n.oid = p.pronamespace
 WHERE  n.nspname = 'public'
 ''')
-        return [row[0] for row in cursor.fetchall()]
\ No newline at end of file
+        return [row[0] for row in cursor.fetchall()]
+
+    def get_index_valid(self, cursor, index):
+        """
+        introspects pg_catalog.pg_index
+
+        :returns: ``True`` if the index is valid, ``False`` if invalid (ex.
+            a failed ``CREATE INDEX CONCURRENTLY``), ``None`` if doesn't exist
+        """
+
+        cursor.execute("""
+            SELECT i.indisvalid
+            FROM pg_catalog.pg_index i
+            JOIN pg_catalog.pg_class c ON c.oid = i.indexrelid
+            WHERE c.relname = %s AND pg_catalog.pg_table_is_visible(c.oid)""",
+                       [index])
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+    def get_extension_list(self, cursor):
+        """
+        introspects pg_catalog.pg_extension
+
+        :returns: A list of the installed extensions
+        """
+
+        cursor.execute('SELECT extname FROM "pg_catalog"."pg_extension"')
+        return [row[0] for row in cursor.fetchall()]
+
+    def get_index_list(self, cursor, indexes):
+        """
+        introspects pg_catalog.pg_index
+
+        :returns: A list of ``(name, table, method, size, valid)`` of the
+            ``indexes`` that exist, size in bytes
+        """
+
+        cursor.execute("""
+            SELECT c.relname, t.relname, a.amname,
+                pg_catalog.pg_relation_size(c.oid), i.indisvalid
+            FROM pg_catalog.pg_index i
+            JOIN pg_catalog.pg_class c ON c.oid = i.indexrelid
+            JOIN pg_catalog.pg_class t ON t.oid = i.indrelid
+            JOIN pg_catalog.pg_am a ON a.oid = c.relam
+            WHERE c.relname = ANY(%s) AND pg_catalog.pg_table_is_visible(c.oid)
+            ORDER BY c.relname""", [list(indexes)])
+        return cursor.fetchall()
+
+    def get_gin_pending_pages(self, cursor, index):
+        """
+        introspects the gin index pending list with ``pgstatginindex`` of the
+        ``pgstattuple`` extension
+
+        :returns: The number of pages in the pending list
+        """
+
+        cursor.execute('SELECT pending_pages FROM pgstatginindex(%s::regclass)',
+                       [index])
+        return cursor.fetchone()[0]
+
+    def get_index_free_space(self, cursor, index):
+        """
+        introspects the index free space map with ``pg_freespace`` of the
+        ``pg_freespacemap`` extension, the pages recorded by ``VACUUM`` for
+        reuse
+
+        :returns: The free space in bytes
+        """
+
+        cursor.execute(
+            'SELECT COALESCE(sum(avail), 0) FROM pg_freespace(%s::regclass)',
+            [index])
+        return int(cursor.fetchone()[0])
+
+    def get_function_source(self, cursor, function):
+        """
+        introspects pg_catalog.pg_proc
+
+        :returns: The source of the function, ``None`` if doesn't exist
+        """
+
+        cursor.execute("""
+            SELECT p.prosrc FROM pg_catalog.pg_proc p
+            WHERE p.proname = %s AND pg_catalog.pg_function_is_visible(p.oid)
+            """, [function])
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+    def get_function_definition(self, cursor, function):
+        """
+        introspects the function with pg_get_functiondef
+
+        :returns: The ``CREATE OR REPLACE FUNCTION`` of the function, ``None``
+            if doesn't exist
+        """
+
+        cursor.execute("""
+            SELECT pg_catalog.pg_get_functiondef(p.oid)
+            FROM pg_catalog.pg_proc p
+            WHERE p.proname = %s AND pg_catalog.pg_function_is_visible(p.oid)
+            """, [function])
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+    def get_index_definition(self, cursor, index):
+        """
+        introspects the index with pg_get_indexdef
+
+        :returns: The ``CREATE INDEX`` of the index, ``None`` if doesn't
+            exist
+        """
+
+        cursor.execute("""
+            SELECT pg_catalog.pg_get_indexdef(c.oid)
+            FROM pg_catalog.pg_class c
+            WHERE c.relname = %s AND c.relkind = 'i'
+                AND pg_catalog.pg_table_is_visible(c.oid)""", [index])
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+    def get_function_stats(self, cursor, function):
+        """
+        introspects pg_stat_user_functions, requires ``track_functions``
+        ``pl`` or ``all``
+
+        :returns: ``(calls, total_time, self_time)`` in milliseconds, ``None``
+            without statistics
+        """
+
+        cursor.execute("""
+            SELECT calls, total_time, self_time
+            FROM pg_catalog.pg_stat_user_functions
+            WHERE funcname = %s""", [function])
+        return cursor.fetchone()
+
+    def get_index_hit_rate(self, cursor, index):
+        """
+        introspects pg_statio_user_indexes
+
+        :returns: The percentage of index blocks read from shared buffers,
+            ``None`` if the index wasn't read
+        """
+
+        cursor.execute("""
+            SELECT idx_blks_hit, idx_blks_read
+            FROM pg_catalog.pg_statio_user_indexes
+            WHERE indexrelname = %s""", [index])
+        row = cursor.fetchone()
+        if not row or not (row[0] + row[1]):
+            return None
+        return 100.0 * row[0] / (row[0] + row[1])
+
+    def get_index_scans(self, cursor, index):
+        """
+        introspects pg_stat_user_indexes
+
+        :returns: The number of scans of the index
+        """
+
+        cursor.execute("""
+            SELECT COALESCE(sum(idx_scan), 0)
+            FROM pg_catalog.pg_stat_user_indexes
+            WHERE indexrelname = %s""", [index])
+        return int(cursor.fetchone()[0])
+
+    def get_table_storage(self, cursor, table):
+        """
+        introspects the table heap and TOAST relations
+
+        :returns: ``(heap size, TOAST relation, TOAST size)``, sizes in
+            bytes, the TOAST relation is ``None`` if the table has none
+        """
+
+        cursor.execute("""
+            SELECT pg_catalog.pg_relation_size(c.oid),
+                NULLIF(c.reltoastrelid, 0)::regclass::text,
+                COALESCE(pg_catalog.pg_relation_size(
+                    NULLIF(c.reltoastrelid, 0)), 0)
+            FROM pg_catalog.pg_class c
+            WHERE c.relname = %s AND c.relkind = 'r'
+                AND pg_catalog.pg_table_is_visible(c.oid)""", [table])
+        return cursor.fetchone()
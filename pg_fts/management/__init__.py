@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import logging
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import signals
+
+"""
+    pg_fts.management
+    -----------------
+
+    ``post_migrate`` prewarm of the indexes, enabled with the setting
+    ``PG_FTS_PREWARM``, a dict with the options of the ``fts_prewarm``
+    command, ex. ``{'budget': '256MB', 'heap': True}``
+
+    @author: David Miguel
+
+"""
+
+logger = logging.getLogger('pg_fts')
+
+
+def prewarm(sender, using=DEFAULT_DB_ALIAS, verbosity=1, **kwargs):
+    options = getattr(settings, 'PG_FTS_PREWARM', None)
+    # once, after the migrations of all the apps
+    if options is None or sender.name != 'pg_fts':
+        return
+    try:
+        call_command('fts_prewarm', database=using, verbosity=verbosity,
+                     **options)
+    except CommandError as e:
+        # the migration isn't stopped by a failed prewarm
+        logger.warning('fts_prewarm failed: %s', e)
+
+
+signals.post_migrate.connect(prewarm, dispatch_uid='pg_fts.prewarm')
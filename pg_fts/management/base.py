@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, models
+from pg_fts.fields import TSVectorField
+
+__all__ = ('FTSFieldCommand', 'get_vector_fields')
+
+"""
+    pg_fts.management.base
+    ----------------------
+
+    Base for the management commands of a model
+    :class:`~pg_fts.fields.TSVectorField`
+
+    @author: David Miguel
+
+"""
+
+
+def get_vector_fields(labels=None):
+    """
+    :param labels: list of ``app_label.Model``, default all the models
+
+    :returns: list of ``(model, field)`` of the
+        :class:`~pg_fts.fields.TSVectorField`
+
+    :raises: CommandError if a model doesn't exist
+    """
+    try:
+        model_list = ([apps.get_model(label) for label in labels]
+                      if labels else apps.get_models())
+    except (LookupError, ValueError) as e:
+        raise CommandError(e)
+    return [(model, field) for model in model_list
+            for field in model._meta.local_fields
+            if isinstance(field, TSVectorField)]
+
+
+class FTSFieldCommand(BaseCommand):
+    """
+    Command with the arguments ``<app_label.Model> <field>`` and
+    ``--database``
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', help='app_label.Model')
+        parser.add_argument('field',
+                            help='The TSVectorField name')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS,
+                            help='Database alias, default "default"')
+
+    def get_model_field(self, options):
+        """
+        :returns: the model and :class:`~pg_fts.fields.TSVectorField`
+
+        :raises: CommandError if the model or field doesn't exist
+        """
+        try:
+            model = apps.get_model(options['model'])
+        except (LookupError, ValueError):
+            raise CommandError("Model '%s' not found" % options['model'])
+        try:
+            field = model._meta.get_field(options['field'])
+        except models.FieldDoesNotExist:
+            raise CommandError("Field '%s' not found in %s" % (
+                options['field'], options['model']))
+        if not isinstance(field, TSVectorField):
+            raise CommandError("'%s' isn't a TSVectorField" % field.name)
+        return model, field
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import re
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections, models
+from pg_fts.checks import match_source
+from pg_fts.management.base import get_vector_fields
+from pg_fts.introspection import PgFTSIntrospection
+from pg_fts.migrations import PgFtsSQL
+
+
+class Command(BaseCommand):
+    help = ('Compares the trigger and index definitions in the database with '
+            'the TSVectorField definitions and reports the drift, the trigger '
+            'execution time, the vector size distribution and the index hit '
+            'rate.')
+
+    sql_creator = PgFtsSQL()
+    introspection = PgFTSIntrospection()
+    sql_column_size = (
+        'SELECT count(*), min(size), avg(size), percentile_cont('
+        'ARRAY[0.5, 0.9, 0.99]) WITHIN GROUP (ORDER BY size), max(size) '
+        'FROM (SELECT pg_column_size({column}) AS size FROM "{model}"'
+        '{sample}) sizes')
+    sql_sample = ' TABLESAMPLE SYSTEM (%s)'
+    function_body_re = re.compile(r'\sAS (\$\w*\$)(.*)\1', re.S)
+
+    def add_arguments(self, parser):
+        parser.add_argument('models', nargs='*',
+                            help='app_label.Model, default all the models')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS,
+                            help='Database alias, default "default"')
+        parser.add_argument('--sample', type=float,
+                            help='Percentage of the table pages for the vector '
+                                 'size, default all the rows')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        drift = 0
+        with connection.cursor() as cursor:
+            for model, field in get_vector_fields(options['models']):
+                self.stdout.write('%s.%s.%s (%s)' % (
+                    model._meta.app_label, model._meta.object_name,
+                    field.name, field.storage))
+                drift += self.diagnose_function(cursor, model, field)
+                drift += self.diagnose_indexes(cursor, model, field)
+                if field.storage != 'expression':
+                    self.diagnose_size(cursor, model, field,
+                                       options['sample'])
+        self.stdout.write('%d drift found' % drift)
+
+    def diagnose_function(self, cursor, model, field):
+        """
+        :returns: ``1`` if the function is missing or outdated
+        """
+        sources = self.sql_creator.get_function_sources(model, field)
+        if sources is None:
+            return 0
+        name, expected = sources
+        definition = self.introspection.get_function_definition(cursor, name)
+        if definition is None:
+            self.stdout.write('    function %s: missing' % name)
+            return 1
+        body = self.function_body_re.search(definition)
+        if not body or not match_source(body.group(2), expected):
+            self.stdout.write('    function %s: drift' % name)
+            return 1
+        stats = self.introspection.get_function_stats(cursor, name)
+        if stats:
+            self.stdout.write(
+                '    function %s: ok, %d calls, total %.3f ms, '
+                'mean %.3f ms' % (name, stats[0], stats[1],
+                                  stats[1] / stats[0] if stats[0] else 0))
+        else:
+            self.stdout.write('    function %s: ok, no statistics '
+                              '(track_functions)' % name)
+        return 0
+
+    def diagnose_indexes(self, cursor, model, field):
+        """
+        :returns: Number of indexes missing or outdated
+        """
+        drift = 0
+        indexes = self.introspection.get_index_list(
+            cursor, self.sql_creator.get_index_names(model, field))
+        if not indexes:
+            self.stdout.write('    index: missing')
+            return 1
+        dictionaries = dict(
+            (self.sql_creator.get_index_name(model, field, value), value)
+            for value in [None] + self.get_dictionaries(model, field))
+        for name, table, method, size, valid in indexes:
+            expected = self.sql_creator.create_index(
+                model, field, method, dictionary=dictionaries[name])
+            definition = self.introspection.get_index_definition(cursor, name)
+            status = 'ok'
+            if (self.normalize_index(definition) !=
+                    self.normalize_index(expected)):
+                status = 'drift'
+                drift += 1
+            if not valid:
+                status += ', invalid'
+            hit_rate = self.introspection.get_index_hit_rate(cursor, name)
+            self.stdout.write('    index %s (%s): %s, hit rate %s' % (
+                name, method, status,
+                '-' if hit_rate is None else '%.1f%%' % hit_rate))
+        return drift
+
+    def diagnose_size(self, cursor, model, field, sample=None):
+        cursor.execute(self.sql_column_size.format(
+            column=field.get_attname_column()[1],
+            model=model._meta.db_table,
+            sample=self.sql_sample % sample if sample else ''))
+        count, minimum, average, percentiles, maximum = cursor.fetchone()
+        if not count:
+            self.stdout.write('    vector size: no rows')
+            return
+        self.stdout.write(
+            '    vector size (%d rows): min %d, avg %d, p50 %d, p90 %d, '
+            'p99 %d, max %d bytes' % (
+                (count, minimum, average) + tuple(percentiles) + (maximum,)))
+
+    def get_dictionaries(self, model, field):
+        try:
+            return [value for value, label in
+                    model._meta.get_field(field.dictionary).choices]
+        except models.FieldDoesNotExist:
+            return []
+
+    @staticmethod
+    def normalize_index(sql):
+        """
+        The index key and predicate without comments, quotes, schema, casts
+        to text, parentheses, storage parameters and operator class
+        """
+        sql = re.sub(r'/\*.*?\*/', '', sql)
+        sql = re.sub(r' ON (ONLY )?("?\w+"?\.)?', ' ON ', sql)
+        sql = re.sub(r'tsvector_ops( \(.*?\))?|WITH \(.*?\)|CONCURRENTLY',
+                     '', sql)
+        sql = sql.replace('::text', '').replace('"', '')
+        return re.sub(r'[\s()]', '', sql).lower()
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import time
+from django.db import connections, transaction
+from pg_fts.management.base import FTSFieldCommand
+from pg_fts.migrations import PgFtsSQL
+
+
+class Command(FTSFieldCommand):
+    help = ('Updates the vectors of the rows in the queue created by '
+            'CreateFTSTriggerOperation with level="queue". Several workers '
+            'can run at the same time.')
+
+    sql_creator = PgFtsSQL()
+
+    def add_arguments(self, parser):
+        super(Command, self).add_arguments(parser)
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            dest='batch_size',
+                            help='Rows per transaction, default 1000')
+        parser.add_argument('--forever', action='store_true',
+                            help='Waits for new rows when the queue is empty')
+        parser.add_argument('--sleep', type=float, default=1,
+                            help='Seconds to wait with --forever, default 1')
+
+    def handle(self, *args, **options):
+        model, field = self.get_model_field(options)
+        connection = connections[options['database']]
+        total = 0
+        while True:
+            count = self.drain(connection, model, field,
+                               options['batch_size'])
+            total += count
+            if not count:
+                if not options['forever']:
+                    break
+                time.sleep(options['sleep'])
+        if options['verbosity'] > 0:
+            self.stdout.write('%d rows updated' % total)
+
+    def drain(self, connection, model, field, batch_size):
+        """
+        Updates a batch in a transaction
+
+        :returns: Number of rows removed from the queue
+        """
+        sql = self.sql_creator
+        with transaction.atomic(using=connection.alias):
+            with connection.cursor() as cursor:
+                # the vector update doesn't go to the queue
+                cursor.execute(sql.skip_trigger(model, field), ['on'])
+                cursor.execute(sql.drain_queue(model, field),
+                               [batch_size, batch_size])
+                count = cursor.fetchone()[0]
+                cursor.execute(sql.skip_trigger(model, field), ['off'])
+        return count
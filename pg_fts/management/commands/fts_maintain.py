@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+from pg_fts.introspection import PgFTSIntrospection
+from pg_fts.management.base import get_vector_fields
+from pg_fts.migrations import PgFtsSQL
+
+
+class Command(BaseCommand):
+    help = ('Reports the size, gin pending list pages and estimated bloat of '
+            'the TSVectorField indexes, flushes the gin pending lists and '
+            'rebuilds the bloated indexes with REINDEX CONCURRENTLY.')
+
+    sql_creator = PgFtsSQL()
+    introspection = PgFTSIntrospection()
+    sql_clean_pending = 'SELECT gin_clean_pending_list(%s::regclass)'
+    sql_reindex = 'REINDEX INDEX CONCURRENTLY "{index}"'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS,
+                            help='Database alias, default "default"')
+        parser.add_argument('--clean-pending', action='store_true',
+                            dest='clean_pending',
+                            help='Flushes the pending list of gin indexes')
+        parser.add_argument('--reindex-bloat', type=float,
+                            dest='reindex_bloat',
+                            help='Rebuilds the indexes with estimated bloat '
+                                 'of at least this percentage')
+        parser.add_argument('--reindex', action='store_true',
+                            help='Rebuilds all the indexes')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        with connection.cursor() as cursor:
+            extensions = self.introspection.get_extension_list(cursor)
+            indexes = self.introspection.get_index_list(
+                cursor, self.get_index_names())
+            for name, table, method, size, valid in indexes:
+                pending = bloat = None
+                if method == 'gin' and 'pgstattuple' in extensions:
+                    pending = self.introspection.get_gin_pending_pages(
+                        cursor, name)
+                if 'pg_freespacemap' in extensions and size:
+                    bloat = 100.0 * self.introspection.get_index_free_space(
+                        cursor, name) / size
+                self.report(options, name, method, size, valid, pending,
+                            bloat)
+
+                if method == 'gin' and options['clean_pending']:
+                    cursor.execute(self.sql_clean_pending, [name])
+                    self.write(options, '    %d pending pages flushed' %
+                               cursor.fetchone()[0])
+                if options['reindex'] or (
+                        bloat is not None and
+                        options['reindex_bloat'] is not None and
+                        bloat >= options['reindex_bloat']):
+                    cursor.execute(self.sql_reindex.format(index=name))
+                    self.write(options, '    reindexed')
+
+    def get_index_names(self):
+        """
+        :returns: The index names of all the
+            :class:`~pg_fts.fields.TSVectorField`
+        """
+        names = []
+        for model, field in get_vector_fields():
+            names.extend(self.sql_creator.get_index_names(model, field))
+        return names
+
+    def report(self, options, name, method, size, valid, pending, bloat):
+        self.write(options, '%s (%s%s): size %d kB, pending pages %s, '
+                            'estimated bloat %s' % (
+                                name, method, '' if valid else ', invalid',
+                                size // 1024,
+                                '-' if pending is None else pending,
+                                '-' if bloat is None else '%.1f%%' % bloat))
+
+    def write(self, options, message):
+        if options['verbosity'] > 0:
+            self.stdout.write(message)
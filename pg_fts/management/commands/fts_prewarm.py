@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import re
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from pg_fts.introspection import PgFTSIntrospection
+from pg_fts.management.base import get_vector_fields
+from pg_fts.migrations import PgFtsSQL
+
+
+def parse_size(value):
+    """
+    :param value: Size in bytes or with unit, ex. ``'512MB'``
+
+    :returns: The size in bytes, ``None`` if ``value`` is ``None``
+
+    :raises: CommandError if isn't a valid size
+    """
+    if value is None:
+        return None
+    units = {'': 1, 'b': 1, 'kb': 1024, 'mb': 1024 ** 2, 'gb': 1024 ** 3,
+             'tb': 1024 ** 4}
+    match = re.match(r'^\s*(\d+)\s*([a-zA-Z]*)\s*$', '%s' % value)
+    if not match or match.group(2).lower() not in units:
+        raise CommandError("Invalid size '%s'" % value)
+    return int(match.group(1)) * units[match.group(2).lower()]
+
+
+class Command(BaseCommand):
+    help = ('Loads the TSVectorField indexes, and optionally the heap and '
+            'TOAST of the tables, into shared buffers with pg_prewarm, in '
+            'priority order up to a memory budget.')
+
+    introspection = PgFTSIntrospection()
+    sql_creator = PgFtsSQL()
+    sql_block_size = "SELECT current_setting('block_size')::int"
+    sql_prewarm = "SELECT pg_prewarm(%s::regclass, %s, 'main', 0, %s)"
+    MODES = ('buffer', 'read', 'prefetch')
+
+    def add_arguments(self, parser):
+        parser.add_argument('models', nargs='*',
+                            help='app_label.Model, default all the models')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS,
+                            help='Database alias, default "default"')
+        parser.add_argument('--budget',
+                            help='Maximum size loaded, ex. 512MB, default '
+                                 'no limit')
+        parser.add_argument('--heap', action='store_true',
+                            help='Loads the tables after the indexes')
+        parser.add_argument('--toast', action='store_true',
+                            help='Loads the TOAST of the tables after the '
+                                 'indexes and tables')
+        parser.add_argument('--mode', default='buffer', choices=self.MODES,
+                            help='pg_prewarm mode, default buffer')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        budget = parse_size(options['budget'])
+        with connection.cursor() as cursor:
+            if 'pg_prewarm' not in self.introspection.get_extension_list(
+                    cursor):
+                raise CommandError('The pg_prewarm extension is not '
+                                   'installed, CREATE EXTENSION pg_prewarm')
+            cursor.execute(self.sql_block_size)
+            block_size = cursor.fetchone()[0]
+            plan = self.get_plan(cursor, options['models'], block_size,
+                                 budget, options['heap'], options['toast'])
+            loaded = 0
+            for relation, blocks in plan:
+                cursor.execute(self.sql_prewarm,
+                               [relation, options['mode'], blocks - 1])
+                count = cursor.fetchone()[0]
+                loaded += count
+                if options['verbosity'] > 1:
+                    self.stdout.write('%s: %d blocks' % (relation, count))
+        if options['verbosity'] > 0:
+            self.stdout.write('%d blocks (%d kB) loaded' % (
+                loaded, loaded * block_size // 1024))
+
+    def get_plan(self, cursor, labels, block_size, budget=None, heap=False,
+                 toast=False):
+        """
+        The relations in priority order, the indexes by number of scans,
+        the tables and the TOAST of the tables
+
+        :returns: list of ``(relation, blocks)`` up to the ``budget`` in
+            bytes, the last relation can be loaded partially
+        """
+        indexes = []
+        tables = []
+        for model, field in get_vector_fields(labels):
+            indexes.extend(
+                (self.introspection.get_index_scans(cursor, name), name, size)
+                for name, table, method, size, valid in
+                self.introspection.get_index_list(
+                    cursor, self.sql_creator.get_index_names(model, field))
+                if valid)
+            if model._meta.db_table not in tables:
+                tables.append(model._meta.db_table)
+        relations = [(name, size) for scans, name, size in
+                     sorted(indexes, key=lambda i: (-i[0], i[1]))]
+        storage = [self.introspection.get_table_storage(cursor, table)
+                   for table in tables]
+        if heap:
+            relations.extend((table, s[0])
+                             for table, s in zip(tables, storage) if s)
+        if toast:
+            relations.extend((s[1], s[2]) for s in storage if s and s[1])
+
+        plan = []
+        remaining = None if budget is None else budget // block_size
+        for relation, size in relations:
+            blocks = -(-size // block_size)
+            if remaining is not None:
+                blocks = min(blocks, remaining)
+                remaining -= blocks
+            if blocks:
+                plan.append((relation, blocks))
+            if remaining == 0:
+                break
+        return plan
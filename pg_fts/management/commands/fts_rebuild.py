@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import multiprocessing
+import time
+import django
+from django.apps import apps
+from django.core.management.base import CommandError
+from django.db import connections, transaction
+from pg_fts.management.base import FTSFieldCommand
+from pg_fts.migrations import PgFtsSQL
+
+
+def setup_worker():
+    """
+    Initializer of the worker processes, without ``fork`` the process starts
+    without Django setup
+    """
+    django.setup()
+
+
+def rebuild_range(args):
+    """
+    Updates the vectors of a primary key range in a transaction, runs in a
+    worker process with its own connection
+
+    :returns: The range and number of rows updated
+    """
+    label, field_name, database, start, end = args
+    model = apps.get_model(label)
+    field = model._meta.get_field(field_name)
+    sql = PgFtsSQL()
+    connection = connections[database]
+    with transaction.atomic(using=database):
+        with connection.cursor() as cursor:
+            # the triggers don't compute the vector again
+            cursor.execute(sql.skip_trigger(model, field), ['on'])
+            cursor.execute(sql.update_vector_range(model, field),
+                           [start, end])
+            count = cursor.rowcount
+            cursor.execute(sql.skip_trigger(model, field), ['off'])
+    return start, end, count
+
+
+class Command(FTSFieldCommand):
+    help = ('Updates the vectors of all the rows, the primary key range is '
+            'split in batches updated by several worker processes, each '
+            'batch in a transaction. Runs ANALYZE at the end.')
+
+    sql_pk_limits = 'SELECT min({pk}), max({pk}) FROM "{model}"'
+    sql_analyze = 'ANALYZE "{model}"'
+
+    def add_arguments(self, parser):
+        super(Command, self).add_arguments(parser)
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Worker processes, default 4')
+        parser.add_argument('--batch-size', type=int, default=10000,
+                            dest='batch_size',
+                            help='Primary keys per transaction, default 10000')
+        parser.add_argument('--min-pk', type=int, dest='min_pk',
+                            help='First primary key, default the lowest')
+        parser.add_argument('--max-pk', type=int, dest='max_pk',
+                            help='Last primary key, default the highest')
+
+    def handle(self, *args, **options):
+        model, field = self.get_model_field(options)
+        if field.storage != 'trigger':
+            raise CommandError("The vector of '%s' storage isn't updated" %
+                               field.storage)
+        if not self.is_integer_pk(model._meta.pk):
+            raise CommandError('The primary key must be an integer, the '
+                               'batches are primary key ranges')
+        if options['workers'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--workers and --batch-size must be positive')
+        connection = connections[options['database']]
+        ranges = self.get_ranges(connection, model, options)
+
+        start = time.time()
+        total = 0
+        label = '%s.%s' % (model._meta.app_label, model._meta.object_name)
+        tasks = [(label, field.name, connection.alias, first, last)
+                 for first, last in ranges]
+        for first, last, count in self.run(tasks, options['workers']):
+            total += count
+            if options['verbosity'] > 1:
+                self.stdout.write('%d-%d: %d rows' % (first, last, count))
+
+        with connection.cursor() as cursor:
+            cursor.execute(self.sql_analyze.format(
+                model=model._meta.db_table))
+        if options['verbosity'] > 0:
+            elapsed = time.time() - start
+            self.stdout.write('%d rows updated in %.1fs (%d rows/sec)' % (
+                total, elapsed, total / elapsed if elapsed else total))
+
+    INTEGER_FIELDS = ('AutoField', 'BigAutoField', 'IntegerField',
+                      'BigIntegerField', 'SmallIntegerField',
+                      'PositiveIntegerField', 'PositiveSmallIntegerField')
+
+    @classmethod
+    def is_integer_pk(cls, pk):
+        """
+        :returns: ``True`` if the column of the primary key is an integer,
+            a ``OneToOneField`` primary key (multi-table inheritance) has the
+            type of the related primary key
+        """
+        while getattr(pk, 'rel', None) is not None:
+            pk = pk.rel.get_related_field()
+        return pk.get_internal_type() in cls.INTEGER_FIELDS
+
+    def get_ranges(self, connection, model, options):
+        """
+        :returns: list of ``(first, last)`` primary keys of the batches
+        """
+        first, last = options['min_pk'], options['max_pk']
+        if first is None or last is None:
+            with connection.cursor() as cursor:
+                cursor.execute(self.sql_pk_limits.format(
+                    pk=model._meta.pk.get_attname_column()[1],
+                    model=model._meta.db_table))
+                min_pk, max_pk = cursor.fetchone()
+            if min_pk is None:
+                return []
+            first = min_pk if first is None else first
+            last = max_pk if last is None else last
+        size = options['batch_size']
+        return [(pk, min(pk + size - 1, last))
+                for pk in range(first, last + 1, size)]
+
+    def run(self, tasks, workers):
+        """
+        Runs the ranges in a pool of ``workers`` processes, or in this
+        process with a single worker
+
+        :returns: iterator of the finished ranges
+        """
+        if workers == 1 or len(tasks) < 2:
+            for task in tasks:
+                yield rebuild_range(task)
+            return
+        # the workers open their own connections, a connection can't be
+        # shared by processes
+        for connection in connections.all():
+            connection.close()
+        try:
+            # the workers inherit the Django setup, only python 3 has
+            # contexts and other start methods, python 2 always forks
+            context = multiprocessing.get_context('fork')
+        except (AttributeError, ValueError):
+            context = multiprocessing
+        pool = context.Pool(min(workers, len(tasks)),
+                            initializer=setup_worker)
+        try:
+            for result in pool.imap_unordered(rebuild_range, tasks):
+                yield result
+        finally:
+            pool.close()
+            pool.join()
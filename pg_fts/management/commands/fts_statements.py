@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from pg_fts.introspection import PgFTSIntrospection
+from pg_fts.sqlcomment import parse_comments
+
+
+class Command(BaseCommand):
+    help = ('Aggregates the calls, total and mean time of the statements in '
+            'pg_stat_statements with the comments of PG_FTS_SQL_COMMENT, '
+            'by tag or other comment keys. The totals by tag are '
+            'approximate, pg_stat_statements ignores the comments and keeps '
+            'the comment of the first execution.')
+
+    introspection = PgFTSIntrospection()
+    sql_columns = 'SELECT * FROM pg_stat_statements LIMIT 0'
+    sql_statements = (
+        'SELECT query, calls, {total}, rows FROM pg_stat_statements '
+        'WHERE dbid = (SELECT oid FROM pg_database '
+        'WHERE datname = current_database()) AND query LIKE %s')
+    ORDERS = ('total', 'mean', 'calls')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS,
+                            help='Database alias, default "default"')
+        parser.add_argument('--group-by', default='tag', dest='group_by',
+                            help='Comma separated comment keys, ex. '
+                                 'model,lookup,rank, default tag')
+        parser.add_argument('--order', default='total', choices=self.ORDERS,
+                            help='Descending order, default total')
+        parser.add_argument('--limit', type=int, default=20,
+                            help='Number of groups, default 20')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        keys = options['group_by'].split(',')
+        with connection.cursor() as cursor:
+            if 'pg_stat_statements' not in (
+                    self.introspection.get_extension_list(cursor)):
+                raise CommandError(
+                    'The pg_stat_statements extension is not installed, '
+                    'CREATE EXTENSION pg_stat_statements')
+            try:
+                cursor.execute(self.sql_columns)
+                columns = [column[0] for column in cursor.description]
+                # PostgreSQL < 13
+                total = ('total_exec_time' if 'total_exec_time' in columns
+                         else 'total_time')
+                cursor.execute(self.sql_statements.format(total=total),
+                               ['%/*%'])
+                statements = cursor.fetchall()
+            except DatabaseError as e:
+                raise CommandError(e)
+
+        groups = self.aggregate(statements, keys)
+        index = {'calls': 1, 'total': 2, 'mean': 3}[options['order']]
+        groups.sort(key=lambda g: g[index], reverse=True)
+        self.stdout.write('%s  %10s %14s %12s %12s' % (
+            ', '.join(keys), 'calls', 'total ms', 'mean ms', 'rows'))
+        for values, calls, total, mean, rows in groups[:options['limit']]:
+            self.stdout.write('%s  %10d %14.1f %12.3f %12d' % (
+                ', '.join(values), calls, total, mean, rows))
+
+    @staticmethod
+    def aggregate(statements, keys):
+        """
+        :param statements: list of ``(query, calls, total ms, rows)``
+
+        :returns: list of ``(values of the keys, calls, total ms, mean ms,
+            rows)``, of the statements with pg_fts comments, ``'-'`` for
+            the missing keys. The statements with different tags and the
+            same structure are one entry of ``pg_stat_statements``, with
+            the comment of the first one, the totals by tag are approximate
+        """
+        groups = {}
+        for query, calls, total, rows in statements:
+            values = parse_comments(query)
+            if 'model' not in values:
+                continue
+            group = groups.setdefault(
+                tuple(values.get(key, '-') for key in keys), [0, 0.0, 0])
+            group[0] += calls
+            group[1] += total
+            group[2] += rows
+        return [(values, calls, total, total / calls if calls else 0.0, rows)
+                for values, (calls, total, rows) in groups.items()]
@@ -0,0 +1,346 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import re
+import threading
+import time
+import weakref
+from django.utils.encoding import force_text
+from django.utils.http import urlencode
+from django.utils.six.moves.urllib.parse import parse_qsl
+from pg_fts import sqlcomment
+
+__all__ = ('MetricsRegistry', 'MetricsCursorWrapper', 'registry')
+
+"""
+    pg_fts.metrics
+    --------------
+
+    Optional instrumentation of the queries with pg_fts lookups and ranks,
+    latency histogram, rows returned and number of terms of the query,
+    labelled by model, vector field, lookup, dictionary and rank
+
+    Enabled with the setting ``PG_FTS_METRICS = True`` or
+    ``registry.enable()``, scraped with ``registry.collect()``
+
+    @author: David Miguel
+
+"""
+
+terms_re = re.compile(r"[^\s&|!()]+", flags=re.U)
+marker_re = re.compile(r"\s?/\*pg_fts ([^*]*)\*/")
+
+
+def get_vector_field(expression):
+    """
+    :returns: The :class:`~pg_fts.fields.TSVectorField` of the lookup or rank
+        expression, ``None`` if isn't a column
+    """
+    while not hasattr(expression, 'target') and hasattr(expression, 'lhs'):
+        expression = expression.lhs
+    return getattr(expression, 'target', None)
+
+
+def get_vector_labels(expression):
+    """
+    :returns: ``('app_label.Model', 'field')`` of the
+        :class:`~pg_fts.fields.TSVectorField` of the lookup or rank
+        expression, ``('', '')`` if isn't a column
+    """
+    field = get_vector_field(expression)
+    if field is None:
+        return '', ''
+    return ('%s.%s' % (field.model._meta.app_label,
+                       field.model._meta.object_name), field.name)
+
+
+def mark(sql, labels, terms):
+    """
+    :returns: ``sql`` with a ``/*pg_fts ...*/`` comment with the ``labels``
+        and number of ``terms``, removed by :class:`MetricsCursorWrapper`
+        before the execution. The ``%`` are escaped, the SQL is executed with
+        params
+    """
+    values = list(zip(MetricsRegistry.LABELS, labels)) + [('terms', terms)]
+    return '%s /*pg_fts %s*/' % (sql, urlencode(values).replace('%', '%%'))
+
+
+def unmark(sql):
+    """
+    :returns: ``(sql, found)``, ``sql`` without the comments added by
+        :func:`mark` and list of ``(labels, terms)``, one for each lookup, the
+        lookup of a rank has the rank label
+    """
+    if '/*pg_fts ' not in sql:
+        return sql, []
+    found = []
+    for text in marker_re.findall(sql):
+        values = dict((force_text(key), force_text(value)) for key, value in
+                      parse_qsl(text.replace('%%', '%'),
+                                keep_blank_values=True))
+        entry = (tuple(values.get(label, '')
+                       for label in MetricsRegistry.LABELS),
+                 int(values.get('terms') or 0))
+        # the same expression compiled more than once, ex. in the ORDER BY
+        if entry not in found:
+            found.append(entry)
+    ranked = set(labels[:4] for labels, terms in found if labels[4])
+    return marker_re.sub('', sql), [
+        (labels, terms) for labels, terms in found
+        if labels[4] or labels[:4] not in ranked]
+
+
+def get_comment(found):
+    """
+    :param found: list of ``(labels, terms)`` of :func:`unmark`
+
+    :returns: The sqlcommenter comment of the statement with the ``model``,
+        ``field``, ``lookup`` and ``rank`` of its lookups and ranks, the
+        different values are separated by ``,``
+    """
+    values = {}
+    for key in ('model', 'field', 'lookup', 'rank'):
+        index = MetricsRegistry.LABELS.index(key)
+        distinct = []
+        for labels, terms in found:
+            if labels[index] and labels[index] not in distinct:
+                distinct.append(labels[index])
+        values[key] = ','.join(distinct) or None
+    return sqlcomment.comment(**values)
+
+
+class Metric(object):
+    """
+    Histogram of the latency in ms, with the sum of the rows and terms, only
+    updated by one thread
+    """
+
+    __slots__ = ('buckets', 'count', 'sum', 'rows', 'terms')
+
+    def __init__(self, size):
+        self.buckets = [0] * size
+        self.count = 0
+        self.sum = 0.0
+        self.rows = 0
+        self.terms = 0
+
+    def merge(self, other):
+        self.buckets = [a + b for a, b in zip(self.buckets, other.buckets)]
+        self.count += other.count
+        self.sum += other.sum
+        self.rows += other.rows
+        self.terms += other.terms
+
+
+class MetricsRegistry(object):
+    """
+    In-process registry, each thread updates its own metrics without locks,
+    the metrics of all the threads are merged by :meth:`collect`, the metrics
+    of the finished threads are merged in a single aggregate
+
+    :param buckets: Upper bounds of the latency histogram in ms
+    """
+
+    BUCKETS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+    LABELS = ('model', 'field', 'lookup', 'dictionary', 'rank')
+
+    def __init__(self, buckets=None):
+        self.buckets = tuple(buckets or self.BUCKETS)
+        # the lookups and ranks only register the labels if enabled
+        self.enabled = False
+        self.recording = False
+        self.observers = []
+        self._local = threading.local()
+        # (weakref to the thread, shard) of the threads with metrics
+        self._shards = []
+        self._finished = {}
+        self._lock = threading.Lock()
+
+    def enable(self):
+        self.recording = True
+        self._update()
+
+    def disable(self):
+        self.recording = False
+        self._update()
+
+    def add_observer(self, observer):
+        """
+        :param observer: Called after the execution of each statement with
+            pg_fts lookups or ranks, with the arguments ``connection``,
+            ``sql``, ``params``, ``labels`` (list of tuples of ``LABELS``) and
+            ``ms``
+        """
+        if observer not in self.observers:
+            self.observers.append(observer)
+        self._update()
+
+    def remove_observer(self, observer):
+        if observer in self.observers:
+            self.observers.remove(observer)
+        self._update()
+
+    def _update(self):
+        self.enabled = self.recording or bool(self.observers)
+
+    def install(self, connection):
+        """
+        Wraps the cursors of ``connection`` with
+        :class:`MetricsCursorWrapper`
+        """
+        if getattr(connection, 'pg_fts_metrics', False):
+            return
+        connection.pg_fts_metrics = True
+        make_cursor = connection.make_cursor
+        make_debug_cursor = connection.make_debug_cursor
+        connection.make_cursor = lambda cursor: MetricsCursorWrapper(
+            make_cursor(cursor), self)
+        connection.make_debug_cursor = lambda cursor: MetricsCursorWrapper(
+            make_debug_cursor(cursor), self)
+
+    def _get_shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = {}
+            # once for each thread
+            with self._lock:
+                self._fold()
+                self._shards.append(
+                    (weakref.ref(threading.current_thread()), shard))
+        return shard
+
+    def _fold(self):
+        """
+        Merges the shards of the finished threads in the aggregate, called
+        with the lock
+        """
+        alive = []
+        for ref, shard in self._shards:
+            thread = ref()
+            if thread is not None and thread.is_alive():
+                alive.append((ref, shard))
+            else:
+                self._merge(self._finished, shard)
+        self._shards = alive
+
+    def _merge(self, merged, shard):
+        for labels, metric in list(shard.items()):
+            total = merged.get(labels)
+            if total is None:
+                total = merged[labels] = Metric(len(self.buckets) + 1)
+            total.merge(metric)
+
+    def label(self, connection, sql, expression, lookup, dictionary, value,
+              rank=''):
+        """
+        Called by the lookups and ranks ``as_sql``
+
+        :returns: ``sql`` with the labels, recorded and added to the
+            sqlcommenter comment with the execution of the statement in
+            ``connection``
+        """
+        self.install(connection)
+        model, name = get_vector_labels(expression)
+        return mark(sql, (model, name, lookup, dictionary, rank),
+                    len(terms_re.findall(value or '')))
+
+    def observe(self, labels, terms, ms, rows):
+        shard = self._get_shard()
+        metric = shard.get(labels)
+        if metric is None:
+            metric = shard[labels] = Metric(len(self.buckets) + 1)
+        index = 0
+        for bound in self.buckets:
+            if ms <= bound:
+                break
+            index += 1
+        metric.buckets[index] += 1
+        metric.count += 1
+        metric.sum += ms
+        metric.rows += max(rows, 0)
+        metric.terms += terms
+
+    def collect(self):
+        """
+        :returns: list of dict with the ``labels``, ``count``, ``sum_ms``,
+            ``buckets`` (cumulative ``(upper bound, count)``, the last bound
+            is ``float('inf')``), ``rows`` and ``terms`` of each labels
+        """
+        merged = {}
+        with self._lock:
+            self._fold()
+            self._merge(merged, self._finished)
+            for ref, shard in self._shards:
+                self._merge(merged, shard)
+        result = []
+        bounds = self.buckets + (float('inf'), )
+        for labels in sorted(merged):
+            metric = merged[labels]
+            cumulative, buckets = 0, []
+            for bound, count in zip(bounds, metric.buckets):
+                cumulative += count
+                buckets.append((bound, cumulative))
+            result.append({
+                'labels': dict(zip(self.LABELS, labels)),
+                'count': metric.count,
+                'sum_ms': metric.sum,
+                'buckets': buckets,
+                'rows': metric.rows,
+                'terms': metric.terms,
+            })
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._finished.clear()
+            for ref, shard in self._shards:
+                shard.clear()
+
+
+class MetricsCursorWrapper(object):
+    """
+    Cursor wrapper recording the execution of the statements with pg_fts
+    lookups and ranks, replaces the labels in the SQL by a single
+    sqlcommenter comment at the end of the statement if enabled
+    """
+
+    def __init__(self, cursor, registry):
+        self.cursor = cursor
+        self.registry = registry
+
+    def __getattr__(self, attr):
+        return getattr(self.cursor, attr)
+
+    def __iter__(self):
+        return iter(self.cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        return self.cursor.__exit__(type, value, traceback)
+
+    def execute(self, sql, params=None):
+        sql, pending = unmark(sql)
+        if not pending:
+            return self.cursor.execute(sql, params)
+        if sqlcomment.is_enabled():
+            sql = '%s %s' % (sql, get_comment(pending))
+        if not self.registry.enabled:
+            return self.cursor.execute(sql, params)
+        start = time.time()
+        try:
+            result = self.cursor.execute(sql, params)
+        finally:
+            ms = (time.time() - start) * 1000
+            if self.registry.recording:
+                rows = self.cursor.rowcount
+                for labels, terms in pending:
+                    self.registry.observe(labels, terms, ms, rows)
+        # only the statements executed without errors
+        for observer in self.registry.observers:
+            observer(self.cursor.db, sql, params,
+                     [labels for labels, terms in pending], ms)
+        return result
+
+
+registry = MetricsRegistry()
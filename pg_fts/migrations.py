@@ -1,7 +1,14 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
+import time
+from contextlib import contextmanager
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+from django.db import models, transaction
+from django.db.transaction import TransactionManagementError
 from django.db.migrations.operations.base import Operation
+from pg_fts import sqlcomment
 from pg_fts.fields import TSVectorField
+from pg_fts.introspection import PgFTSIntrospection
 
 
 __all__ = ('CreateFTSIndexOperation', 'CreateFTSTriggerOperation',
@@ -19,12 +26,17 @@ __all__ = ('CreateFTSIndexOperation', 'CreateFTSTriggerOperation',
 
 
 class PgFtsSQL(object):
-    sql_delete_trigger = ("DROP TRIGGER {model}_{fts_name}_update ON \"{model}\";"
+    sql_delete_trigger = ("DROP TRIGGER IF EXISTS {model}_{fts_name}_insert "
+                          "ON \"{model}\";"
+                          "DROP TRIGGER {model}_{fts_name}_update ON \"{model}\";"
                           "DROP FUNCTION {model}_{fts_name}_update()")
 
     sql_create_trigger = """
 CREATE FUNCTION {model}_{fts_name}_update() RETURNS TRIGGER AS $$
 BEGIN
+    IF current_setting('pg_fts.{model}_{fts_name}', true) = 'on' THEN
+        RETURN NEW;
+    END IF;
     IF TG_OP = 'INSERT' THEN
         new.{fts_name} = {vectors};
     END IF;
@@ -38,23 +50,177 @@ BEGIN
 RETURN NEW;
 END;
 $$ LANGUAGE 'plpgsql';
-CREATE TRIGGER {model}_{fts_name}_update BEFORE INSERT OR UPDATE ON \"{model}\"
+CREATE TRIGGER {model}_{fts_name}_insert BEFORE INSERT ON \"{model}\"
+FOR EACH ROW EXECUTE PROCEDURE {model}_{fts_name}_update();
+CREATE TRIGGER {model}_{fts_name}_update BEFORE UPDATE OF {columns} ON \"{model}\"
+FOR EACH ROW EXECUTE PROCEDURE {model}_{fts_name}_update()"""
+
+    sql_create_statement_trigger = """
+CREATE FUNCTION {model}_{fts_name}_update() RETURNS TRIGGER AS $$
+BEGIN
+    IF current_setting('pg_fts.{model}_{fts_name}', true) = 'on' THEN
+        RETURN NULL;
+    END IF;
+    PERFORM set_config('pg_fts.{model}_{fts_name}', 'on', true);
+    IF TG_OP = 'INSERT' THEN
+        UPDATE \"{model}\" SET {fts_name} = {vectors}
+        FROM new_rows WHERE \"{model}\".{pk} = new_rows.{pk};
+    ELSE
+        UPDATE \"{model}\" SET {fts_name} = {vectors}
+        FROM new_rows JOIN old_rows ON new_rows.{pk} = old_rows.{pk}
+        WHERE \"{model}\".{pk} = new_rows.{pk} AND ({fts_fields});
+    END IF;
+    PERFORM set_config('pg_fts.{model}_{fts_name}', 'off', true);
+RETURN NULL;
+END;
+$$ LANGUAGE 'plpgsql';
+CREATE TRIGGER {model}_{fts_name}_insert AFTER INSERT ON \"{model}\"
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE PROCEDURE {model}_{fts_name}_update();
+CREATE TRIGGER {model}_{fts_name}_update AFTER UPDATE ON \"{model}\"
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE PROCEDURE {model}_{fts_name}_update()"""
+
+    sql_create_queue_trigger = """
+CREATE TABLE \"{queue}\" AS SELECT {pk} FROM \"{model}\" WITH NO DATA;
+ALTER TABLE \"{queue}\" ADD PRIMARY KEY ({pk});
+CREATE FUNCTION {model}_{fts_name}_update() RETURNS TRIGGER AS $$
+BEGIN
+    IF current_setting('pg_fts.{model}_{fts_name}', true) = 'on' THEN
+        RETURN NEW;
+    END IF;
+    IF TG_OP = 'UPDATE' THEN
+        IF NOT ({fts_fields}) THEN
+            new.{fts_name} = old.{fts_name};
+            RETURN NEW;
+        END IF;
+    END IF;
+    INSERT INTO \"{queue}\" ({pk}) VALUES (NEW.{pk}) ON CONFLICT DO NOTHING;
+RETURN NEW;
+END;
+$$ LANGUAGE 'plpgsql';
+CREATE TRIGGER {model}_{fts_name}_insert BEFORE INSERT ON \"{model}\"
+FOR EACH ROW EXECUTE PROCEDURE {model}_{fts_name}_update();
+CREATE TRIGGER {model}_{fts_name}_update BEFORE UPDATE OF {columns} ON \"{model}\"
 FOR EACH ROW EXECUTE PROCEDURE {model}_{fts_name}_update()"""
 
-    sql_create_index = ("CREATE INDEX {model}_{fts_name} ON \"{model}\" "
-                        "USING {fts_index}({fts_name})")
+    sql_delete_queue = ';DROP TABLE IF EXISTS \"{queue}\"'
+
+    sql_drain_queue = """
+WITH locked AS (
+    SELECT \"{model}\".{pk} FROM \"{model}\"
+    JOIN \"{queue}\" ON \"{queue}\".{pk} = \"{model}\".{pk}
+    ORDER BY \"{model}\".{pk} LIMIT %s
+    FOR UPDATE OF \"{model}\" SKIP LOCKED
+), batch AS (
+    DELETE FROM \"{queue}\" WHERE {pk} IN (SELECT {pk} FROM locked)
+    RETURNING {pk}
+), vectors AS (
+    UPDATE \"{model}\" SET {vector} = {fields}
+    FROM batch WHERE \"{model}\".{pk} = batch.{pk}
+), deleted AS (
+    DELETE FROM \"{queue}\" WHERE {pk} IN (
+        SELECT {pk} FROM \"{queue}\" WHERE NOT EXISTS (
+            SELECT 1 FROM \"{model}\"
+            WHERE \"{model}\".{pk} = \"{queue}\".{pk})
+        LIMIT %s FOR UPDATE SKIP LOCKED)
+    RETURNING {pk}
+)
+SELECT (SELECT count(*) FROM batch) + (SELECT count(*) FROM deleted)"""
+
+    sql_create_vector_function = """
+CREATE FUNCTION {function}({arguments}) RETURNS tsvector AS $$
+SELECT {vectors}
+$$ LANGUAGE sql IMMUTABLE PARALLEL SAFE"""
+
+    sql_delete_vector_function = 'DROP FUNCTION {function}({types})'
+
+    sql_skip_trigger = "SELECT set_config('pg_fts.{model}_{fts_name}', %s, true)"
+
+    sql_create_index = ("CREATE INDEX {concurrently}{index_name} ON "
+                        "\"{model}\" USING {fts_index}({fts_name}{opclass})"
+                        "{storage}{where}")
+
+    sql_delete_index = 'DROP INDEX {concurrently}{index_name}'
+
+    sql_delete_invalid_index = """
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_index
+               WHERE indexrelid = to_regclass('{index_name}')
+               AND NOT indisvalid) THEN
+        DROP INDEX {index_name};
+    END IF;
+END
+$$"""
+
+    sql_index_where = " WHERE {dictionary} = '{value}'"
+
+    sql_generated_column = 'tsvector GENERATED ALWAYS AS ({fields}) STORED'
+
+    sql_immutable_dictionary = ("CASE {dictionary} {cases} "
+                                "ELSE '{default}'::regconfig END")
 
-    sql_delete_index = 'DROP INDEX {model}_{fts_name}'
+    sql_immutable_case = "WHEN '{dictionary}' THEN '{dictionary}'::regconfig"
+
+    sql_set = 'SET {local}{name} = {value}'
+
+    sql_reset = 'RESET {name}'
 
     sql_update_vector = 'UPDATE \"{model}\" SET {vector} = {fields}'
 
-    def delete_trigger(self, model, field):
-        return self.sql_delete_trigger.format(
+    sql_pk_range = ' WHERE {pk} BETWEEN %s AND %s'
+
+    sql_update_vector_batch = ('UPDATE \"{model}\" SET {vector} = {fields} '
+                               'WHERE {pk} IN (SELECT {pk} FROM \"{model}\"'
+                               '{where} ORDER BY {pk} LIMIT %s) RETURNING {pk}')
+
+    sql_create_progress = ('CREATE TABLE IF NOT EXISTS pg_fts_progress ('
+                           'name varchar(255) PRIMARY KEY, last_pk text)')
+
+    sql_get_progress = 'SELECT last_pk FROM pg_fts_progress WHERE name = %s'
+
+    sql_update_progress = ('UPDATE pg_fts_progress SET last_pk = %s '
+                           'WHERE name = %s')
+
+    sql_insert_progress = ('INSERT INTO pg_fts_progress (last_pk, name) '
+                           'VALUES (%s, %s)')
+
+    sql_delete_progress = 'DELETE FROM pg_fts_progress WHERE name = %s'
+
+    sql_lock_progress = 'LOCK TABLE pg_fts_progress IN ACCESS EXCLUSIVE MODE'
+
+    sql_exists_progress = 'SELECT EXISTS (SELECT 1 FROM pg_fts_progress)'
+
+    sql_drop_progress = 'DROP TABLE pg_fts_progress'
+
+    def delete_trigger(self, model, field, level='row'):
+        if getattr(field, 'storage', None) == 'expression':
+            return self.comment(self.delete_vector_function(model, field),
+                                model, field, 'delete_trigger')
+        sql = self.sql_delete_trigger
+        if level == 'queue':
+            sql += self.sql_delete_queue
+        return self.comment(sql.format(
             model=model._meta.db_table,
-            fts_name=field.get_attname_column()[1]
-        )
+            fts_name=field.get_attname_column()[1],
+            queue=self.get_queue_name(model, field)
+        ), model, field, 'delete_trigger')
+
+    def get_queue_name(self, model, vector_field):
+        return '%s_%s_queue' % (model._meta.db_table,
+                                vector_field.get_attname_column()[1])
 
-    def create_fts_trigger(self, model, vector_field):
+    def create_fts_trigger(self, model, vector_field, level='row'):
+        """
+        :param level: ``row`` ``BEFORE INSERT`` and ``BEFORE UPDATE OF``
+            the fields triggers ``FOR EACH ROW``, ``statement`` ``AFTER``
+            triggers ``FOR EACH STATEMENT`` with transition tables,
+            ``queue`` the row triggers only add the primary key to a queue
+            table, the vectors are updated by ``fts_drain_queue`` command
+
+        :returns: The vector function in case of ``expression`` storage
+        """
 
         fields = []
         vectors = []
@@ -62,27 +228,172 @@ FOR EACH ROW EXECUTE PROCEDURE {model}_{fts_name}_update()"""
         if not isinstance(vector_field, TSVectorField):
             raise AttributeError
 
+        if vector_field.storage == 'expression':
+            return self.comment(
+                self.create_vector_function(model, vector_field), model,
+                vector_field, 'create_trigger')
+
+        if level == 'statement':
+            return self.comment(
+                self.create_statement_trigger(model, vector_field), model,
+                vector_field, 'create_trigger')
+        if level == 'queue':
+            return self.comment(
+                self.create_queue_trigger(model, vector_field), model,
+                vector_field, 'create_trigger')
+
         try:
             dict_field = model._meta.get_field(vector_field.dictionary)
             dictionary = "NEW.%s::regconfig" % (
                 dict_field.get_attname_column()[1])
-            fields.append('NEW.{0} <> OLD.{0}'.format(vector_field.dictionary))
+            fields.append(dict_field.get_attname_column()[1])
         except:
             dictionary = "'%s'" % vector_field.dictionary
 
         for field, rank in vector_field._get_fields_and_ranks():
-            fields.append('NEW.{0} <> OLD.{0}'.format(
-                field.get_attname_column()[1]))
+            fields.append(field.get_attname_column()[1])
             vectors.append(self._get_vector_for_field(field, rank, dictionary))
 
-        return self.sql_create_trigger.format(
+        return self.comment(self.sql_create_trigger.format(
+            model=model._meta.db_table,
+            fts_name=vector_field.get_attname_column()[1],
+            # with the vector, a update of the vector keeps the old value
+            columns=', '.join(fields + [vector_field.get_attname_column()[1]]),
+            fts_fields=' OR '.join(
+                'NEW.{0} IS DISTINCT FROM OLD.{0}'.format(f) for f in fields),
+            vectors=' || '.join(vectors)
+        ), model, vector_field, 'create_trigger')
+
+    def create_statement_trigger(self, model, vector_field):
+        """
+        The vectors of the inserted rows, or updated rows with changes in the
+        fields, are updated in a single ``UPDATE ... FROM new_rows``, the
+        ``UPDATE`` doesn't fire the trigger again
+        """
+        fields = []
+        vectors = []
+
+        try:
+            dict_field = model._meta.get_field(vector_field.dictionary)
+            dictionary = "new_rows.%s::regconfig" % (
+                dict_field.get_attname_column()[1])
+            fields.append(dict_field.get_attname_column()[1])
+        except:
+            dictionary = "'%s'" % vector_field.dictionary
+
+        for field, rank in vector_field._get_fields_and_ranks():
+            fields.append(field.get_attname_column()[1])
+            vectors.append(self._get_vector_for_field(
+                field, rank, dictionary, 'new_rows'))
+
+        return self.sql_create_statement_trigger.format(
             model=model._meta.db_table,
             fts_name=vector_field.get_attname_column()[1],
-            fts_fields=' OR '.join(fields),
+            pk=model._meta.pk.get_attname_column()[1],
+            fts_fields=' OR '.join(
+                'new_rows.{0} IS DISTINCT FROM old_rows.{0}'.format(f)
+                for f in fields),
             vectors=' || '.join(vectors)
         )
 
+    def create_queue_trigger(self, model, vector_field):
+        """
+        Creates the queue table and the triggers adding the primary key of
+        the inserted rows, or updated rows with changes in the fields
+        """
+        fields = [f.get_attname_column()[1]
+                  for f, rank in vector_field._get_fields_and_ranks()]
+        try:
+            dict_field = model._meta.get_field(vector_field.dictionary)
+            fields.insert(0, dict_field.get_attname_column()[1])
+        except:
+            pass
+        fts_name = vector_field.get_attname_column()[1]
+
+        return self.sql_create_queue_trigger.format(
+            model=model._meta.db_table,
+            fts_name=fts_name,
+            queue=self.get_queue_name(model, vector_field),
+            pk=model._meta.pk.get_attname_column()[1],
+            columns=', '.join(fields + [fts_name]),
+            fts_fields=' OR '.join(
+                'NEW.{0} IS DISTINCT FROM OLD.{0}'.format(f) for f in fields)
+        )
+
+    def drain_queue(self, model, vector_field):
+        """
+        Removes a batch from the queue and updates the vectors, the rows of
+        the table are locked first with ``FOR UPDATE SKIP LOCKED``, the rows
+        locked by other workers or by writes in progress are skipped, the
+        batch doesn't wait for the writes and the writes don't wait for the
+        queue rows removed by the batch. Removes the rows of deleted rows of
+        the table
+
+        :returns: sql with the batch size params, two, returns the number of
+            rows removed from the queue
+        """
+        return self.comment(self.sql_drain_queue.format(
+            model=model._meta.db_table,
+            queue=self.get_queue_name(model, vector_field),
+            pk=model._meta.pk.get_attname_column()[1],
+            vector=vector_field.get_attname_column()[1],
+            fields=self.get_vector(model, vector_field)
+        ), model, vector_field, 'drain_queue')
+
+    def skip_trigger(self, model, vector_field):
+        """
+        :returns: sql with a ``'on'`` or ``'off'`` param, with ``'on'`` the
+            triggers do nothing until the end of the transaction
+        """
+        return self.sql_skip_trigger.format(
+            model=model._meta.db_table,
+            fts_name=vector_field.get_attname_column()[1]
+        )
+
     def update_vector(self, model, vector_field):
+        return self.comment(self._update_vector(model, vector_field), model,
+                            vector_field, 'update_vector')
+
+    def _update_vector(self, model, vector_field):
+        return self.sql_update_vector.format(
+            model=model._meta.db_table,
+            vector=vector_field.get_attname_column()[1],
+            fields=self.get_vector(model, vector_field)
+        )
+
+    def update_vector_range(self, model, vector_field):
+        """
+        :returns: sql with the params first and last primary key of the range
+        """
+        return self.comment(self._update_vector(model, vector_field) + (
+            self.sql_pk_range.format(
+                pk=model._meta.pk.get_attname_column()[1])),
+            model, vector_field, 'update_vector')
+
+    def update_vector_batch(self, model, vector_field, first=False):
+        """
+        Updates the next batch of rows ordered by primary key
+
+        :returns: sql with the params last primary key updated (if not
+            ``first``) and the batch size, returns the updated primary keys
+        """
+        pk = model._meta.pk.get_attname_column()[1]
+        return self.comment(self.sql_update_vector_batch.format(
+            model=model._meta.db_table,
+            vector=vector_field.get_attname_column()[1],
+            fields=self.get_vector(model, vector_field),
+            pk=pk,
+            where='' if first else ' WHERE %s > %%s' % pk
+        ), model, vector_field, 'update_vector')
+
+    def get_vector(self, model, vector_field, immutable=False):
+        """
+        :param immutable: the multiple dictionaries ``dictionary::regconfig``
+            cast isn't immutable, a ``CASE`` with the dictionary field
+            choices is used
+
+        :returns: The sql expression of the vector from the table columns
+        """
         vectors = []
         sql_fn = "setweight(to_tsvector(%s, COALESCE(%s, '')), '%s')"
 
@@ -91,8 +402,12 @@ FOR EACH ROW EXECUTE PROCEDURE {model}_{fts_name}_update()"""
 
         try:
             dict_field = model._meta.get_field(vector_field.dictionary)
-            dictionary = "%s::regconfig" % (
-                dict_field.get_attname_column()[1])
+            if immutable:
+                dictionary = self.get_immutable_dictionary(
+                    dict_field, vector_field.get_dictionary())
+            else:
+                dictionary = "%s::regconfig" % (
+                    dict_field.get_attname_column()[1])
         except:
             dictionary = "'%s'" % vector_field.dictionary
 
@@ -100,30 +415,203 @@ FOR EACH ROW EXECUTE PROCEDURE {model}_{fts_name}_update()"""
             vectors.append(sql_fn % (
                 dictionary, field.get_attname_column()[1], rank))
 
-        return self.sql_update_vector.format(
-            model=model._meta.db_table,
-            vector=vector_field.get_attname_column()[1],
-            fields=' || '.join(vectors)
+        return ' || '.join(vectors)
+
+    def get_immutable_dictionary(self, dict_field, default):
+        return self.sql_immutable_dictionary.format(
+            dictionary=dict_field.get_attname_column()[1],
+            cases=' '.join(self.sql_immutable_case.format(dictionary=d)
+                           for d, label in dict_field.choices),
+            default=default
         )
 
-    def _get_vector_for_field(self, field, weight, dictionary):
-        return "setweight(to_tsvector(%s, COALESCE(NEW.%s, '')), '%s')" % (
-            dictionary, field.get_attname_column()[1], weight
+    def generated_column(self, model, vector_field):
+        """
+        :returns: The column type of a
+            :class:`~pg_fts.fields.TSVectorField` with ``generated`` storage
+        """
+        return self.sql_generated_column.format(
+            fields=self.get_vector(model, vector_field, immutable=True))
+
+    def get_vector_function(self, model, vector_field):
+        return '%s_%s_vector' % (model._meta.db_table,
+                                 vector_field.get_attname_column()[1])
+
+    def get_vector_columns(self, model, vector_field):
+        """
+        :returns: The columns of the vector, the arguments of the vector
+            function, the dictionary column first
+        """
+        columns = [f.get_attname_column()[1]
+                   for f, rank in vector_field._get_fields_and_ranks()]
+        try:
+            dict_field = model._meta.get_field(vector_field.dictionary)
+            columns.insert(0, dict_field.get_attname_column()[1])
+        except models.FieldDoesNotExist:
+            pass
+        return columns
+
+    def create_vector_function(self, model, vector_field):
+        """
+        The function of the vector of a :class:`~pg_fts.fields.TSVectorField`
+        with ``expression`` storage, used by the index and the lookups
+
+        The function is ``IMMUTABLE``, required by the index, in case of
+        multiple dictionaries the dictionary is a ``CASE`` with the
+        dictionary field choices, and ``PARALLEL SAFE`` (PostgreSQL 9.6+)
+        """
+        return self.sql_create_vector_function.format(
+            function=self.get_vector_function(model, vector_field),
+            arguments=', '.join(
+                '%s text' % c
+                for c in self.get_vector_columns(model, vector_field)),
+            vectors=self.get_vector(model, vector_field, immutable=True)
         )
 
-    def create_index(self, model, vector_field, index):
-        return self.sql_create_index.format(
-            model=model._meta.db_table,
-            fts_index=index,
-            fts_name=vector_field.get_attname_column()[1]
+    def delete_vector_function(self, model, vector_field):
+        return self.sql_delete_vector_function.format(
+            function=self.get_vector_function(model, vector_field),
+            types=', '.join(
+                'text' for c in self.get_vector_columns(model, vector_field))
         )
 
-    def delete_index(self, model, vector_field):
-        return self.sql_delete_index.format(
-            model=model._meta.db_table,
-            fts_name=vector_field.get_attname_column()[1]
+    def call_vector_function(self, model, vector_field, columns=None):
+        """
+        :param columns: The sql of the arguments, default the columns
+            without table
+
+        :returns: The sql of the vector function call
+        """
+        if columns is None:
+            columns = self.get_vector_columns(model, vector_field)
+        return '%s(%s)' % (self.get_vector_function(model, vector_field),
+                           ', '.join(columns))
+
+    def _get_vector_for_field(self, field, weight, dictionary, row='NEW'):
+        return "setweight(to_tsvector(%s, COALESCE(%s.%s, '')), '%s')" % (
+            dictionary, row, field.get_attname_column()[1], weight
         )
 
+    def create_index(self, model, vector_field, index, concurrently=False,
+                     storage=None, opclass=None, dictionary=None):
+        """
+        :param storage: dict with the index storage parameters
+
+        :param opclass: dict with the ``tsvector_ops`` operator class
+            parameters
+
+        :param dictionary: a value of the dictionary field, creates a
+            partial index of the rows with this dictionary
+        """
+        column = vector_field.get_attname_column()[1]
+        if getattr(vector_field, 'storage', None) == 'expression':
+            # a index of the vector function
+            column = '(%s)' % self.call_vector_function(model, vector_field)
+        where = ''
+        if dictionary is not None:
+            where = self.sql_index_where.format(
+                dictionary=model._meta.get_field(
+                    vector_field.dictionary).get_attname_column()[1],
+                value=dictionary.replace("'", "''"))
+        return self.comment(self.sql_create_index.format(
+            model=model._meta.db_table,
+            index_name=self.get_index_name(model, vector_field, dictionary),
+            fts_index=index,
+            fts_name=column,
+            where=where,
+            concurrently='CONCURRENTLY ' if concurrently else '',
+            opclass=' tsvector_ops (%s)' % self._get_options(
+                opclass) if opclass else '',
+            storage=' WITH (%s)' % self._get_options(
+                storage) if storage else ''
+        ), model, vector_field, 'create_index')
+
+    def delete_index(self, model, vector_field, concurrently=False,
+                     dictionary=None):
+        return self.comment(self.sql_delete_index.format(
+            index_name=self.get_index_name(model, vector_field, dictionary),
+            concurrently='CONCURRENTLY IF EXISTS ' if concurrently else ''
+        ), model, vector_field, 'delete_index')
+
+    def delete_invalid_index(self, model, vector_field, dictionary=None):
+        """
+        :returns: sql dropping the index only if invalid, left by a failed
+            ``CREATE INDEX CONCURRENTLY``, ``DROP INDEX CONCURRENTLY`` can't
+            run in the ``DO`` block
+        """
+        return self.comment(self.sql_delete_invalid_index.format(
+            index_name=self.get_index_name(model, vector_field, dictionary)
+        ), model, vector_field, 'delete_index')
+
+    def get_index_name(self, model, vector_field, dictionary=None):
+        name = '%s_%s' % (model._meta.db_table,
+                          vector_field.get_attname_column()[1])
+        if dictionary is not None:
+            name = '%s_%s' % (name, dictionary)
+        return name
+
+    def get_function_sources(self, model, vector_field):
+        """
+        :returns: The name of the trigger function, or the vector function in
+            case of ``expression`` storage, and the sources created by the
+            current definition of the field (the source of each trigger
+            level), ``None`` for ``generated`` storage
+        """
+        if vector_field.storage == 'generated':
+            return None
+        if vector_field.storage == 'expression':
+            name = self.get_vector_function(model, vector_field)
+            sqls = [self.create_vector_function(model, vector_field)]
+        else:
+            name = '%s_%s_update' % (model._meta.db_table,
+                                     vector_field.get_attname_column()[1])
+            sqls = [self.create_fts_trigger(model, vector_field, level)
+                    for level in CreateFTSTriggerOperation.LEVELS]
+        return name, [sql.split('$$')[1] for sql in sqls]
+
+    def get_index_names(self, model, vector_field):
+        """
+        :returns: The names of the index and, in case of multiple
+            dictionaries, the partial indexes of each dictionary
+        """
+        names = [self.get_index_name(model, vector_field)]
+        try:
+            dict_field = model._meta.get_field(vector_field.dictionary)
+            names.extend(self.get_index_name(model, vector_field, value)
+                         for value, label in dict_field.choices)
+        except models.FieldDoesNotExist:
+            pass
+        return names
+
+    def comment(self, sql, model, vector_field, action):
+        """
+        :returns: ``sql`` with a sqlcommenter comment of the model, field and
+            ``action``, if enabled with the setting ``PG_FTS_SQL_COMMENT``
+        """
+        if not sqlcomment.is_enabled():
+            return sql
+        return '%s %s' % (sql, sqlcomment.comment(
+            model='%s.%s' % (model._meta.app_label, model._meta.object_name),
+            field=vector_field.name, action=action))
+
+    def set_parameter(self, name, value, local=False):
+        return self.sql_set.format(name=name, value=self._get_value(value),
+                                   local='LOCAL ' if local else '')
+
+    def reset_parameter(self, name):
+        return self.sql_reset.format(name=name)
+
+    def _get_options(self, options):
+        return ', '.join('%s = %s' % (k, self._get_value(v))
+                         for k, v in sorted(options.items()))
+
+    def _get_value(self, value):
+        if isinstance(value, bool):
+            return 'on' if value else 'off'
+        if isinstance(value, int):
+            return '%d' % value
+        return "'%s'" % value.replace("'", "''")
+
 
 class BaseVectorOperation(Operation):
     """
@@ -139,6 +627,8 @@ class BaseVectorOperation(Operation):
     sql_creator = PgFtsSQL()
     forward_fn = None
     backward_fn = None
+    # the vector of a generated column is computed by the database
+    skip_storages = ('generated',)
 
     def __init__(self, name, fts_vector):
         self.name = name
@@ -147,11 +637,46 @@ class BaseVectorOperation(Operation):
     def state_forwards(self, app_label, state):
         pass
 
+    @contextmanager
+    def non_atomic_connection(self, schema_editor):
+        """
+        Yields a connection in autocommit, django < 1.10 always runs the
+        migration in a transaction, in that case a new connection is used,
+        only if the transaction has no statements, the new connection would
+        wait for the locks and snapshot of the migration transaction, that
+        waits for the operation
+
+        :raises: TransactionManagementError if the migration transaction
+            already has statements
+        """
+        connection = schema_editor.connection
+        if not connection.in_atomic_block:
+            yield connection
+            return
+        if connection.connection is not None and (
+                connection.connection.get_transaction_status() !=
+                TRANSACTION_STATUS_IDLE):
+            raise TransactionManagementError(
+                '%s runs outside the migration transaction, set atomic = '
+                'False in the Migration (Django 1.10+) or use a migration '
+                'with only this operation' % self.__class__.__name__)
+        connection = connection.__class__(
+            connection.settings_dict, connection.alias)
+        try:
+            yield connection
+        finally:
+            connection.close()
+
+    def is_skipped(self, vector_field):
+        return getattr(vector_field, 'storage', None) in self.skip_storages
+
     def database_forwards(self, app_label, schema_editor, from_state,
                           to_state):
 
-        model = from_state.render().get_model(app_label, self.name)
+        model = from_state.apps.get_model(app_label, self.name)
         vector_field = model._meta.get_field(self.fts_vector)
+        if self.is_skipped(vector_field):
+            return
         schema_editor.execute(self.forward_fn(
             model,
             vector_field
@@ -160,9 +685,10 @@ class BaseVectorOperation(Operation):
     def database_backwards(self, app_label, schema_editor, from_state,
                            to_state):
 
-        model = from_state.render().get_model(app_label, self.name)
+        model = from_state.apps.get_model(app_label, self.name)
         vector_field = model._meta.get_field(self.fts_vector)
-
+        if self.is_skipped(vector_field):
+            return
         schema_editor.execute(self.backward_fn(
             model,
             vector_field
@@ -182,19 +708,122 @@ class UpdateVectorOperation(BaseVectorOperation):
     :param name: The Model name
 
     :param fts_vector: The :class:`~pg_fts.fields.TSVectorField` field name
+
+    :param batch_size: Updates the rows in batches of ``batch_size`` ordered
+        by primary key, committing each batch, the progress is saved in
+        ``pg_fts_progress`` table and an interrupted migration resumes after
+        the last batch committed. Default ``None`` a single ``UPDATE``
+
+    :param throttle: Seconds to sleep between batches
+
+    .. caution::
+
+        The batches are committed outside the migration transaction, set
+        ``atomic = False`` in the Migration (Django 1.10+), Django < 1.10
+        always runs migrations in a transaction, in that case the batches are
+        committed in a new database connection and the operation must be the
+        only one of the migration, raises ``TransactionManagementError``
+        otherwise. The triggers are skipped in the batches, the progress
+        table is dropped when there are no updates in progress.
+
+    .. note::
+
+        Does nothing for a :class:`~pg_fts.fields.TSVectorField` with
+        ``generated`` or ``expression`` storage
     """
 
-    def __init__(self, name, fts_vector):
+    # no column updated by the migration
+    skip_storages = ('generated', 'expression')
+
+    def __init__(self, name, fts_vector, batch_size=None, throttle=0):
+        assert batch_size is None or (
+            isinstance(batch_size, int) and batch_size > 0
+        ), 'batch_size must be a positive integer'
         self.name = name
         self.fts_vector = fts_vector
+        self.batch_size = batch_size
+        self.throttle = throttle
         self.forward_fn = self.sql_creator.update_vector
 
+    @property
+    def atomic(self):
+        return not self.batch_size
+
+    def database_forwards(self, app_label, schema_editor, from_state,
+                          to_state):
+        model = from_state.apps.get_model(app_label, self.name)
+        vector_field = model._meta.get_field(self.fts_vector)
+        if self.is_skipped(vector_field):
+            return
+        if not self.batch_size or schema_editor.collect_sql:
+            sql = self.sql_creator
+            with transaction.atomic(using=schema_editor.connection.alias):
+                # the update trigger would keep the old vector
+                schema_editor.execute(sql.skip_trigger(model, vector_field),
+                                      ['on'])
+                schema_editor.execute(sql.update_vector(model, vector_field))
+                schema_editor.execute(sql.skip_trigger(model, vector_field),
+                                      ['off'])
+            return
+        with self.non_atomic_connection(schema_editor) as connection:
+            self.update_batches(connection, model, vector_field)
+
+    def update_batches(self, connection, model, vector_field):
+        name = '%s.%s' % (model._meta.db_table,
+                          vector_field.get_attname_column()[1])
+        sql = self.sql_creator
+        with connection.cursor() as cursor:
+            cursor.execute(sql.sql_create_progress)
+            cursor.execute(sql.sql_get_progress, [name])
+            row = cursor.fetchone()
+        last_pk = row[0] if row else None
+        autocommit = connection.get_autocommit()
+        connection.set_autocommit(False)
+        try:
+            while True:
+                with connection.cursor() as cursor:
+                    # the update trigger would keep the old vector
+                    cursor.execute(sql.skip_trigger(model, vector_field),
+                                   ['on'])
+                    if last_pk is None:
+                        cursor.execute(
+                            sql.update_vector_batch(
+                                model, vector_field, first=True),
+                            [self.batch_size])
+                    else:
+                        cursor.execute(
+                            sql.update_vector_batch(model, vector_field),
+                            [last_pk, self.batch_size])
+                    pks = [r[0] for r in cursor.fetchall()]
+                    if not pks:
+                        cursor.execute(sql.sql_delete_progress, [name])
+                        # no other updates in progress
+                        cursor.execute(sql.sql_lock_progress)
+                        cursor.execute(sql.sql_exists_progress)
+                        if not cursor.fetchone()[0]:
+                            cursor.execute(sql.sql_drop_progress)
+                        connection.commit()
+                        break
+                    last_pk = max(pks)
+                    cursor.execute(sql.sql_update_progress, [last_pk, name])
+                    if not cursor.rowcount:
+                        cursor.execute(
+                            sql.sql_insert_progress, [last_pk, name])
+                connection.commit()
+                if self.throttle:
+                    time.sleep(self.throttle)
+        except:
+            connection.rollback()
+            raise
+        finally:
+            connection.set_autocommit(autocommit)
+
     def database_backwards(self, app_label, schema_editor, from_state,
                            to_state):
         pass
 
     def describe(self):
-        return "Create trigger `%s` for model `%s`" % (
+        return "Update vector `%s` for model `%s`" % (
             self.fts_vector, self.name
         )
 
@@ -207,24 +836,39 @@ class CreateFTSTriggerOperation(BaseVectorOperation):
     :param name: The Model name
 
     :param fts_vector: The :class:`~pg_fts.fields.TSVectorField` field name
+
+    :param level: ``row`` (default) the vector is updated for each row,
+        ``statement`` the vectors are updated once per statement with
+        transition tables (PostgreSQL 10+), faster for bulk inserts and
+        updates, or ``queue`` the primary keys of changed rows are added to a
+        queue table and the vectors are updated later by the
+        ``fts_drain_queue`` command. The triggers of all the levels require
+        PostgreSQL 9.6+, the skip setting is read with
+        ``current_setting(name, true)``
+
+    .. note::
+
+        Does nothing for a :class:`~pg_fts.fields.TSVectorField` with
+        ``generated`` storage, creates the vector function for ``expression``
+        storage
     """
 
-    def __init__(self, name, fts_vector):
+    LEVELS = ('row', 'statement', 'queue')
+
+    def __init__(self, name, fts_vector, level='row'):
+        assert level in self.LEVELS, "Invalid level '%s'. Options %s " % (
+            level, ', '.join(self.LEVELS))
         self.name = name
         self.fts_vector = fts_vector
-        self.forward_fn = self.sql_creator.create_fts_trigger
-        self.backward_fn = self.sql_creator.delete_trigger
-
-    def database_backwards(self, app_label, schema_editor, from_state,
-                           to_state):
+        self.level = level
 
-        model = from_state.render().get_model(app_label, self.name)
-        vector_field = model._meta.get_field(self.fts_vector)
+    def forward_fn(self, model, vector_field):
+        return self.sql_creator.create_fts_trigger(
+            model, vector_field, self.level)
 
-        schema_editor.execute(self.backward_fn(
-            model,
-            vector_field
-        ))
+    def backward_fn(self, model, vector_field):
+        return self.sql_creator.delete_trigger(
+            model, vector_field, self.level)
 
     def describe(self):
         return "Create trigger `%s` for model `%s`" % (
@@ -232,20 +876,25 @@ class CreateFTSTriggerOperation(BaseVectorOperation):
         )
 
 
-class DeleteFTSTriggerOperation(BaseVectorOperation):
+class DeleteFTSTriggerOperation(CreateFTSTriggerOperation):
     """
     Deletes trigger generated by :class:`~pg_fts.migrations.CreateFTSTriggerOperation`
 
     :param name: The Model name
 
     :param fts_vector: The :class:`~pg_fts.fields.TSVectorField` field name
+
+    :param level: The ``level`` of the trigger created, for reverting the
+        migration
     """
 
-    def __init__(self, name, fts_vector):
-        self.name = name
-        self.fts_vector = fts_vector
-        self.forward_fn = self.sql_creator.delete_trigger
-        self.backward_fn = self.sql_creator.create_fts_trigger
+    def forward_fn(self, model, vector_field):
+        return self.sql_creator.delete_trigger(
+            model, vector_field, self.level)
+
+    def backward_fn(self, model, vector_field):
+        return self.sql_creator.create_fts_trigger(
+            model, vector_field, self.level)
 
     def describe(self):
         return "Delete trigger `%s` for model `%s`" % (
@@ -262,43 +911,157 @@ class CreateFTSIndexOperation(BaseVectorOperation):
     :param index: The type of index 'gin' or 'gist' for more information go to
         :pg_docs:`PostgreSQL documentation 12.9. GiST and GIN Index Types
         <textsearch-indexes.html>`
+    :param concurrently: Uses ``CREATE INDEX CONCURRENTLY`` and
+        ``DROP INDEX CONCURRENTLY``, the table isn't locked for writes during
+        the build, a invalid index left by a failed build is removed before
+        the build. Django < 1.10 runs the migration in a transaction, the
+        index is built in a new connection, only if the operation is the
+        only one of the migration. Default ``False``
+    :param fastupdate: ``gin`` storage parameter ``fastupdate``
+    :param gin_pending_list_limit: ``gin`` storage parameter
+        ``gin_pending_list_limit`` in kB
+    :param siglen: ``gist`` ``tsvector_ops`` parameter ``siglen``, the
+        signature length in bytes (PostgreSQL 13+)
+    :param maintenance_work_mem: ``maintenance_work_mem`` for the build,
+        ex. ``'1GB'``
+    :param max_parallel_maintenance_workers:
+        ``max_parallel_maintenance_workers`` for the build
+    :param per_dictionary: In case of multiple dictionaries, creates a
+        partial index ``WHERE dictionary = 'xx'`` for each choice of the
+        dictionary field, instead of a index for all the rows. Default
+        ``False``
     """
 
     # http://www.postgresql.org/docs/9.3/static/textsearch-indexes.html
     INDEXS = ('gin', 'gist')
-
-    def __init__(self, name, fts_vector, index):
+    STORAGE = {
+        'gin': ('fastupdate', 'gin_pending_list_limit'),
+        'gist': (),
+    }
+    OPCLASS = {
+        'gin': (),
+        'gist': ('siglen',),
+    }
+    PARAMETERS = ('maintenance_work_mem', 'max_parallel_maintenance_workers')
+    introspection = PgFTSIntrospection()
+
+    def __init__(self, name, fts_vector, index, concurrently=False,
+                 per_dictionary=False, **options):
         assert index in self.INDEXS, "Invalid index '%s'. Options %s " % (
             index, ', '.join(self.INDEXS))
+        for option in options:
+            valid = self.STORAGE[index] + self.OPCLASS[index] + self.PARAMETERS
+            assert option in valid, (
+                "Invalid option '%s' for %s index. Options %s" % (
+                    option, index, ', '.join(valid)))
         self.name = name
         self.fts_vector = fts_vector
         self.index = index
+        self.concurrently = concurrently
+        self.per_dictionary = per_dictionary
+        self.options = options
+
+    @property
+    def atomic(self):
+        return not self.concurrently
 
     def state_forwards(self, app_label, state):
         pass
 
+    def get_storage(self):
+        return dict((k, v) for k, v in self.options.items()
+                    if k in self.STORAGE[self.index] and v is not None)
+
+    def get_opclass(self):
+        return dict((k, v) for k, v in self.options.items()
+                    if k in self.OPCLASS[self.index] and v is not None)
+
+    def get_parameters(self):
+        return [(k, self.options[k]) for k in self.PARAMETERS
+                if self.options.get(k) is not None]
+
+    def get_dictionaries(self, model, vector_field):
+        """
+        :returns: the dictionaries of the partial indexes, ``[None]`` for a
+            single index
+        """
+        if not self.per_dictionary:
+            return [None]
+        try:
+            dict_field = model._meta.get_field(vector_field.dictionary)
+        except models.FieldDoesNotExist:
+            raise AttributeError(
+                'per_dictionary is only available for multiple dictionaries')
+        return [value for value, label in dict_field.choices]
+
+    def create_index(self, schema_editor, model, vector_field):
+        for dictionary in self.get_dictionaries(model, vector_field):
+            self._create_index(schema_editor, model, vector_field, dictionary)
+
+    def _create_index(self, schema_editor, model, vector_field, dictionary):
+        sql = self.sql_creator
+        create = sql.create_index(model, vector_field, self.index,
+                                  self.concurrently, self.get_storage(),
+                                  self.get_opclass(), dictionary)
+        if not self.concurrently or schema_editor.collect_sql:
+            for name, value in self.get_parameters():
+                schema_editor.execute(sql.set_parameter(
+                    name, value, local=not self.concurrently))
+            if self.concurrently:
+                # the output can be replayed, a valid index is kept
+                schema_editor.execute(sql.delete_invalid_index(
+                    model, vector_field, dictionary))
+            schema_editor.execute(create)
+            if self.concurrently:
+                for name, value in self.get_parameters():
+                    schema_editor.execute(sql.reset_parameter(name))
+            return
+
+        with self.non_atomic_connection(schema_editor) as connection:
+            with connection.cursor() as cursor:
+                valid = self.introspection.get_index_valid(
+                    cursor, sql.get_index_name(model, vector_field,
+                                               dictionary))
+                if valid is False:
+                    # left by a failed concurrent build
+                    cursor.execute(sql.delete_index(
+                        model, vector_field, True, dictionary))
+                for name, value in self.get_parameters():
+                    cursor.execute(sql.set_parameter(name, value))
+                try:
+                    cursor.execute(create)
+                finally:
+                    for name, value in self.get_parameters():
+                        cursor.execute(sql.reset_parameter(name))
+
+    def delete_index(self, schema_editor, model, vector_field):
+        sqls = [self.sql_creator.delete_index(
+            model, vector_field, self.concurrently, dictionary)
+            for dictionary in self.get_dictionaries(model, vector_field)]
+        if not self.concurrently or schema_editor.collect_sql:
+            for sql in sqls:
+                schema_editor.execute(sql)
+            return
+        with self.non_atomic_connection(schema_editor) as connection:
+            with connection.cursor() as cursor:
+                for sql in sqls:
+                    cursor.execute(sql)
+
     def database_forwards(self, app_label, schema_editor, from_state,
                           to_state):
-        # print(dir(from_state))
-        # django 1.8 doesn't have ProjectState.render()
-        model = from_state.render().get_model(app_label, self.name)
+        model = from_state.apps.get_model(app_label, self.name)
         vector_field = model._meta.get_field(self.fts_vector)
         if not isinstance(vector_field, TSVectorField):
             raise AttributeError
-        schema_editor.execute(self.sql_creator.create_index(
-            model, vector_field, self.index
-        ))
+        self.create_index(schema_editor, model, vector_field)
 
     def database_backwards(self, app_label, schema_editor, from_state,
                            to_state):
 
-        model = from_state.render().get_model(app_label, self.name)
+        model = from_state.apps.get_model(app_label, self.name)
         vector_field = model._meta.get_field(self.fts_vector)
 
-        schema_editor.execute(self.sql_creator.delete_index(
-            model,
-            vector_field
-        ))
+        self.delete_index(schema_editor, model, vector_field)
 
     def describe(self):
         return "Create %s index `%s` for model `%s`" % (
@@ -313,29 +1076,122 @@ class DeleteFTSIndexOperation(CreateFTSIndexOperation):
     :param name: The Model name
     :param fts_vector: The :class:`~pg_fts.fields.TSVectorField` field name
     :param index: The type of index 'gin' or 'gist' for more information go to
+    :param concurrently: Uses ``DROP INDEX CONCURRENTLY``, the options are the
+        same of :class:`~pg_fts.migrations.CreateFTSIndexOperation` for
+        reverting the migration
     """
 
     def database_forwards(self, app_label, schema_editor, from_state,
                           to_state):
-        model = from_state.render().get_model(app_label, self.name)
+        model = from_state.apps.get_model(app_label, self.name)
         vector_field = model._meta.get_field(self.fts_vector)
 
-        schema_editor.execute(self.sql_creator.delete_index(
-            model,
-            vector_field
-        ))
+        self.delete_index(schema_editor, model, vector_field)
 
     def database_backwards(self, app_label, schema_editor, from_state,
                            to_state):
 
-        model = from_state.render().get_model(app_label, self.name)
+        model = from_state.apps.get_model(app_label, self.name)
         vector_field = model._meta.get_field(self.fts_vector)
         if not isinstance(vector_field, TSVectorField):
             raise AttributeError
-        schema_editor.execute(self.sql_creator.create_index(
-            model, vector_field, self.index))
+        self.create_index(schema_editor, model, vector_field)
 
     def describe(self):
         return "Delete %s index `%s` for model `%s`" % (
             self.index, self.fts_vector, self.name
         )
+
+
+class AlterFTSStorageOperation(BaseVectorOperation):
+    """
+    Changes the storage of a :class:`~pg_fts.fields.TSVectorField`, from a
+    column updated by the trigger to a ``generated`` column or the reverse
+
+    The column is removed and added again, the index is removed with the
+    column.
+
+    :param name: The Model name
+
+    :param fts_vector: The :class:`~pg_fts.fields.TSVectorField` field name
+
+    :param storage: The new storage ``trigger`` or ``generated``
+
+    :param index: The type of index 'gin' or 'gist' to create again after
+        the column, default ``None`` no index
+
+    :param level: The ``level`` of the trigger, see
+        :class:`~pg_fts.migrations.CreateFTSTriggerOperation`
+
+    .. note::
+
+        ``expression`` storage isn't supported, the field has no column
+    """
+
+    STORAGES = ('trigger', 'generated')
+    skip_storages = ()
+
+    def __init__(self, name, fts_vector, storage, index=None, level='row'):
+        assert storage in self.STORAGES, (
+            "Invalid storage '%s'. Options %s " % (
+                storage, ', '.join(self.STORAGES)))
+        assert index is None or index in CreateFTSIndexOperation.INDEXS, (
+            "Invalid index '%s'. Options %s " % (
+                index, ', '.join(CreateFTSIndexOperation.INDEXS)))
+        self.name = name
+        self.fts_vector = fts_vector
+        self.storage = storage
+        self.index = index
+        self.level = level
+
+    def state_forwards(self, app_label, state):
+        self._set_storage(app_label, state, self.storage)
+
+    def _set_storage(self, app_label, state, storage):
+        model_state = state.models[app_label, self.name.lower()]
+        fields = []
+        for name, field in model_state.fields:
+            if name == self.fts_vector:
+                path, args, kwargs = field.deconstruct()[1:]
+                kwargs['storage'] = storage
+                field = field.__class__(*args, **kwargs)
+            fields.append((name, field))
+        model_state.fields = fields
+        state.reload_model(app_label, self.name.lower())
+
+    def alter_storage(self, app_label, schema_editor, from_state, to_state):
+        from_model = from_state.apps.get_model(app_label, self.name)
+        from_field = from_model._meta.get_field(self.fts_vector)
+        to_model = to_state.apps.get_model(app_label, self.name)
+        to_field = to_model._meta.get_field(self.fts_vector)
+        if from_field.storage == to_field.storage:
+            return
+        assert from_field.storage in self.STORAGES, (
+            "Invalid storage '%s'. Options %s " % (
+                from_field.storage, ', '.join(self.STORAGES)))
+        if from_field.storage == 'trigger':
+            schema_editor.execute(self.sql_creator.delete_trigger(
+                from_model, from_field, self.level))
+        schema_editor.remove_field(from_model, from_field)
+        schema_editor.add_field(to_model, to_field)
+        if to_field.storage == 'trigger':
+            schema_editor.execute(
+                self.sql_creator.update_vector(to_model, to_field))
+            schema_editor.execute(self.sql_creator.create_fts_trigger(
+                to_model, to_field, self.level))
+        if self.index:
+            schema_editor.execute(self.sql_creator.create_index(
+                to_model, to_field, self.index))
+
+    def database_forwards(self, app_label, schema_editor, from_state,
+                          to_state):
+        self.alter_storage(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state,
+                           to_state):
+        self.alter_storage(app_label, schema_editor, from_state, to_state)
+
+    def describe(self):
+        return "Alter storage of `%s` for model `%s` to %s" % (
+            self.fts_vector, self.name, self.storage
+        )
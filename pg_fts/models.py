@@ -1,3 +1,13 @@
+from django.conf import settings
 from django.db import models
+from pg_fts import metrics, slowlog
 
-# Create your models here.
+# registers the system checks
+from pg_fts import checks  # NOQA
+
+if getattr(settings, 'PG_FTS_METRICS', False):
+    metrics.registry.enable()
+
+if getattr(settings, 'PG_FTS_SLOW_SEARCH', None) is not None:
+    slowlog.slow_log.configure(**settings.PG_FTS_SLOW_SEARCH)
+    slowlog.slow_log.enable()
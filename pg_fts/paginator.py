@@ -0,0 +1,298 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import base64
+import json
+
+from django.core.paginator import InvalidPage, Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models.expressions import Func
+from django.db.models.fields import FloatField
+from django.db.models.sql.where import AND
+from django.utils import six
+from django.utils.encoding import force_bytes, force_text
+from pg_fts.ranks import without_ranks
+
+__all__ = ('FTSCursorPaginator', 'FTSCursorPage', 'RankSeek', 'FTSCount',
+           'FTSPaginator')
+
+"""
+    pg_fts.paginator
+    ----------------
+
+    Paginators and counts for full text search querysets
+
+    @author: David Miguel
+
+"""
+
+
+class RankSeek(object):
+    """
+    Where node for the keyset seek ``(rank, pk) < (%s, %s)``
+
+    :param rank: The rank expression, as in ``query.annotations``
+
+    :param pk: The primary key column expression
+
+    :param values: tuple with the rank and primary key of the last row
+    """
+
+    contains_aggregate = False
+    sql = '(%s, %s) %s (CAST(%%s AS real), %%s)'
+
+    def __init__(self, rank, pk, values, descending=True):
+        self.rank, self.pk, self.values = rank, pk, values
+        self.descending = descending
+
+    def as_sql(self, compiler, connection):
+        rank, rank_params = compiler.compile(self.rank)
+        pk, pk_params = compiler.compile(self.pk)
+        return self.sql % (rank, pk, '<' if self.descending else '>'), (
+            list(rank_params) + list(pk_params) + list(self.values))
+
+    def relabeled_clone(self, change_map):
+        return self.__class__(
+            self.rank.relabeled_clone(change_map),
+            self.pk.relabeled_clone(change_map),
+            self.values, self.descending)
+
+    def get_group_by_cols(self):
+        return []
+
+
+class RankValue(Func):
+    """
+    The rank selected as ``double precision``, the ``real`` of the rank
+    functions is read with 6 digits before PostgreSQL 12
+    (``extra_float_digits = 0``) and would not be the same ``real`` in the
+    seek, the ``double precision`` is read with 15 digits, enough for the
+    exact ``real``
+    """
+    template = 'CAST(%(expressions)s AS double precision)'
+
+    def __init__(self, rank):
+        super(RankValue, self).__init__(rank, output_field=FloatField())
+
+
+class FTSCursorPage(object):
+    """
+    A page of :class:`~pg_fts.paginator.FTSCursorPaginator`
+
+    :param object_list: The rows in this page
+
+    :param next_cursor: Opaque cursor for the next page, ``None`` in the
+        last page
+    """
+
+    def __init__(self, object_list, next_cursor, paginator):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.paginator = paginator
+
+    def __repr__(self):
+        return '<Page %s>' % (self.next_cursor or 'last')
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+class FTSCursorPaginator(object):
+    """
+    Keyset (seek) paginator for querysets annotated with a rank
+
+    Instead of ``OFFSET`` the next page continues after the ``(rank, pk)``
+    of the last row of the previous page, the primary key resolves ties
+    so no rows are skipped or repeated. The rank of the rows is selected as
+    ``double precision`` so the cursor keeps the exact rank.
+
+    :param object_list: A queryset annotated with a
+        :mod:`pg_fts.ranks` class
+
+    :param per_page: Number of rows per page
+
+    :param rank: The rank annotation name, default ``rank``
+
+    :param descending: Order by higher rank first, default ``True``
+
+    Example::
+
+        paginator = FTSCursorPaginator(
+            Article.objects.annotate(rank=FTSRank(fts__search='hello')),
+            per_page=20)
+        page = paginator.page()
+        next_page = paginator.page(page.next_cursor)
+
+    SQL equivalent for the next page:
+
+    .. code-block:: sql
+
+        SELECT
+            ...,
+            ts_rank(...) AS "rank"
+        ...
+        WHERE
+            ... AND (ts_rank(...), "article"."id") < (CAST(0.0607927 AS real), 42)
+        ORDER BY "rank" DESC, "article"."id" DESC
+        LIMIT 21
+
+    :raises: InvalidPage if the cursor isn't valid
+    """
+
+    def __init__(self, object_list, per_page, rank='rank', descending=True):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.rank = rank
+        self.descending = descending
+
+    def encode_cursor(self, row):
+        if isinstance(row, dict):
+            values = [row[self.rank], row['pk'] if 'pk' in row else row[
+                self.object_list.model._meta.pk.attname]]
+        else:
+            values = [getattr(row, self.rank), row.pk]
+        return force_text(base64.urlsafe_b64encode(
+            force_bytes(json.dumps(values, cls=DjangoJSONEncoder))))
+
+    def decode_cursor(self, cursor):
+        try:
+            values = json.loads(force_text(
+                base64.urlsafe_b64decode(force_bytes(cursor))))
+            rank, pk = values
+            return float(rank), pk
+        except (TypeError, ValueError):
+            raise InvalidPage('Invalid cursor')
+
+    def get_queryset(self, cursor=None):
+        order = '-' if self.descending else ''
+        qs = self.object_list.order_by(
+            '%s%s' % (order, self.rank), '%spk' % order)
+        query = qs.query
+        rank = query.annotations.get(self.rank)
+        if isinstance(rank, RankValue):
+            rank = rank.source_expressions[0]
+        elif rank is not None:
+            query.annotations[self.rank] = RankValue(rank)
+        if cursor:
+            if rank is None:
+                raise InvalidPage(
+                    "The '%s' isn't an annotation" % self.rank)
+            pk = query.model._meta.pk.get_col(query.get_initial_alias())
+            query.where.add(RankSeek(
+                rank, pk, self.decode_cursor(cursor), self.descending), AND)
+        return qs
+
+    def page(self, cursor=None):
+        rows = list(self.get_queryset(cursor)[:self.per_page + 1])
+        next_cursor = None
+        if len(rows) > self.per_page:
+            rows = rows[:self.per_page]
+            next_cursor = self.encode_cursor(rows[-1])
+        return FTSCursorPage(rows, next_cursor, self)
+
+
+class FTSCount(object):
+    """
+    Count strategies for search querysets
+
+    - ``exact``: plain ``SELECT count(*)``
+    - ``bounded``: exact count capped at ``limit``, the rows are counted in
+      a subquery ``SELECT count(*) FROM (... LIMIT limit + 1)``
+    - ``estimate``: the planner rows estimate from ``EXPLAIN (FORMAT JSON)``
+
+    The rows are counted without the ranks and the ordering, see
+    :func:`~pg_fts.ranks.without_ranks`
+    """
+
+    MODES = ('exact', 'bounded', 'estimate')
+    sql_explain = 'EXPLAIN (FORMAT JSON) %s'
+
+    def exact(self, queryset):
+        return without_ranks(queryset).query.get_count(using=queryset.db)
+
+    def bounded(self, queryset, limit):
+        """
+        :returns: the exact count up to ``limit``, ``limit + 1`` if there
+            are more rows
+        """
+        return without_ranks(queryset)[:limit + 1].query.get_count(
+            using=queryset.db)
+
+    def estimate(self, queryset):
+        queryset = without_ranks(queryset)
+        sql, params = queryset.query.get_compiler(
+            using=queryset.db).as_sql()
+        with connections[queryset.db].cursor() as cursor:
+            cursor.execute(self.sql_explain % sql, params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, six.string_types):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+
+
+class FTSPaginator(Paginator):
+    """
+    Paginator with a bounded count for search querysets
+
+    :param count_mode: ``auto``, or one of :class:`FTSCount` modes, default
+        ``auto``, the rows are counted up to ``count_threshold``, above it
+        the count is the planner estimate
+
+    :param count_threshold: The maximum number of rows counted
+
+    The ``count_estimated`` attribute is ``True`` when ``count`` isn't exact,
+    it can be used to print *about 312,455 results*.
+
+    Example::
+
+        paginator = FTSPaginator(
+            Article.objects.filter(fts__isearch='once upon a time'),
+            per_page=20, count_threshold=1000)
+
+    .. caution::
+
+        With an estimated count the last pages can be empty or the results
+        can continue after the last page.
+    """
+
+    counter = FTSCount()
+
+    def __init__(self, object_list, per_page, orphans=0,
+                 allow_empty_first_page=True, count_mode='auto',
+                 count_threshold=1000):
+        assert count_mode == 'auto' or count_mode in FTSCount.MODES, (
+            "Invalid count_mode '%s'. Options auto, %s" % (
+                count_mode, ', '.join(FTSCount.MODES)))
+        super(FTSPaginator, self).__init__(
+            object_list, per_page, orphans, allow_empty_first_page)
+        self.count_mode = count_mode
+        self.count_threshold = count_threshold
+        self.count_estimated = False
+
+    def _get_count(self):
+        if self._count is None:
+            if self.count_mode == 'exact':
+                self._count = self.counter.exact(self.object_list)
+            elif self.count_mode == 'estimate':
+                self._count = self.counter.estimate(self.object_list)
+                self.count_estimated = True
+            else:
+                self._count = self.counter.bounded(
+                    self.object_list, self.count_threshold)
+                if self._count > self.count_threshold:
+                    self.count_estimated = True
+                    if self.count_mode == 'auto':
+                        self._count = max(
+                            self._count,
+                            self.counter.estimate(self.object_list))
+        return self._count
+    count = property(_get_count)
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import re
+from django.db import connections
+from django.db.models.query import QuerySet
+from django.db.models.sql.datastructures import EmptyResultSet
+from pg_fts.ranks import RankQuerySet
+
+__all__ = ('FTSQuerySet', 'fts_profile', 'parse_profile')
+
+"""
+    pg_fts.profile
+    --------------
+
+    Timing breakdown of a search, parsed from
+    ``EXPLAIN (ANALYZE, BUFFERS, VERBOSE, FORMAT JSON)``, with
+    ``fts_profile(queryset)`` for the querysets of any manager
+
+    @author: David Miguel
+
+"""
+
+sql_explain = 'EXPLAIN (ANALYZE, BUFFERS, VERBOSE, FORMAT JSON) '
+functions_re = re.compile(r'\b(ts_rank_cd|ts_rank|ts_headline)\(')
+
+INDEX_SCANS = ('Bitmap Index Scan', 'Index Scan', 'Index Only Scan')
+HEAP_SCANS = ('Bitmap Heap Scan', 'Seq Scan', 'Tid Scan')
+SORTS = ('Sort', 'Incremental Sort')
+
+
+def fts_profile(queryset):
+    """
+    Executes ``queryset`` with ``EXPLAIN ANALYZE``
+
+    :param queryset: :class:`~django.db.models.query.QuerySet` or
+        :class:`~django.db.models.query.RawQuerySet`, ex. of
+        :class:`~pg_fts.ranks.FTSHeadline`
+
+    :returns: The breakdown of :func:`parse_profile`, ``None`` if the
+        queryset is empty without a query, ex. ``qs.none()``
+    """
+    if isinstance(queryset, QuerySet):
+        try:
+            sql, params = queryset.query.get_compiler(
+                using=queryset.db).as_sql()
+        except EmptyResultSet:
+            return None
+    else:
+        sql, params = queryset.raw_query, queryset.params
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(sql_explain + sql, params)
+        return parse_profile(cursor.fetchone()[0])
+
+
+def _stage():
+    return {'ms': 0.0, 'rows': 0, 'nodes': []}
+
+
+def parse_profile(plan):
+    """
+    :param plan: The plan of ``EXPLAIN (ANALYZE, BUFFERS, VERBOSE, FORMAT
+        JSON)``
+
+    :returns: dict with the ``planning_ms``, ``execution_ms``, the ``rows``
+        returned, the ``buffers`` of the query, and the stages, each with the
+        exclusive time of the nodes in ``ms``, the ``rows`` and the
+        ``nodes``:
+
+        - ``index_scan``: the index scans
+        - ``heap``: the heap scans, with the ``rows_removed_by_recheck``,
+          ``rows_removed_by_filter``, ``exact_blocks`` and ``lossy_blocks``
+        - ``functions``: the nodes computing ``ts_rank``, ``ts_rank_cd`` or
+          ``ts_headline``, in ``in_scan`` the scans computing them, their
+          time is in the time of the scan
+        - ``sort``: the sorts, with the ``method`` and ``space_kb``
+        - ``other``: the other nodes
+    """
+    root = plan[0]
+    profile = {
+        'planning_ms': root.get('Planning Time'),
+        'execution_ms': root.get('Execution Time'),
+        'rows': root['Plan'].get('Actual Rows', 0),
+        'buffers': dict(
+            (key, root['Plan'].get(name, 0)) for key, name in (
+                ('shared_hit', 'Shared Hit Blocks'),
+                ('shared_read', 'Shared Read Blocks'),
+                ('shared_dirtied', 'Shared Dirtied Blocks'),
+                ('temp_read', 'Temp Read Blocks'),
+                ('temp_written', 'Temp Written Blocks'))),
+        'index_scan': _stage(),
+        'heap': dict(_stage(), rows_removed_by_recheck=0,
+                     rows_removed_by_filter=0, exact_blocks=0,
+                     lossy_blocks=0),
+        'functions': dict(_stage(), in_scan=[]),
+        'sort': dict(_stage(), method=None, space_kb=0),
+        'other': _stage(),
+    }
+    nodes = [root['Plan']]
+    while nodes:
+        node = nodes.pop(0)
+        children = node.get('Plans', ())
+        nodes.extend(children)
+        loops = node.get('Actual Loops', 1)
+        ms = node.get('Actual Total Time', 0) * loops - sum(
+            c.get('Actual Total Time', 0) * c.get('Actual Loops', 1)
+            for c in children)
+        node_type = node['Node Type']
+        target = node.get('Index Name') or node.get('Relation Name')
+        name = node_type + (' on %s' % target if target else '')
+        functions = sorted(set(functions_re.findall(
+            ' '.join(node.get('Output', ())))))
+
+        if node_type in INDEX_SCANS:
+            stage = profile['index_scan']
+        elif node_type in HEAP_SCANS:
+            stage = profile['heap']
+            stage['rows_removed_by_recheck'] += node.get(
+                'Rows Removed by Index Recheck', 0)
+            stage['rows_removed_by_filter'] += node.get(
+                'Rows Removed by Filter', 0)
+            stage['exact_blocks'] += node.get('Exact Heap Blocks', 0)
+            stage['lossy_blocks'] += node.get('Lossy Heap Blocks', 0)
+            if functions:
+                profile['functions']['in_scan'].append(name)
+        elif node_type in SORTS:
+            stage = profile['sort']
+            stage['method'] = node.get('Sort Method')
+            stage['space_kb'] += node.get('Sort Space Used', 0)
+        elif set(functions) - set(functions_re.findall(' '.join(
+                o for c in children for o in c.get('Output', ())))):
+            # computes the functions, not only passes the values
+            stage = profile['functions']
+        else:
+            stage = profile['other']
+        stage['ms'] += max(ms, 0)
+        stage['rows'] += node.get('Actual Rows', 0) * loops
+        stage['nodes'].append(name)
+    return profile
+
+
+class FTSQuerySet(RankQuerySet):
+    """
+    QuerySet with :meth:`fts_profile` and the counts of
+    :class:`~pg_fts.ranks.RankQuerySet`, optional, :func:`fts_profile`
+    profiles the querysets of any manager
+
+    Example::
+
+        class Article(models.Model):
+            ...
+            objects = FTSQuerySet.as_manager()
+
+        Article.objects.annotate(
+            rank=FTSRank(fts_index__search='hello world')
+        ).order_by('-rank')[:20].fts_profile()
+    """
+
+    def fts_profile(self):
+        """
+        :returns: The timing breakdown of :func:`fts_profile`
+        """
+        return fts_profile(self)
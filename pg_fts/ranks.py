@@ -1,107 +1,194 @@
 """
-Classes to represent the default SQL aggregate functions
+Classes to represent the PostgreSQL full text search rank functions
 """
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 
+from collections import OrderedDict
+from django.db import connections
+from django.db.models import Q, FieldDoesNotExist
+from django.db.models.query import QuerySet
+from django.db.models.expressions import F, Func
 from django.db.models.fields import FloatField
 from django.db.models.constants import LOOKUP_SEP
-from django.db.models.sql import aggregates
 from django.core import exceptions
-from pg_fts.fields import TSVectorBaseField
+from django.utils.tree import Node
+from pg_fts import metrics, sqlcomment
+from pg_fts.fields import (TSVectorBaseField, TSVectorField, TSQueryJoin,
+                           TSVectorTsQueryLookup)
 
-__all__ = ('FTSRankCd', 'FTSRank', 'FTSRankDictionay', 'FTSRankCdDictionary')
+__all__ = ('FTSRankCd', 'FTSRank', 'FTSRankDictionay', 'FTSRankCdDictionary',
+           'FTSHeadline', 'RankQuerySet', 'without_ranks')
 
 
-class AggregateRegister(aggregates.Aggregate):
+def get_lookups(node):
     """
-    Fake aggregate to add rank to querysets
+    :returns: Generator of the lookups of the where ``node``
     """
-    is_ordinal = False
-    is_computed = True
-    sql_template = ("%(function)s(%(weights)s%(field_name)s, to_tsquery('%(dictionary)s',"
-                    " %(place)s)%(normalization)s)")
-
-    def __init__(self, col, source=None, sql_function=None, **extra):
-        self.col, self.source, self.sql_function = col, source, sql_function
-        self.extra, self.field = extra, FloatField()
-        self.params = self.extra['params']
-        self.normalization = self.extra['_normalization']
-        self.weights = self.extra['_weights']
-
-    def as_sql(self, qn, connection):
-        field_name = '.'.join(qn(c) for c in self.col)
-        if self.normalization:
-            normalization_params = ', ' + '|'.join(
-                '%d' % i for i in self.normalization)
-        else:
-            normalization_params = ''
+    if isinstance(node, Node):
+        for child in node.children:
+            for lookup in get_lookups(child):
+                yield lookup
+    elif isinstance(node, TSVectorTsQueryLookup):
+        yield node
 
-        if self.weights:
-            weights_params = "'{" + ', '.join(
-                '%.1f' % i for i in self.weights) + "}', "
-        else:
-            weights_params = ''
 
-        substitutions = {
-            'field_name': '.'.join(qn(c) for c in self.col),
-            'function': self.sql_function,
-            'place': '%s',
-            'normalization': normalization_params,
-            'weights': weights_params
-        }
-        substitutions.update(self.extra)
-        return self.sql_template % substitutions, [self.params]
+class TSQueryCandidatesJoin(TSQueryJoin):
+    """
+    Top-K ``FROM`` entry, joins the rows matching the lookup pre-ordered by
+    ``order`` and limited to ``limit``, with their tsquery, the tsquery is
+    parsed once in the subquery and shared with the rank
+
+    :param queryset: The rows matching the lookup, ordered
 
+    :param limit: Number of rows
 
-class RankBase(object):
+    :param vector_alias: Alias of the table with the vector
+    """
+    sql_join = 'INNER JOIN (%s) %s ON (%s.%s = %s.%s)'
+
+    def __init__(self, dictionary, value, queryset, limit, vector_alias,
+                 alias=None):
+        super(TSQueryCandidatesJoin, self).__init__(dictionary, value, alias)
+        self.queryset, self.limit = queryset, limit
+        self.vector_alias = vector_alias
+
+    def as_sql(self, compiler, connection):
+        queryset = self.queryset._clone()
+        inner = queryset.query.join(TSQueryJoin(self.dictionary, self.value))
+        inner = connection.ops.quote_name(inner)
+        queryset = queryset.extra(select={
+            self.table_alias: '%s.%s' % (inner, inner)
+        }).values('pk', self.table_alias)[:self.limit]
+        sql, params = queryset.query.get_compiler(
+            connection=connection).as_sql()
+        alias = compiler.quote_name_unless_alias(self.table_alias)
+        pk = connection.ops.quote_name(queryset.model._meta.pk.column)
+        return self.sql_join % (
+            sql, alias, compiler.quote_name_unless_alias(self.vector_alias),
+            pk, alias, pk), list(params)
+
+    def relabeled_clone(self, change_map):
+        return self.__class__(
+            self.dictionary, self.value, self.queryset, self.limit,
+            change_map.get(self.vector_alias, self.vector_alias),
+            change_map.get(self.table_alias, self.table_alias))
+
+    def __eq__(self, other):
+        return (super(TSQueryCandidatesJoin, self).__eq__(other) and
+                self.limit == other.limit and
+                self.vector_alias == other.vector_alias and
+                self.queryset.query.order_by == other.queryset.query.order_by)
+
+
+class RankBase(Func):
+    """
+    Base rank expression, adds the ranking function to the ``SELECT`` and
+    the lookup to the ``WHERE`` clause of the query
+    """
     NORMALIZATION = (0, 1, 2, 4, 8, 16, 32)
-    sql_function, rhs, dictionary, srt_lookup = '', '', '', ''
+    function, rhs, dictionary, srt_lookup = '', '', '', ''
+    template = ("%(function)s(%(weights)s%(field)s, %(tsquery)s"
+                "%(normalization)s)")
 
-    def __init__(self, lookup, **extra):
-        self.lookup, self.extra = lookup, extra
+    def __init__(self, **extra):
+        self.normalization = extra.pop('normalization', [])
+        self.weights = extra.pop('weights', [])
+        self.candidates = extra.pop('candidates', None)
+        self.candidates_order = extra.pop('candidates_order', '-pk')
+        params = tuple(extra.items())[0]
+        lookups, self.rhs = params[0].split(LOOKUP_SEP), params[1]
+        self._set_lookups(lookups)
+        super(RankBase, self).__init__(
+            F(self.lookup), output_field=FloatField())
+        self.extra = extra
+        self._do_checks()
+
+    def _set_lookups(self, lookups):
+        self.srt_lookup = lookups[-1]
+        self.lookup = LOOKUP_SEP.join(lookups[:-1])
 
     def _default_alias(self):
         return '%s__%s' % (self.lookup, self.name.lower())
     default_alias = property(_default_alias)
 
-    def add_to_query(self, query, alias, col, source, is_summary=False):
+    def _get_lookup_path(self, lookup=None):
+        lookups = [lookup or self.lookup]
         if self.dictionary:
+            lookups.append(self.dictionary)
+        lookups.append(self.srt_lookup)
+        return LOOKUP_SEP.join(lookups)
+
+    def resolve_expression(self, query=None, allow_joins=True, reuse=None,
+                           summarize=False, for_save=False):
+        c = super(RankBase, self).resolve_expression(
+            query, allow_joins, reuse, summarize, for_save)
+        source = c.source_expressions[0].output_field
+        if not isinstance(source, TSVectorBaseField):
+            raise exceptions.FieldError(
+                "The '%s' isn't a TSVectorField for %s" % (
+                    self.lookup, self.__class__.__name__))
+        if c.dictionary:
             # test for if is a valid transform, if not will raise error
-            source.get_transform(self.dictionary)
+            source.get_transform(c.dictionary)
+        elif isinstance(source, TSVectorField):
+            c.dictionary = source.get_dictionary()
         else:
-            self.dictionary = source.dictionary
-
-        lookup = source.get_lookup(self.srt_lookup)
-        fts_query = lookup.lookup_sql % (
-            '.'.join('"%s"' % c for c in col), self.dictionary, '%s')
-        params = source._get_db_prep_lookup(self.srt_lookup, self.rhs)
-
-        self.extra = {
-            'params': params,
-            'dictionary': self.dictionary,
-            '_normalization': self.normalization,
-            '_weights': self.weights
-        }
+            c.dictionary = source.dictionary
+        c.params = source._get_db_prep_lookup(c.srt_lookup, c.rhs)
+        if self.candidates:
+            # top-K, only the first candidates matching the lookup are joined
+            # with their tsquery and ranked
+            query.join(TSQueryCandidatesJoin(
+                c.dictionary, c.params,
+                source.model._default_manager.filter(**{
+                    self._get_lookup_path(source.name): self.rhs
+                }).order_by(self.candidates_order),
+                self.candidates, c.source_expressions[0].alias))
+            return c
+        # the tsquery is computed once in the FROM clause and shared with the
+        # lookups and other ranks with the same query
+        query.join(TSQueryJoin(c.dictionary, c.params))
+        # the rank only makes sense for the matching rows, the lookup is
+        # added to the where clause as a normal filter (uses ``self`` as
+        # the dictionary transform is only in the path if it was given)
+        query.add_q(Q(**{self._get_lookup_path(): self.rhs}))
+        # skipped if the statement has the same lookup, the predicate is
+        # only once in the ``WHERE`` clause
+        for lookup in get_lookups(query.where.children[-1]):
+            lookup.rank_filter = True
+        return c
+
+    def as_sql(self, compiler, connection):
+        field, params = compiler.compile(self.source_expressions[0])
+        tsquery, tsquery_params = TSQueryJoin.get_tsquery_sql(
+            compiler, self.dictionary, self.params)
+        if self.normalization:
+            normalization_params = ', ' + '|'.join(
+                '%d' % i for i in self.normalization)
+        else:
+            normalization_params = ''
 
-        query.add_extra(
-            select=None,
-            select_params=None,
-            where=[fts_query % ("%s")],
-            params=[params],
-            tables=None,
-            order_by=None
-        )
+        if self.weights:
+            weights_params = "'{" + ', '.join(
+                '%.1f' % i for i in self.weights) + "}', "
+        else:
+            weights_params = ''
 
-        aggregate = AggregateRegister(
-            col,
-            source=source,
-            sql_function=self.sql_function,
-            **self.extra)
-        query.aggregates[alias] = aggregate
-        # in case of related
-        if col not in query.group_by:
-            query.group_by.append(col)
+        substitutions = {
+            'field': field,
+            'function': self.function,
+            'tsquery': tsquery,
+            'normalization': normalization_params,
+            'weights': weights_params
+        }
+        sql = self.template % substitutions
+        # the comment is added to the end of the statement
+        if metrics.registry.enabled or sqlcomment.is_enabled():
+            sql = metrics.registry.label(
+                connection, sql, self.source_expressions[0], self.srt_lookup,
+                self.dictionary, self.params, self.__class__.__name__)
+        return sql, params + tsquery_params
 
     def _do_checks(self):
         assert not self.weights or (len(self.weights) is 4 and all(map(
@@ -114,6 +201,9 @@ class RankBase(object):
             self.normalization
         )), 'normalization must be in (%s)' % (
             ', '.join('%d' % i for i in self.NORMALIZATION))
+        assert self.candidates is None or (
+            isinstance(self.candidates, int) and self.candidates > 0
+        ), 'candidates must be a positive integer'
         assert len(self.extra) == 1, 'to many arguments for %s' % (
             self.__class__.__name__)
         if self.srt_lookup not in TSVectorBaseField.valid_lookups:
@@ -141,9 +231,11 @@ class FTSRank(RankBase):
 
         SELECT
             ...,
-            ts_rank("article"."fts_index" @@ to_tsquery('english', 'Hello & world'), 1|2) AS "rank"
+            ts_rank("article"."fts_index", "pg_fts_tsquery"."pg_fts_tsquery", 1|2) AS "rank"
+        FROM "article"
+            CROSS JOIN to_tsquery('english', 'Hello & world') "pg_fts_tsquery"
         WHERE
-            "article"."fts_index" @@ to_tsquery('english', 'Hello & world')
+            "article"."fts_index" @@ "pg_fts_tsquery"."pg_fts_tsquery"
 
     :param fieldlookup: required
 
@@ -151,6 +243,12 @@ class FTSRank(RankBase):
 
     :param weights: iterable float
 
+    :param candidates: integer, top-K mode, only the first ``candidates``
+        rows matching the lookup ordered by ``candidates_order`` are ranked
+
+    :param candidates_order: field used to pre-order the candidates, default
+        ``-pk``
+
     :returns: rank
 
     :raises: exceptions.FieldError if lookup isn't valid
@@ -158,19 +256,9 @@ class FTSRank(RankBase):
     """
 
     name = 'FTSRank'
-    sql_function = 'ts_rank'
+    function = 'ts_rank'
     dictionary = ''
 
-    def __init__(self, **extra):
-        self.normalization = extra.pop('normalization', [])
-        self.weights = extra.pop('weights', [])
-        params = tuple(extra.items())[0]
-        self.extra = extra
-        lookups, self.rhs = params[0].split(LOOKUP_SEP), params[1]
-        self.srt_lookup = lookups[-1]
-        self.lookup = LOOKUP_SEP.join(lookups[:-1])
-        self._do_checks()
-
 
 class FTSRankCd(FTSRank):
     """
@@ -203,12 +291,14 @@ class FTSRankCd(FTSRank):
 
         SELECT
             ...,
-            ts_rank_cd("article"."fts_index" @@ to_tsquery('english', 'Hello & world'), 1|2) AS "rank"
+            ts_rank_cd("article"."fts_index", "pg_fts_tsquery"."pg_fts_tsquery", 1|2) AS "rank"
+        FROM "article"
+            CROSS JOIN to_tsquery('english', 'Hello & world') "pg_fts_tsquery"
         WHERE
-            "article"."fts_index" @@ to_tsquery('english', 'Hello & world')
+            "article"."fts_index" @@ "pg_fts_tsquery"."pg_fts_tsquery"
     """
 
-    sql_function = 'ts_rank_cd'
+    function = 'ts_rank_cd'
     name = 'FTSRankCd'
 
 
@@ -241,21 +331,17 @@ class FTSRankDictionay(FTSRank):
 
         SELECT
             ...,
-            ts_rank("article"."fts_index" @@ to_tsquery('portuguese', 'Hello & world'), 1|2) AS "rank"
+            ts_rank("article"."fts_index", "pg_fts_tsquery"."pg_fts_tsquery", 1|2) AS "rank"
+        FROM "article"
+            CROSS JOIN to_tsquery('portuguese', 'Hello & world') "pg_fts_tsquery"
         WHERE
-            "article"."fts_index" @@ to_tsquery('portuguese', 'Hello & world')
+            "article"."fts_index" @@ "pg_fts_tsquery"."pg_fts_tsquery"
 
     """
 
-    def __init__(self, **extra):
-        self.normalization = extra.pop('normalization', [])
-        self.weights = extra.pop('weights', [])
-        params = tuple(extra.items())[0]
-        self.extra, self.rhs = extra, params[1]
-        lookups = params[0].split(LOOKUP_SEP)
+    def _set_lookups(self, lookups):
         self.dictionary, self.srt_lookup = lookups[-2:]
         self.lookup = LOOKUP_SEP.join(lookups[:-2])
-        self._do_checks()
 
 
 class FTSRankCdDictionary(FTSRankDictionay):
@@ -287,11 +373,221 @@ class FTSRankCdDictionary(FTSRankDictionay):
 
         SELECT
             ...,
-            ts_rank("article"."fts_index" @@ to_tsquery('portuguese', 'Hello & world'), 1|2) AS "rank"
+            ts_rank("article"."fts_index", "pg_fts_tsquery"."pg_fts_tsquery", 1|2) AS "rank"
+        FROM "article"
+            CROSS JOIN to_tsquery('portuguese', 'Hello & world') "pg_fts_tsquery"
         WHERE
-            "article"."fts_index" @@ to_tsquery('portuguese', 'Hello & world')
+            "article"."fts_index" @@ "pg_fts_tsquery"."pg_fts_tsquery"
 
     """
 
-    sql_function = 'ts_rank_cd'
+    function = 'ts_rank_cd'
     name = 'FTSRankCdDictionary'
+
+
+def _has_rank(expression):
+    if isinstance(expression, RankBase):
+        return True
+    return any(_has_rank(e) for e in expression.get_source_expressions())
+
+
+def without_ranks(queryset):
+    """
+    :returns: Clone of ``queryset`` for counts, without the ordering and the
+        annotations with ranks, the lookups of the ranks are kept in the
+        ``WHERE`` clause, the rows are the same and aren't ranked, sorted or
+        grouped
+
+    Example::
+
+        without_ranks(Article.objects.annotate(
+            rank=FTSRank(fts_index__search='Hello world'))).count()
+    """
+    clone = queryset._clone()
+    query = clone.query
+    query.clear_ordering(True)
+    # the distinct rows depend on the selected values
+    if not query.distinct:
+        for alias, annotation in list(query.annotations.items()):
+            if not annotation.contains_aggregate and _has_rank(annotation):
+                del query.annotations[alias]
+        # resets the cached annotations
+        query.set_annotation_mask(query.annotation_select_mask)
+    return clone
+
+
+class RankQuerySet(QuerySet):
+    """
+    QuerySet counting without the ranks, see :func:`without_ranks`
+
+    Example::
+
+        class Article(models.Model):
+            ...
+            objects = RankQuerySet.as_manager()
+    """
+
+    def count(self):
+        if self._result_cache is not None:
+            return len(self._result_cache)
+        return without_ranks(self).query.get_count(using=self.db)
+
+
+class FTSHeadline(object):
+    """
+    Interface for PostgreSQL ts_headline
+
+    Provides a interface for
+        :pg_docs:`12.3.4. Highlighting Results *ts_headline*
+        <textsearch-controls.html#TEXTSEARCH-HEADLINE>`
+
+    ``ts_headline`` parses the document again, so it only runs for the rows
+    returned, the ranked and limited queryset is wrapped in a subquery and
+    the headline is computed in the outer query.
+
+    :param field: The document field name, in the same model of the
+        :class:`~pg_fts.fields.TSVectorField`
+
+    :param fieldlookup: required, the same lookup used in the search with the
+        optional dictionary transform
+
+    :param options: dict with ts_headline options
+
+    :returns: :class:`~django.db.models.query.RawQuerySet` with the
+        queryset rows annotated with the headline
+
+    :raises: exceptions.FieldError if lookup isn't valid
+
+    Example::
+
+        FTSHeadline(
+            'article', fts_index__search='Hello world',
+            options={'MaxWords': 20}
+        ).apply(
+            Article.objects.annotate(
+                rank=FTSRank(fts_index__search='Hello world')
+            ).order_by('-rank')[:20]
+        )
+
+    SQL equivalent:
+
+    .. code-block:: sql
+
+        SELECT
+            "pg_fts_headline".*,
+            ts_headline('english', "pg_fts_headline"."article", to_tsquery('english', 'Hello & world'), 'MaxWords=20') AS "headline"
+        FROM (
+            SELECT ... ORDER BY "rank" DESC LIMIT 20
+        ) "pg_fts_headline"
+        ORDER BY "pg_fts_headline"."rank" DESC
+    """
+
+    alias = 'pg_fts_headline'
+    sql_template = ("SELECT {alias}.*, ts_headline({config}, {alias}.{field}, "
+                    "to_tsquery('{dictionary}', %s){options}) AS {headline} "
+                    "FROM ({query}) {alias}{ordering}")
+
+    def __init__(self, field, options=None, **extra):
+        self.field, self.options, self.extra = field, options or {}, extra
+        assert len(self.extra) == 1, 'to many arguments for %s' % (
+            self.__class__.__name__)
+        params = tuple(extra.items())[0]
+        lookups, self.rhs = params[0].split(LOOKUP_SEP), params[1]
+        self.srt_lookup = lookups[-1]
+        if len(lookups) == 3:
+            self.lookup, self.dictionary = lookups[:2]
+        elif len(lookups) == 2:
+            self.lookup, self.dictionary = lookups[0], ''
+        else:
+            raise exceptions.FieldError(
+                "The '%s' isn't valid Lookup for %s" % (
+                    params[0], self.__class__.__name__))
+        if self.srt_lookup not in TSVectorBaseField.valid_lookups:
+            raise exceptions.FieldError(
+                "The '%s' isn't valid Lookup for %s" % (
+                    self.srt_lookup, self.__class__.__name__))
+
+    def _get_options(self):
+        return ', '.join('%s=%s' % (k, self.options[k])
+                         for k in sorted(self.options))
+
+    def _get_query(self, queryset, alias, qn):
+        """
+        :returns: sql and params of the queryset and the ``ORDER BY`` of the
+            outer query, the queryset order by the columns of the subquery,
+            the order expressions not selected are added to the subquery
+        """
+        query = queryset.query.clone()
+        compiler = query.get_compiler(using=queryset.db)
+        sql, params = compiler.as_sql()
+        selected = {}
+        for expression, (column_sql, column_params), column in (
+                compiler.select):
+            if column is None and hasattr(expression, 'target'):
+                column = expression.target.column
+            selected.setdefault((column_sql, tuple(column_params)), column)
+        ordering, extra, extra_params = [], OrderedDict(), []
+        for order, (order_sql, order_params, is_ref) in (
+                compiler.get_order_by()):
+            if is_ref:
+                column = order.expression.refs
+            else:
+                column_sql, column_params = compiler.compile(order.expression)
+                column = selected.get((column_sql, tuple(column_params)))
+                if column is None:
+                    column = '%s_order_%d' % (self.alias, len(extra))
+                    extra[column] = column_sql
+                    extra_params.extend(column_params)
+            ordering.append('%s.%s %s' % (
+                alias, qn(column), 'DESC' if order.descending else 'ASC'))
+        if extra:
+            query.add_extra(extra, extra_params, None, None, None, None)
+            sql, params = query.get_compiler(using=queryset.db).as_sql()
+        # the order of the subquery isn't kept by the outer query
+        return sql, params, (
+            ' ORDER BY %s' % ', '.join(ordering) if ordering else '')
+
+    def apply(self, queryset, headline='headline'):
+        model = queryset.model
+        source = model._meta.get_field(self.lookup)
+        if not isinstance(source, TSVectorBaseField):
+            raise exceptions.FieldError(
+                "The '%s' isn't a TSVectorField for %s" % (
+                    self.lookup, self.__class__.__name__))
+        qn = connections[queryset.db].ops.quote_name
+        alias = qn(self.alias)
+        if self.dictionary:
+            # test for if is a valid transform, if not will raise error
+            source.get_transform(self.dictionary)
+            dictionary = self.dictionary
+            config = "'%s'" % dictionary
+        elif isinstance(source, TSVectorField):
+            dictionary = source.get_dictionary()
+            try:
+                # multiple dictionaries, uses the row dictionary
+                config = '%s.%s::regconfig' % (alias, qn(
+                    model._meta.get_field(source.dictionary).column))
+            except FieldDoesNotExist:
+                config = "'%s'" % dictionary
+        else:
+            dictionary = source.dictionary
+            config = "'%s'" % dictionary
+
+        params = [source._get_db_prep_lookup(self.srt_lookup, self.rhs)]
+        options = ''
+        if self.options:
+            options = ', %s'
+            params.append(self._get_options())
+        query, query_params, ordering = self._get_query(
+            queryset, alias, qn)
+        params.extend(query_params)
+        return queryset.raw(self.sql_template.format(
+            alias=alias,
+            config=config,
+            field=qn(model._meta.get_field(self.field).column),
+            dictionary=dictionary,
+            options=options,
+            headline=qn(headline),
+            query=query,
+            ordering=ordering
+        ), params)
@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import collections
+import datetime
+import logging
+import random
+import threading
+from django.db import DatabaseError
+from django.utils.six.moves import queue
+from pg_fts import metrics
+
+__all__ = ('SlowSearchLog', 'slow_log')
+
+"""
+    pg_fts.slowlog
+    --------------
+
+    Sampled log of the slow queries with pg_fts lookups and ranks, the query
+    is executed again with ``EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON)`` by a
+    background thread in a separate connection and a condensed record of the
+    plan is stored
+
+    Enabled with the setting ``PG_FTS_SLOW_SEARCH``, a dict with the options
+    of :class:`SlowSearchLog`, ex. ``{'threshold': 500, 'sample': 0.1}``
+
+    @author: David Miguel
+
+"""
+
+logger = logging.getLogger('pg_fts')
+
+
+class SlowSearchLog(object):
+    """
+    :param threshold: Minimum latency in ms of the logged queries, default
+        ``500``
+
+    :param sample: Fraction of the slow queries explained, default ``1.0``
+
+    :param size: Number of records kept, the older are discarded, default
+        ``100``
+
+    :param timeout: ``statement_timeout`` in ms of the ``EXPLAIN``, default
+        without timeout
+
+    The slow queries are queued and explained by a background thread, one at
+    a time in a connection reused for each database, the request only pays
+    the queueing. The queries arriving with the queue full are dropped and
+    counted in ``dropped``
+    """
+
+    sql_explain = 'EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) '
+    sql_timeout = 'SET statement_timeout = %s'
+    # slow queries waiting for the EXPLAIN, the others are dropped
+    max_queue = 100
+
+    def __init__(self, threshold=500, sample=1.0, size=100, timeout=None):
+        self.records = collections.deque(maxlen=size)
+        self.dropped = 0
+        self._queue = queue.Queue(self.max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+        # alias: connection, only used by the worker thread
+        self._connections = {}
+        self.configure(threshold, sample, size, timeout)
+
+    def configure(self, threshold=500, sample=1.0, size=100, timeout=None):
+        self.threshold = threshold
+        self.sample = sample
+        self.timeout = timeout
+        if size != self.records.maxlen:
+            self.records = collections.deque(self.records, maxlen=size)
+
+    def enable(self):
+        metrics.registry.add_observer(self)
+
+    def disable(self):
+        metrics.registry.remove_observer(self)
+
+    def clear(self):
+        self.records.clear()
+
+    def __call__(self, connection, sql, params, labels, ms):
+        if ms < self.threshold or random.random() >= self.sample:
+            return
+        # EXPLAIN ANALYZE executes the statement
+        if not sql.lstrip()[:6].upper() == 'SELECT':
+            return
+        record = {
+            'date': datetime.datetime.utcnow().isoformat(),
+            'ms': ms,
+            'sql': sql,
+            'params': list(params or ()),
+            'labels': [dict(zip(metrics.MetricsRegistry.LABELS, l))
+                       for l in labels],
+            'dictionaries': sorted(set(l[3] for l in labels)),
+        }
+        self._start()
+        try:
+            self._queue.put_nowait((connection, record))
+        except queue.Full:
+            self.dropped += 1
+
+    def _start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            # not inherited by the forked processes
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._work, name='pg_fts slow search log')
+                self._thread.daemon = True
+                self._thread.start()
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    self._close_connections()
+                    return
+                self._explain(*item)
+            except Exception:
+                logger.exception('Slow search log failed')
+            finally:
+                self._queue.task_done()
+
+    def _explain(self, connection, record):
+        try:
+            record.update(self.condense(self.explain(
+                connection, record['sql'], record['params'])))
+        except DatabaseError as e:
+            record['error'] = '%s' % e
+            # reopened by the next EXPLAIN
+            self._close_connections(connection.alias)
+        self.records.append(record)
+        logger.warning('Slow search %.1f ms, %s: %s', record['ms'],
+                       ', '.join(record.get('nodes', ())) or
+                       record.get('error'), record['sql'],
+                       extra={'record': record})
+
+    def _close_connections(self, alias=None):
+        for key in list(self._connections):
+            if alias is None or key == alias:
+                try:
+                    self._connections.pop(key).close()
+                except DatabaseError:
+                    pass
+
+    def flush(self):
+        """
+        Waits for the EXPLAIN of the queued slow queries
+        """
+        self._queue.join()
+
+    def close(self):
+        """
+        Waits for the queued slow queries, stops the background thread and
+        closes its connections
+        """
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self._thread = None
+
+    def explain(self, connection, sql, params):
+        """
+        :returns: The plan of ``EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON)`` of
+            ``sql``, executed in a separate connection to the database of
+            ``connection``, opened once and reused, only sees the committed
+            rows
+        """
+        explain_connection = self._connections.get(connection.alias)
+        if explain_connection is None:
+            explain_connection = self._connections[connection.alias] = (
+                connection.__class__(connection.settings_dict,
+                                     connection.alias))
+        with explain_connection.cursor() as cursor:
+            # 0 is without timeout
+            cursor.execute(self.sql_timeout, [int(self.timeout or 0)])
+            cursor.execute(self.sql_explain + sql, params)
+            return cursor.fetchone()[0]
+
+    def condense(self, plan):
+        """
+        :returns: dict with the ``execution_ms``, ``planning_ms``, the
+            ``nodes`` of the plan, the relations of ``seq_scans``, the
+            ``index_scans``, the buffers ``shared_hit`` and ``shared_read``,
+            and of the bitmap heap scans the ``rows_removed_by_recheck``,
+            ``exact_blocks`` and ``lossy_blocks``
+        """
+        root = plan[0]
+        record = {
+            'execution_ms': root.get('Execution Time'),
+            'planning_ms': root.get('Planning Time'),
+            'nodes': [],
+            'seq_scans': [],
+            'index_scans': [],
+            'shared_hit': root['Plan'].get('Shared Hit Blocks', 0),
+            'shared_read': root['Plan'].get('Shared Read Blocks', 0),
+            'rows_removed_by_recheck': 0,
+            'exact_blocks': 0,
+            'lossy_blocks': 0,
+        }
+        nodes = [root['Plan']]
+        while nodes:
+            node = nodes.pop(0)
+            target = node.get('Index Name') or node.get('Relation Name')
+            record['nodes'].append(
+                node['Node Type'] + (' on %s' % target if target else ''))
+            if node['Node Type'] == 'Seq Scan':
+                record['seq_scans'].append(node.get('Relation Name'))
+            elif 'Index Name' in node:
+                record['index_scans'].append(node['Index Name'])
+            record['rows_removed_by_recheck'] += node.get(
+                'Rows Removed by Index Recheck', 0)
+            record['exact_blocks'] += node.get('Exact Heap Blocks', 0)
+            record['lossy_blocks'] += node.get('Lossy Heap Blocks', 0)
+            nodes.extend(node.get('Plans', ()))
+        return record
+
+
+slow_log = SlowSearchLog()
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import functools
+import re
+import threading
+from django.conf import settings
+from django.utils.six.moves.urllib.parse import quote, unquote
+
+__all__ = ('tag', 'is_enabled', 'comment', 'parse_comments')
+
+"""
+    pg_fts.sqlcomment
+    -----------------
+
+    sqlcommenter comments at the end of the SQL of the statements with
+    lookups or ranks and of the migrations,
+    ex. ``/*field='tsvector',lookup='search',model='article.Article'*/``,
+    enabled with the setting ``PG_FTS_SQL_COMMENT``, ``True`` or a dict with
+    static keys and values added to all the comments
+
+    @author: David Miguel
+
+"""
+
+comment_re = re.compile(r'/\*(.*?)\*/', flags=re.S)
+pair_re = re.compile(r"([^=,\s]+)='((?:[^'\\]|\\.)*)'")
+
+_local = threading.local()
+
+
+class tag(object):
+    """
+    Context manager or decorator, adds ``tag='<name>'`` to the comments of
+    the SQL executed in the block
+
+    Example::
+
+        with tag('search_view'):
+            results = list(Article.objects.filter(fts_index__search='hello'))
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        if not hasattr(_local, 'tags'):
+            _local.tags = []
+        _local.tags.append(self.name)
+        return self
+
+    def __exit__(self, type, value, traceback):
+        _local.tags.pop()
+
+    def __call__(self, function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with self:
+                return function(*args, **kwargs)
+        return wrapper
+
+
+def get_tag():
+    tags = getattr(_local, 'tags', None)
+    return tags[-1] if tags else None
+
+
+def _quote(value):
+    return quote(('%s' % value).encode('utf-8'), safe='').replace(
+        "'", "\\'")
+
+
+def is_enabled():
+    return bool(getattr(settings, 'PG_FTS_SQL_COMMENT', False))
+
+
+def comment(**values):
+    """
+    :returns: The sqlcommenter comment with ``values``, the static values of
+        the setting and the current :class:`tag`, ``''`` if disabled. The
+        ``%`` are escaped, the SQL is executed with params
+    """
+    options = getattr(settings, 'PG_FTS_SQL_COMMENT', False)
+    if not options:
+        return ''
+    if isinstance(options, dict):
+        values = dict(options, **values)
+    if get_tag() is not None:
+        values['tag'] = get_tag()
+    return ('/*%s*/' % ','.join(
+        "%s='%s'" % (_quote(key), _quote(values[key]))
+        for key in sorted(values) if values[key] is not None
+    )).replace('%', '%%')
+
+
+def parse_comments(sql):
+    """
+    :returns: dict with the keys and values of the sqlcommenter comments in
+        ``sql``
+    """
+    values = {}
+    for text in comment_re.findall(sql):
+        for key, value in pair_re.findall(text):
+            # unescaped by the SQL execution or not
+            value = value.replace('%%', '%').replace("\\'", "'")
+            values[unquote(key.replace('%%', '%'))] = unquote(value)
+    return values
@@ -11,16 +11,16 @@ os.chdir(os.path.normpath(os.path.join(os.path.abspath(__file__), os.pardir)))
 setup(
     name='django-pg_fts',
     version='0.1.1',
-    packages=['pg_fts'],
+    packages=['pg_fts', 'pg_fts.management', 'pg_fts.management.commands'],
     include_package_data=True,
     license='BSD License',
-    description='Implementation of PostgreSQL Full Text Search for django 1.7',
+    description='Implementation of PostgreSQL Full Text Search for django 1.8',
     long_description=README,
     url='https://github.com/dvdmgl/django-pg-fts',
     author='dvdmgl',
     author_email='dvdmgl@gmail.com',
     requires=[
-        'Django (>=1.7)',
+        'Django (>=1.8)',
         'psycopg2'
     ],
     classifiers=[
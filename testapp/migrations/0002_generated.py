@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+import pg_fts.fields
+from pg_fts.migrations import CreateFTSIndexOperation, CreateFTSTriggerOperation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('testapp', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TSGeneratedModel',
+            fields=[
+                ('id', models.AutoField(serialize=False, auto_created=True, verbose_name='ID', primary_key=True)),
+                ('title', models.CharField(max_length=50)),
+                ('body', models.TextField()),
+                ('tsvector', pg_fts.fields.TSVectorField(editable=False, dictionary='english', fields=(('title', 'A'), 'body'), serialize=False, null=True, storage='generated')),
+            ],
+            options={
+            },
+            bases=(models.Model,),
+        ),
+        migrations.CreateModel(
+            name='TSGeneratedMultidicModel',
+            fields=[
+                ('id', models.AutoField(serialize=False, auto_created=True, verbose_name='ID', primary_key=True)),
+                ('title', models.CharField(max_length=50)),
+                ('body', models.TextField()),
+                ('dictionary', models.CharField(max_length=15, default='english', choices=[('english', 'english'), ('portuguese', 'portuguese')])),
+                ('tsvector', pg_fts.fields.TSVectorField(editable=False, dictionary='dictionary', fields=(('title', 'A'), 'body'), serialize=False, null=True, storage='generated')),
+            ],
+            options={
+            },
+            bases=(models.Model,),
+        ),
+        CreateFTSIndexOperation(
+            name='TSGeneratedModel',
+            fts_vector='tsvector',
+            index='gin'
+        ),
+        CreateFTSIndexOperation(
+            name='TSGeneratedMultidicModel',
+            fts_vector='tsvector',
+            index='gin'
+        ),
+        # does nothing, the columns are generated
+        CreateFTSTriggerOperation(
+            name='TSGeneratedModel',
+            fts_vector='tsvector',
+        ),
+    ]
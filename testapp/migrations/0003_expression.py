@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+import pg_fts.fields
+from pg_fts.migrations import CreateFTSIndexOperation, CreateFTSTriggerOperation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('testapp', '0002_generated'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TSExpressionModel',
+            fields=[
+                ('id', models.AutoField(serialize=False, auto_created=True, verbose_name='ID', primary_key=True)),
+                ('title', models.CharField(max_length=50)),
+                ('body', models.TextField()),
+                ('tsvector', pg_fts.fields.TSVectorField(editable=False, dictionary='english', fields=(('title', 'A'), 'body'), serialize=False, null=True, storage='expression')),
+            ],
+            options={
+            },
+            bases=(models.Model,),
+        ),
+        migrations.CreateModel(
+            name='TSExpressionMultidicModel',
+            fields=[
+                ('id', models.AutoField(serialize=False, auto_created=True, verbose_name='ID', primary_key=True)),
+                ('title', models.CharField(max_length=50)),
+                ('body', models.TextField()),
+                ('dictionary', models.CharField(max_length=15, default='english', choices=[('english', 'english'), ('portuguese', 'portuguese')])),
+                ('tsvector', pg_fts.fields.TSVectorField(editable=False, dictionary='dictionary', fields=(('title', 'A'), 'body'), serialize=False, null=True, storage='expression')),
+            ],
+            options={
+            },
+            bases=(models.Model,),
+        ),
+        # creates the vector functions
+        CreateFTSTriggerOperation(
+            name='TSExpressionModel',
+            fts_vector='tsvector',
+        ),
+        CreateFTSTriggerOperation(
+            name='TSExpressionMultidicModel',
+            fts_vector='tsvector',
+        ),
+        CreateFTSIndexOperation(
+            name='TSExpressionModel',
+            fts_vector='tsvector',
+            index='gin'
+        ),
+        CreateFTSIndexOperation(
+            name='TSExpressionMultidicModel',
+            fts_vector='tsvector',
+            index='gin'
+        ),
+    ]
@@ -38,3 +38,57 @@ class TSMultidicModel(models.Model):
 class Related(models.Model):
     single = models.ForeignKey(TSQueryModel, blank=True, null=True)
     multiple = models.ForeignKey(TSMultidicModel, blank=True, null=True)
+
+
+@python_2_unicode_compatible
+class TSGeneratedModel(models.Model):
+    title = models.CharField(max_length=50)
+    body = models.TextField()
+
+    tsvector = TSVectorField((('title', 'A'), 'body'), storage='generated')
+
+    def __str__(self):
+        return self.title
+
+
+@python_2_unicode_compatible
+class TSGeneratedMultidicModel(models.Model):
+    title = models.CharField(max_length=50)
+    body = models.TextField()
+    dictionary = models.CharField(
+        max_length=15,
+        choices=(('english', 'english'), ('portuguese', 'portuguese')),
+        default='english'
+    )
+    tsvector = TSVectorField((('title', 'A'), 'body'),
+                             dictionary='dictionary', storage='generated')
+
+    def __str__(self):
+        return self.title
+
+
+@python_2_unicode_compatible
+class TSExpressionModel(models.Model):
+    title = models.CharField(max_length=50)
+    body = models.TextField()
+
+    tsvector = TSVectorField((('title', 'A'), 'body'), storage='expression')
+
+    def __str__(self):
+        return self.title
+
+
+@python_2_unicode_compatible
+class TSExpressionMultidicModel(models.Model):
+    title = models.CharField(max_length=50)
+    body = models.TextField()
+    dictionary = models.CharField(
+        max_length=15,
+        choices=(('english', 'english'), ('portuguese', 'portuguese')),
+        default='english'
+    )
+    tsvector = TSVectorField((('title', 'A'), 'body'),
+                             dictionary='dictionary', storage='expression')
+
+    def __str__(self):
+        return self.title
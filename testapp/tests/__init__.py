@@ -2,3 +2,10 @@ from .test_checks import *
 from .test_migrations import *
 from .test_query import *
 from .test_annotation import *
+from .test_paginator import *
+from .test_generated import *
+from .test_commands import *
+from .test_metrics import *
+from .test_slowlog import *
+from .test_sqlcomment import *
+from .test_profile import *
@@ -1,12 +1,16 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from testapp.models import TSQueryModel, Related, TSMultidicModel
 from pg_fts.ranks import (FTSRank, FTSRankDictionay, FTSRankCd,
-                          FTSRankCdDictionary)
+                          FTSRankCdDictionary, FTSHeadline, RankQuerySet,
+                          without_ranks)
 from django.core import exceptions
 
-__all__ = ('AnnotateTestCase', 'FTSRankDictionayTestCase')
+__all__ = ('AnnotateTestCase', 'FTSRankDictionayTestCase',
+           'FTSHeadlineTestCase')
 
 
 class AnnotateTestCase(TestCase):
@@ -32,10 +36,10 @@ salvão save o the planeta planet"""
             rank=FTSRank(tsvector__search='para mesmo')
         )
 
-        self.assertIn('''WHERE ("testapp_tsquerymodel"."tsvector" @@ to_tsquery('english', para & mesmo))''',
+        self.assertIn('''WHERE "testapp_tsquerymodel"."tsvector" @@ "pg_fts_tsquery"."pg_fts_tsquery"''',
                       str(q.query))
 
-        self.assertIn('''ts_rank("testapp_tsquerymodel"."tsvector", to_tsquery('english', para & mesmo)) AS "rank"''',
+        self.assertIn('''ts_rank("testapp_tsquerymodel"."tsvector", "pg_fts_tsquery"."pg_fts_tsquery") AS "rank"''',
                       str(q.query))
 
         self.assertEqual(
@@ -48,10 +52,10 @@ salvão save o the planeta planet"""
         q = TSQueryModel.objects.annotate(
             rank=FTSRank(tsvector__isearch='para mesmo'))
 
-        self.assertIn('''WHERE ("testapp_tsquerymodel"."tsvector" @@ to_tsquery('english', para | mesmo))''',
+        self.assertIn('''WHERE "testapp_tsquerymodel"."tsvector" @@ "pg_fts_tsquery"."pg_fts_tsquery"''',
                       str(q.query))
 
-        self.assertIn('''ts_rank("testapp_tsquerymodel"."tsvector", to_tsquery('english', para | mesmo)) AS "rank"''',
+        self.assertIn('''ts_rank("testapp_tsquerymodel"."tsvector", "pg_fts_tsquery"."pg_fts_tsquery") AS "rank"''',
                       str(q.query))
 
         self.assertEqual(
@@ -64,10 +68,10 @@ salvão save o the planeta planet"""
         q = TSQueryModel.objects.annotate(
             rank=FTSRank(tsvector__tsquery='para & mesmo'))
 
-        self.assertIn('''WHERE ("testapp_tsquerymodel"."tsvector" @@ to_tsquery('english', para & mesmo))''',
+        self.assertIn('''WHERE "testapp_tsquerymodel"."tsvector" @@ "pg_fts_tsquery"."pg_fts_tsquery"''',
                       str(q.query))
 
-        self.assertIn('''ts_rank("testapp_tsquerymodel"."tsvector", to_tsquery('english', para & mesmo)) AS "rank"''',
+        self.assertIn('''ts_rank("testapp_tsquerymodel"."tsvector", "pg_fts_tsquery"."pg_fts_tsquery") AS "rank"''',
                       str(q.query))
 
         self.assertEqual(
@@ -81,10 +85,10 @@ salvão save o the planeta planet"""
             rank=FTSRank(single__tsvector__search='para mesmo')
         )
         self.assertEqual(len(q), 2)
-        self.assertIn('''WHERE ("testapp_tsquerymodel"."tsvector" @@ to_tsquery('english', para & mesmo))''',
+        self.assertIn('''WHERE "testapp_tsquerymodel"."tsvector" @@ "pg_fts_tsquery"."pg_fts_tsquery"''',
                       str(q.query))
 
-        self.assertIn('''ts_rank("testapp_tsquerymodel"."tsvector", to_tsquery('english', para & mesmo)) AS "rank"''',
+        self.assertIn('''ts_rank("testapp_tsquerymodel"."tsvector", "pg_fts_tsquery"."pg_fts_tsquery") AS "rank"''',
                       str(q.query))
 
         self.assertEqual(
@@ -93,16 +97,110 @@ salvão save o the planeta planet"""
         self.assertEqual(
             q.order_by('rank')[0].single.title, 'malucos crazy como like eu me')
 
-    def test_rank_dictionay_group_by_related(self):
+    def test_rank_no_group_by_related(self):
         qn = Related.objects.annotate(
             rank=FTSRank(single__tsvector__search='para mesmo'))
-        self.assertIn('"testapp_tsquerymodel"."tsvector"',
-                      str(qn.query).split('GROUP BY')[-1])
+        self.assertNotIn('GROUP BY', str(qn.query))
+        self.assertEqual(qn.count(), 2)
+
+    def test_rank_no_group_by(self):
+        q = TSQueryModel.objects.annotate(
+            rank=FTSRank(tsvector__search='para mesmo'))
+        self.assertNotIn('GROUP BY', str(q.query))
+        self.assertNotIn('GROUP BY', str(q.order_by('-rank')[:1].query))
+        self.assertEqual(q.count(), 2)
+
+    def assertCount(self, qs, count):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(qs.count(), count)
+        sql = queries[0]['sql']
+        self.assertNotIn('GROUP BY', sql)
+        self.assertNotIn('ts_rank', sql)
+        self.assertIn('@@', sql)
+
+    def test_rank_count(self):
+        q = RankQuerySet(TSQueryModel).annotate(
+            rank=FTSRank(tsvector__search='para mesmo'),
+            rank_cd=FTSRankCd(tsvector__search='para mesmo'))
+        self.assertCount(q, 2)
+        self.assertCount(q.order_by('-rank')[:1], 1)
+        self.assertCount(without_ranks(TSQueryModel.objects.annotate(
+            rank=FTSRank(tsvector__search='para mesmo'))), 2)
+        self.assertCount(without_ranks(Related.objects.annotate(
+            rank=FTSRank(single__tsvector__search='para mesmo'))), 2)
+        # the ranks are kept for the results
+        self.assertEqual(len(q), 2)
+        self.assertEqual(q.count(), 2)
+        self.assertGreater(q[0].rank, 0)
+
+    def test_tsquery_computed_once(self):
+        q = TSQueryModel.objects.annotate(
+            rank=FTSRank(tsvector__search='para mesmo'),
+            rank_cd=FTSRankCd(tsvector__search='para mesmo')
+        ).filter(tsvector__search='para mesmo').order_by('-rank')
+        sql = str(q.query)
+        self.assertEqual(sql.count('to_tsquery'), 1)
+        # the lookup of the ranks and the filter are the same predicate
+        self.assertEqual(sql.count('@@'), 1)
+        self.assertIn(
+            '''CROSS JOIN to_tsquery('english', para & mesmo) "pg_fts_tsquery"''',
+            sql)
+        self.assertIn('ORDER BY "rank" DESC', sql)
+        self.assertEqual(q[0].title, 'para for os the mesmo same malucos crazy')
+        q = TSQueryModel.objects.filter(tsvector__search='para mesmo').annotate(
+            rank=FTSRank(tsvector__search='para mesmo'),
+            rank_cd=FTSRankCd(tsvector__search='para mesmo'))
+        self.assertEqual(str(q.query).count('@@'), 1)
+        self.assertEqual(len(q), 2)
+        # only the required lookups
+        q = TSQueryModel.objects.exclude(tsvector__search='para mesmo').annotate(
+            rank=FTSRank(tsvector__search='para mesmo'))
+        self.assertEqual(str(q.query).count('@@'), 2)
+        self.assertEqual(len(q), 0)
+
+    def test_tsquery_different_queries(self):
+        q = TSQueryModel.objects.annotate(
+            rank=FTSRank(tsvector__search='para mesmo'),
+            rank_cd=FTSRankCd(tsvector__isearch='para mesmo')
+        )
+        self.assertEqual(str(q.query).count('CROSS JOIN to_tsquery'), 2)
+        self.assertEqual(len(q), 2)
+
+    def test_candidates(self):
+        q = TSQueryModel.objects.annotate(
+            rank=FTSRank(tsvector__search='para mesmo', candidates=1))
+        sql = str(q.query)
+        self.assertIn('LIMIT 1', sql)
+        # parsed once in the candidates subquery, shared with the rank
+        self.assertEqual(sql.count('to_tsquery'), 1)
+        self.assertEqual(len(q), 1)
+        self.assertEqual(q[0].title, 'malucos crazy como like eu me')
+
+        q = TSQueryModel.objects.annotate(
+            rank=FTSRank(tsvector__search='para mesmo', candidates=1,
+                         candidates_order='pk'))
+        self.assertEqual(len(q), 1)
+        self.assertEqual(q[0].title, 'para for os the mesmo same malucos crazy')
+
+        q = TSQueryModel.objects.annotate(
+            rank=FTSRankCd(tsvector__search='para mesmo', candidates=10))
+        self.assertEqual(
+            q.order_by('-rank')[0].title, 'para for os the mesmo same malucos crazy')
+
+    def test_candidates_related(self):
+        q = Related.objects.annotate(
+            rank=FTSRank(single__tsvector__search='para mesmo', candidates=1))
+        self.assertEqual(len(q), 1)
+        self.assertEqual(q[0].single.title, 'malucos crazy como like eu me')
+
+    def test_candidates_assertions(self):
+        with self.assertRaises(AssertionError):
+            FTSRank(tsvector__search='para mesmo', candidates=0)
 
     def test_normalization(self):
         qs = TSQueryModel.objects.annotate(
             rank=FTSRank(tsvector__tsquery='para & mesmo', normalization=[32, 8]))
-        self.assertIn('''ts_rank("testapp_tsquerymodel"."tsvector", to_tsquery('english', para & mesmo), 32|8) AS "rank"''',
+        self.assertIn('''ts_rank("testapp_tsquerymodel"."tsvector", "pg_fts_tsquery"."pg_fts_tsquery", 32|8) AS "rank"''',
                       str(qs.query))
         self.assertEqual(len(qs), 2)
 
@@ -115,7 +213,7 @@ salvão save o the planeta planet"""
             )
         )
 
-        self.assertIn('''ts_rank('{0.1, 0.2, 0.4, 1.0}', "testapp_tsquerymodel"."tsvector", to_tsquery('english', para & mesmo), 32|8) AS "rank"''',
+        self.assertIn('''ts_rank('{0.1, 0.2, 0.4, 1.0}', "testapp_tsquerymodel"."tsvector", "pg_fts_tsquery"."pg_fts_tsquery", 32|8) AS "rank"''',
                       str(qs.query))
 
         self.assertEqual(len(qs), 2)
@@ -163,10 +261,10 @@ salvão save o the planeta planet"""
             rank=FTSRankCd(tsvector__search='para mesmo')
         )
 
-        self.assertIn('''WHERE ("testapp_tsquerymodel"."tsvector" @@ to_tsquery('english', para & mesmo))''',
+        self.assertIn('''WHERE "testapp_tsquerymodel"."tsvector" @@ "pg_fts_tsquery"."pg_fts_tsquery"''',
                       str(q.query))
 
-        self.assertIn('''ts_rank_cd("testapp_tsquerymodel"."tsvector", to_tsquery('english', para & mesmo)) AS "rank"''',
+        self.assertIn('''ts_rank_cd("testapp_tsquerymodel"."tsvector", "pg_fts_tsquery"."pg_fts_tsquery") AS "rank"''',
                       str(q.query))
 
         self.assertEqual(
@@ -211,22 +309,22 @@ salvão save o the planeta planet"""
             rank=FTSRankDictionay(tsvector__portuguese__tsquery='para & os'))
 
         self.assertIn(
-            '''("testapp_tsmultidicmodel"."tsvector" @@ to_tsquery('portuguese', para & os))''',
+            '''"testapp_tsmultidicmodel"."tsvector" @@ "pg_fts_tsquery"."pg_fts_tsquery"''',
             str(pt.query))
 
         self.assertIn(
-            '''ts_rank("testapp_tsmultidicmodel"."tsvector", to_tsquery('portuguese', para & os)) AS "rank"''',
+            '''ts_rank("testapp_tsmultidicmodel"."tsvector", "pg_fts_tsquery"."pg_fts_tsquery") AS "rank"''',
             str(pt.query))
 
         en = qn_base_pt.annotate(
             rank=FTSRankDictionay(tsvector__english__tsquery='para & os'))
 
         self.assertIn(
-            '''("testapp_tsmultidicmodel"."tsvector" @@ to_tsquery('english', para & os))''',
+            '''"testapp_tsmultidicmodel"."tsvector" @@ "pg_fts_tsquery"."pg_fts_tsquery"''',
             str(en.query))
 
         self.assertIn(
-            '''ts_rank("testapp_tsmultidicmodel"."tsvector", to_tsquery('english', para & os)) AS "rank"''',
+            '''ts_rank("testapp_tsmultidicmodel"."tsvector", "pg_fts_tsquery"."pg_fts_tsquery") AS "rank"''',
             str(en.query))
 
         qn_base_pt.annotate(
@@ -242,28 +340,43 @@ salvão save o the planeta planet"""
         qn_en = qn_base_en.annotate(rank=FTSRankDictionay(
             multiple__tsvector__english__tsquery='para & os'))
 
-        self.assertIn('''"testapp_tsmultidicmodel"."tsvector" @@ to_tsquery('english', para & os))''',
+        self.assertIn('''"testapp_tsmultidicmodel"."tsvector" @@ "pg_fts_tsquery"."pg_fts_tsquery" AND "testapp_tsmultidicmodel"."dictionary" = english)''',
                       str(qn_en.query))
 
-        self.assertIn('''ts_rank("testapp_tsmultidicmodel"."tsvector", to_tsquery('english', para & os)) AS "rank"''',
+        self.assertIn('''ts_rank("testapp_tsmultidicmodel"."tsvector", "pg_fts_tsquery"."pg_fts_tsquery") AS "rank"''',
                       str(qn_en.query))
 
-        self.assertIn('''"testapp_tsmultidicmodel"."tsvector" @@ to_tsquery('portuguese', para & os))''',
+        self.assertIn('''"testapp_tsmultidicmodel"."tsvector" @@ "pg_fts_tsquery"."pg_fts_tsquery" AND "testapp_tsmultidicmodel"."dictionary" = portuguese)''',
                       str(qn_pt.query))
 
-        self.assertIn('''ts_rank("testapp_tsmultidicmodel"."tsvector", to_tsquery('portuguese', para & os)) AS "rank"''',
+        self.assertIn('''ts_rank("testapp_tsmultidicmodel"."tsvector", "pg_fts_tsquery"."pg_fts_tsquery") AS "rank"''',
                       str(qn_pt.query))
 
         self.assertEqual(len(qn_en), 1)
         self.assertEqual(len(qn_pt), 0)
 
-    def test_rank_dictionay_group_by_related(self):
+    def test_rank_dictionay_no_group_by_related(self):
         qn_base_pt = Related.objects.filter(multiple__dictionary='portuguese')
         qn_pt = qn_base_pt.annotate(rank=FTSRankDictionay(
             multiple__tsvector__portuguese__tsquery='para & os'))
 
-        self.assertIn('"testapp_tsmultidicmodel"."tsvector"',
-                      str(qn_pt.query).split('GROUP BY')[-1])
+        self.assertNotIn('GROUP BY', str(qn_pt.query))
+
+    def test_rank_dictionay_tsquery_computed_once(self):
+        qn_pt = Related.objects.annotate(rank=FTSRankDictionay(
+            multiple__tsvector__portuguese__tsquery='para & os'))
+        sql = str(qn_pt.query)
+        self.assertEqual(sql.count('to_tsquery'), 1)
+        self.assertIn(
+            '''CROSS JOIN to_tsquery('portuguese', para & os) "pg_fts_tsquery"''',
+            sql)
+
+    def test_rank_dictionay_candidates(self):
+        qn = TSMultidicModel.objects.annotate(rank=FTSRankDictionay(
+            tsvector__english__tsquery='para & os', candidates=5))
+        self.assertIn('''("testapp_tsmultidicmodel"."tsvector" @@ pg_fts_tsquery.pg_fts_tsquery AND "testapp_tsmultidicmodel"."dictionary" = english) ORDER BY "testapp_tsmultidicmodel"."id" DESC LIMIT 5''',
+                      str(qn.query))
+        self.assertEqual(len(qn), 1)
 
     def test_rank_cd_dictionary(self):
         qn_base_pt = Related.objects.filter(multiple__dictionary='portuguese')
@@ -274,16 +387,16 @@ salvão save o the planeta planet"""
         qn_en = qn_base_en.annotate(rank=FTSRankCdDictionary(
             multiple__tsvector__english__tsquery='para & os'))
 
-        self.assertIn('''"testapp_tsmultidicmodel"."tsvector" @@ to_tsquery('english', para & os))''',
+        self.assertIn('''"testapp_tsmultidicmodel"."tsvector" @@ "pg_fts_tsquery"."pg_fts_tsquery" AND "testapp_tsmultidicmodel"."dictionary" = english)''',
                       str(qn_en.query))
 
-        self.assertIn('''ts_rank_cd("testapp_tsmultidicmodel"."tsvector", to_tsquery('english', para & os)) AS "rank"''',
+        self.assertIn('''ts_rank_cd("testapp_tsmultidicmodel"."tsvector", "pg_fts_tsquery"."pg_fts_tsquery") AS "rank"''',
                       str(qn_en.query))
 
-        self.assertIn('''"testapp_tsmultidicmodel"."tsvector" @@ to_tsquery('portuguese', para & os))''',
+        self.assertIn('''"testapp_tsmultidicmodel"."tsvector" @@ "pg_fts_tsquery"."pg_fts_tsquery" AND "testapp_tsmultidicmodel"."dictionary" = portuguese)''',
                       str(qn_pt.query))
 
-        self.assertIn('''ts_rank_cd("testapp_tsmultidicmodel"."tsvector", to_tsquery('portuguese', para & os)) AS "rank"''',
+        self.assertIn('''ts_rank_cd("testapp_tsmultidicmodel"."tsvector", "pg_fts_tsquery"."pg_fts_tsquery") AS "rank"''',
                       str(qn_pt.query))
 
     def test_transform_dictionary_exception(self):
@@ -301,3 +414,97 @@ salvão save o the planeta planet"""
         self.assertEqual(
             str(msg.exception),
             "The 'portuguese' isn't valid Lookup for FTSRankDictionay")
+
+
+class FTSHeadlineTestCase(TestCase):
+
+    def setUp(self):
+        TSQueryModel.objects.create(
+            title='para for os the mesmo same malucos crazy',
+            body="""para for os the mesmo same malucos crazy que that tomorow
+salvão save o the planeta planet"""
+        )
+        TSQueryModel.objects.create(
+            title='malucos crazy como like eu me',
+            body="""para for os the mesmo same malucos crazy que that tomorow
+salvão save o the planeta planet"""
+        )
+        for dictionary in ('english', 'portuguese'):
+            TSMultidicModel.objects.create(
+                title='para for os the mesmo same malucos crazy',
+                body='malucos crazy como like eu me',
+                dictionary=dictionary
+            )
+
+    def test_headline(self):
+        qs = TSQueryModel.objects.annotate(
+            rank=FTSRank(tsvector__search='para mesmo')
+        ).order_by('-rank')[:1]
+        rows = FTSHeadline('body', tsvector__search='para mesmo').apply(qs)
+        self.assertIn(
+            '''ts_headline('english', "pg_fts_headline"."body", to_tsquery('english', %s)) AS "headline" FROM (SELECT''',
+            rows.raw_query)
+        self.assertIn('LIMIT 1) "pg_fts_headline"', rows.raw_query)
+        rows = list(rows)
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0].title, 'para for os the mesmo same malucos crazy')
+        self.assertIn('<b>para</b>', rows[0].headline)
+        self.assertTrue(rows[0].rank > 0)
+
+    def test_headline_ordering(self):
+        qs = TSQueryModel.objects.annotate(
+            rank=FTSRank(tsvector__isearch='para malucos')
+        ).order_by('-rank', 'pk')
+        rows = FTSHeadline('body', tsvector__isearch='para malucos').apply(qs)
+        self.assertTrue(rows.raw_query.endswith(
+            '"pg_fts_headline" ORDER BY "pg_fts_headline"."rank" DESC, '
+            '"pg_fts_headline"."id" ASC'))
+        self.assertEqual([r.pk for r in rows], [r.pk for r in qs])
+
+        # the order column isn't selected
+        qs = TSQueryModel.objects.filter(
+            tsvector__isearch='para malucos').defer('title').order_by('-title')
+        rows = FTSHeadline('body', tsvector__isearch='para malucos').apply(qs)
+        self.assertTrue(rows.raw_query.endswith(
+            '"pg_fts_headline" ORDER BY '
+            '"pg_fts_headline"."pg_fts_headline_order_0" DESC'))
+        self.assertEqual([r.pk for r in rows], [r.pk for r in qs])
+
+        rows = FTSHeadline('body', tsvector__isearch='para malucos').apply(
+            TSQueryModel.objects.filter(tsvector__isearch='para malucos'))
+        self.assertNotIn('ORDER BY', rows.raw_query)
+
+    def test_headline_options(self):
+        qs = TSQueryModel.objects.filter(tsvector__isearch='planet')
+        rows = list(FTSHeadline(
+            'body', tsvector__isearch='planet',
+            options={'StartSel': '<em>', 'StopSel': '</em>'}
+        ).apply(qs, headline='snippet'))
+        self.assertEqual(len(rows), 2)
+        self.assertIn('<em>planet</em>', rows[0].snippet)
+
+    def test_headline_multidict(self):
+        qs = TSMultidicModel.objects.filter(
+            tsvector__isearch='malucos crazy').order_by('pk')
+        rows = FTSHeadline('body', tsvector__isearch='malucos crazy').apply(qs)
+        self.assertIn(
+            '''ts_headline("pg_fts_headline"."dictionary"::regconfig, "pg_fts_headline"."body",''',
+            rows.raw_query)
+        self.assertEqual(len(list(rows)), len(qs))
+
+        qs = TSMultidicModel.objects.filter(
+            tsvector__portuguese__search='malucos crazy')
+        rows = FTSHeadline(
+            'body', tsvector__portuguese__search='malucos crazy').apply(qs)
+        self.assertIn(
+            '''ts_headline('portuguese', "pg_fts_headline"."body", to_tsquery('portuguese', %s))''',
+            rows.raw_query)
+
+    def test_headline_exceptions(self):
+        with self.assertRaises(exceptions.FieldError):
+            FTSHeadline('body', tsvector__nolookup='malucos')
+        with self.assertRaises(exceptions.FieldError):
+            FTSHeadline('body', tsvector='malucos')
+        with self.assertRaises(exceptions.FieldError):
+            FTSHeadline('body', title__search='malucos').apply(
+                TSQueryModel.objects.all())
@@ -1,10 +1,15 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
+from django.apps import apps
 from django.test import TestCase
+from pg_fts.checks import check_database, check_dictionaries
 from pg_fts.fields import TSVectorField
-from django.db import models
+from pg_fts.introspection import PgFTSIntrospection
+from pg_fts.migrations import PgFtsSQL
+from django.db import connection, models
+from testapp.models import TSQueryModel
 
-__all__ = ('TestChecks', )
+__all__ = ('TestChecks', 'TestDatabaseChecks')
 
 
 class TestChecks(TestCase):
@@ -30,3 +35,51 @@ class TestChecks(TestCase):
         error = TSVectorModelError._meta.get_field('tsvector')
 
         self.assertEqual(len(error.check()), 2)
+
+
+class TestDatabaseChecks(TestCase):
+
+    introspection = PgFTSIntrospection()
+
+    def _check(self):
+        return check_database([apps.get_app_config('testapp')])
+
+    def test_dictionary_list(self):
+        with connection.cursor() as cursor:
+            dictionaries = self.introspection.get_dictionay_list(cursor)
+        self.assertIn('english', dictionaries)
+        self.assertIn('portuguese', dictionaries)
+
+    def test_check_database(self):
+        self.assertEqual(self._check(), [])
+
+    def test_missing_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DROP INDEX testapp_tsquerymodel_tsvector')
+        errors = self._check()
+        self.assertEqual([e.id for e in errors], ['fts.W001'])
+        self.assertEqual(errors[0].obj, TSQueryModel._meta.get_field('tsvector'))
+
+    def test_trigger(self):
+        field = TSQueryModel._meta.get_field('tsvector')
+        with connection.cursor() as cursor:
+            # the trigger of other weights
+            cursor.execute(
+                PgFtsSQL().delete_trigger(TSQueryModel, field) + ';' +
+                PgFtsSQL().create_fts_trigger(TSQueryModel, field).replace(
+                    "'D'", "'A'"))
+        self.assertEqual([e.id for e in self._check()], ['fts.W003'])
+        with connection.cursor() as cursor:
+            cursor.execute(PgFtsSQL().delete_trigger(TSQueryModel, field))
+        self.assertEqual([e.id for e in self._check()], ['fts.W002'])
+
+    def test_dictionary(self):
+        class TSVectorModelDictionary(models.Model):
+            title = models.CharField(max_length=50)
+
+            tsvector = TSVectorField(('title',), dictionary='klingon')
+
+        errors = check_dictionaries(
+            TSVectorModelDictionary._meta.get_field('tsvector'),
+            ['english', 'portuguese'])
+        self.assertEqual([e.id for e in errors], ['fts.E002'])
@@ -0,0 +1,396 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+from django.apps import apps
+from django.core.management import call_command, CommandError
+from django.db import connection, connections, models, transaction
+from django.db.migrations.state import ProjectState
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import six
+from pg_fts.introspection import PgFTSIntrospection
+from pg_fts.management import prewarm
+from pg_fts.management.commands.fts_prewarm import (Command as PrewarmCommand,
+                                                    parse_size)
+from pg_fts.management.commands.fts_rebuild import (
+    Command as RebuildCommand)
+from pg_fts.management.commands.fts_statements import (
+    Command as StatementsCommand)
+from pg_fts.migrations import (CreateFTSTriggerOperation,
+                               DeleteFTSTriggerOperation, PgFtsSQL)
+from testapp.models import TSQueryModel, TSMultidicModel
+
+__all__ = ('DrainQueueTestCase', 'RebuildTestCase', 'MaintainTestCase',
+           'DoctorTestCase', 'PrewarmTestCase', 'StatementsTestCase')
+
+
+class DrainQueueTestCase(TransactionTestCase):
+
+    queue = 'testapp_tsquerymodel_tsvector_queue'
+
+    def setUp(self):
+        self.models = []
+
+    def _migrate(self, model='TSQueryModel'):
+        state = ProjectState.from_apps(apps)
+        with connection.schema_editor() as schema_editor:
+            DeleteFTSTriggerOperation(model, 'tsvector').database_forwards(
+                'testapp', schema_editor, state, state)
+            CreateFTSTriggerOperation(
+                model, 'tsvector', level='queue').database_forwards(
+                'testapp', schema_editor, state, state)
+        self.models.append(model)
+
+    def tearDown(self):
+        state = ProjectState.from_apps(apps)
+        with connection.schema_editor() as schema_editor:
+            for model in self.models:
+                DeleteFTSTriggerOperation(
+                    model, 'tsvector', level='queue').database_forwards(
+                    'testapp', schema_editor, state, state)
+                CreateFTSTriggerOperation(model, 'tsvector').database_forwards(
+                    'testapp', schema_editor, state, state)
+
+    def _queue(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT id FROM %s ORDER BY id' % self.queue)
+            return [r[0] for r in cursor.fetchall()]
+
+    def _drain(self, *args, **kwargs):
+        stdout = six.StringIO()
+        call_command('fts_drain_queue', *args, stdout=stdout, **kwargs)
+        return stdout.getvalue()
+
+    def test_drain(self):
+        self._migrate()
+        objs = [TSQueryModel.objects.create(title='para mesmo %s' % i,
+                                            body='malucos crazy')
+                for i in range(5)]
+        # deduplicated
+        TSQueryModel.objects.filter(pk=objs[0].pk).update(body='porto')
+        # not changed
+        TSQueryModel.objects.update(sometext='counter')
+        self.assertEqual(self._queue(), [o.pk for o in objs])
+        self.assertEqual(TSQueryModel.objects.filter(
+            tsvector__search='malucos').count(), 0)
+
+        self.assertIn('5 rows updated',
+                      self._drain('testapp.TSQueryModel', 'tsvector',
+                                  batch_size=2))
+        self.assertEqual(self._queue(), [])
+        self.assertEqual(TSQueryModel.objects.filter(
+            tsvector__search='malucos').count(), 4)
+        self.assertEqual(TSQueryModel.objects.filter(
+            tsvector__search='porto').count(), 1)
+
+        # save without changes keeps the vector
+        objs[1].save()
+        self.assertEqual(self._queue(), [])
+        self.assertEqual(TSQueryModel.objects.filter(
+            tsvector__search='malucos').count(), 4)
+
+    def test_skip_locked(self):
+        self._migrate()
+        objs = [TSQueryModel.objects.create(title='para mesmo %s' % i,
+                                            body='malucos crazy')
+                for i in range(4)]
+        other = connections['default'].__class__(
+            connection.settings_dict, connection.alias)
+        try:
+            other.set_autocommit(False)
+            with other.cursor() as cursor:
+                # another worker
+                cursor.execute(
+                    'SELECT id FROM testapp_tsquerymodel WHERE id = %s '
+                    'FOR UPDATE', [objs[0].pk])
+                self._drain('testapp.TSQueryModel', 'tsvector')
+                self.assertEqual(self._queue(), [objs[0].pk])
+            other.rollback()
+        finally:
+            other.close()
+        self._drain('testapp.TSQueryModel', 'tsvector')
+        self.assertEqual(TSQueryModel.objects.filter(
+            tsvector__search='malucos').count(), 4)
+
+    def test_concurrent_write(self):
+        self._migrate()
+        objs = [TSQueryModel.objects.create(title='para mesmo %s' % i,
+                                            body='malucos crazy')
+                for i in range(3)]
+        writer = connections['default'].__class__(
+            connection.settings_dict, connection.alias)
+        try:
+            writer.set_autocommit(False)
+            with writer.cursor() as cursor:
+                cursor.execute(
+                    'UPDATE testapp_tsquerymodel SET body = %s WHERE id = %s',
+                    ['porto', objs[0].pk])
+                with connection.cursor() as main:
+                    main.execute("SET lock_timeout = '5s'")
+                try:
+                    # the batch doesn't wait for the row of the write
+                    self.assertIn('2 rows updated', self._drain(
+                        'testapp.TSQueryModel', 'tsvector'))
+                finally:
+                    with connection.cursor() as main:
+                        main.execute('RESET lock_timeout')
+                self.assertEqual(self._queue(), [objs[0].pk])
+                cursor.execute(
+                    'UPDATE testapp_tsquerymodel SET title = %s WHERE id = %s',
+                    ['para porto', objs[0].pk])
+            writer.commit()
+        finally:
+            writer.close()
+        self._drain('testapp.TSQueryModel', 'tsvector')
+        self.assertEqual(self._queue(), [])
+        self.assertEqual(TSQueryModel.objects.filter(
+            tsvector__search='porto').count(), 1)
+        self.assertEqual(TSQueryModel.objects.filter(
+            tsvector__search='malucos').count(), 2)
+
+    def test_deleted(self):
+        self._migrate()
+        obj = TSQueryModel.objects.create(title='para mesmo',
+                                          body='malucos crazy')
+        TSQueryModel.objects.filter(pk=obj.pk).delete()
+        self.assertEqual(self._queue(), [obj.pk])
+        self.assertIn('1 rows updated',
+                      self._drain('testapp.TSQueryModel', 'tsvector'))
+        self.assertEqual(self._queue(), [])
+
+    def test_multidict(self):
+        self._migrate('TSMultidicModel')
+        TSMultidicModel.objects.create(title='para os mesmo malucos',
+                                       body='como eu', dictionary='portuguese')
+        self._drain('testapp.TSMultidicModel', 'tsvector')
+        self.assertEqual(TSMultidicModel.objects.filter(
+            tsvector__portuguese__search='maluco').count(), 1)
+
+    def test_errors(self):
+        with self.assertRaises(CommandError):
+            self._drain('testapp.NoModel', 'tsvector')
+        with self.assertRaises(CommandError):
+            self._drain('testapp.TSQueryModel', 'title')
+
+
+class RebuildTestCase(TransactionTestCase):
+
+    def _clear(self):
+        # the vectors of a change of weights or dictionary
+        sql = PgFtsSQL()
+        field = TSQueryModel._meta.get_field('tsvector')
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(sql.skip_trigger(TSQueryModel, field), ['on'])
+                cursor.execute('UPDATE testapp_tsquerymodel SET tsvector = NULL')
+
+    def _rebuild(self, *args, **kwargs):
+        stdout = six.StringIO()
+        call_command('fts_rebuild', *args, stdout=stdout, **kwargs)
+        return stdout.getvalue()
+
+    def test_rebuild(self):
+        objs = [TSQueryModel.objects.create(title='para mesmo %s' % i,
+                                            body='malucos crazy')
+                for i in range(5)]
+        self._clear()
+        self.assertEqual(TSQueryModel.objects.filter(
+            tsvector__search='malucos').count(), 0)
+
+        out = self._rebuild('testapp.TSQueryModel', 'tsvector',
+                            workers=2, batch_size=2, verbosity=2)
+        self.assertIn('5 rows updated', out)
+        self.assertIn('%d-%d: 2 rows' % (objs[0].pk, objs[1].pk), out)
+        self.assertEqual(TSQueryModel.objects.filter(
+            tsvector__search='malucos').count(), 5)
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT last_analyze FROM pg_stat_user_tables "
+                           "WHERE relname = 'testapp_tsquerymodel'")
+            self.assertIsNotNone(cursor.fetchone()[0])
+
+    def test_range(self):
+        objs = [TSQueryModel.objects.create(title='para mesmo %s' % i,
+                                            body='malucos crazy')
+                for i in range(4)]
+        self._clear()
+        self.assertIn('2 rows updated',
+                      self._rebuild('testapp.TSQueryModel', 'tsvector',
+                                    workers=1, min_pk=objs[1].pk,
+                                    max_pk=objs[2].pk))
+        self.assertEqual(
+            list(TSQueryModel.objects.filter(
+                tsvector__search='malucos').values_list('pk', flat=True
+                                                        ).order_by('pk')),
+            [objs[1].pk, objs[2].pk])
+
+    def test_errors(self):
+        with self.assertRaises(CommandError):
+            self._rebuild('testapp.TSGeneratedModel', 'tsvector')
+        with self.assertRaises(CommandError):
+            self._rebuild('testapp.TSQueryModel', 'tsvector', workers=0)
+
+    def test_integer_pk(self):
+        self.assertTrue(RebuildCommand.is_integer_pk(TSQueryModel._meta.pk))
+        self.assertTrue(RebuildCommand.is_integer_pk(
+            models.OneToOneField(TSQueryModel, primary_key=True)))
+        self.assertFalse(RebuildCommand.is_integer_pk(
+            models.CharField(max_length=10, primary_key=True)))
+        self.assertFalse(RebuildCommand.is_integer_pk(
+            models.UUIDField(primary_key=True)))
+
+
+class MaintainTestCase(TransactionTestCase):
+
+    introspection = PgFTSIntrospection()
+
+    def _maintain(self, *args, **kwargs):
+        stdout = six.StringIO()
+        call_command('fts_maintain', *args, stdout=stdout, **kwargs)
+        return stdout.getvalue()
+
+    def test_report(self):
+        out = self._maintain()
+        self.assertIn('testapp_tsquerymodel_tsvector (gin): size', out)
+        self.assertIn('testapp_tsexpressionmodel_tsvector (gin): size', out)
+        self.assertNotIn('reindexed', out)
+
+    def test_clean_pending(self):
+        for i in range(10):
+            TSQueryModel.objects.create(title='para mesmo %s' % i,
+                                        body='malucos crazy')
+        out = self._maintain(clean_pending=True)
+        self.assertIn('pending pages flushed', out)
+        self.assertEqual(TSQueryModel.objects.filter(
+            tsvector__search='malucos').count(), 10)
+
+    def test_reindex(self):
+        out = self._maintain(reindex=True)
+        self.assertIn('reindexed', out)
+        with connection.cursor() as cursor:
+            self.assertTrue(self.introspection.get_index_valid(
+                cursor, 'testapp_tsquerymodel_tsvector'))
+
+
+class DoctorTestCase(TestCase):
+
+    def _doctor(self, *args, **kwargs):
+        stdout = six.StringIO()
+        call_command('fts_doctor', *args, stdout=stdout, **kwargs)
+        return stdout.getvalue()
+
+    def test_doctor(self):
+        TSQueryModel.objects.create(title='para mesmo', body='malucos crazy')
+        out = self._doctor()
+        self.assertIn('0 drift found', out)
+        self.assertIn('function testapp_tsquerymodel_tsvector_update: ok', out)
+        self.assertIn('index testapp_tsexpressionmodel_tsvector (gin): ok',
+                      out)
+        self.assertIn('vector size (1 rows)', out)
+
+    def test_drift(self):
+        field = TSQueryModel._meta.get_field('tsvector')
+        sql = PgFtsSQL()
+        with connection.cursor() as cursor:
+            # the trigger and index of a previous definition
+            cursor.execute(
+                sql.delete_trigger(TSQueryModel, field) + ';' +
+                sql.create_fts_trigger(TSQueryModel, field).replace(
+                    "'D'", "'A'"))
+            cursor.execute(
+                'DROP INDEX testapp_tsquerymodel_tsvector;'
+                'CREATE INDEX testapp_tsquerymodel_tsvector ON '
+                'testapp_tsquerymodel USING gin '
+                "(to_tsvector('english', title))")
+        out = self._doctor('testapp.TSQueryModel')
+        self.assertIn('function testapp_tsquerymodel_tsvector_update: drift',
+                      out)
+        self.assertIn('index testapp_tsquerymodel_tsvector (gin): drift', out)
+        self.assertIn('2 drift found', out)
+
+    def test_errors(self):
+        with self.assertRaises(CommandError):
+            self._doctor('testapp.NoModel')
+
+
+class PrewarmTestCase(TestCase):
+
+    introspection = PgFTSIntrospection()
+
+    def test_plan(self):
+        command = PrewarmCommand()
+        TSQueryModel.objects.create(title='para mesmo', body='malucos crazy')
+        with connection.cursor() as cursor:
+            plan = command.get_plan(cursor, ['testapp.TSQueryModel'], 8192)
+            self.assertEqual([r for r, blocks in plan],
+                             ['testapp_tsquerymodel_tsvector'])
+            plan = command.get_plan(cursor, [], 8192, heap=True, toast=True)
+            relations = [r for r, blocks in plan]
+            self.assertIn('testapp_tsexpressionmodel_tsvector', relations)
+            self.assertLess(relations.index('testapp_tsquerymodel_tsvector'),
+                            relations.index('testapp_tsquerymodel'))
+            self.assertTrue(self.introspection.get_table_storage(
+                cursor, 'testapp_tsquerymodel')[1].startswith('pg_toast.'))
+            # budget of 3 blocks
+            plan = command.get_plan(cursor, [], 8192, budget=3 * 8192,
+                                    heap=True)
+            self.assertEqual(sum(blocks for r, blocks in plan), 3)
+
+    def test_prewarm(self):
+        with connection.cursor() as cursor:
+            installed = 'pg_prewarm' in self.introspection.get_extension_list(
+                cursor)
+        stdout = six.StringIO()
+        if installed:
+            call_command('fts_prewarm', budget='1MB', stdout=stdout)
+            self.assertIn('loaded', stdout.getvalue())
+        else:
+            with self.assertRaises(CommandError):
+                call_command('fts_prewarm', stdout=stdout)
+
+    def test_post_migrate(self):
+        with override_settings(PG_FTS_PREWARM={'budget': '1MB'}):
+            # doesn't raise without the extension
+            prewarm(apps.get_app_config('pg_fts'), verbosity=0)
+
+    def test_parse_size(self):
+        self.assertEqual(parse_size('512MB'), 512 * 1024 ** 2)
+        self.assertEqual(parse_size('100'), 100)
+        self.assertIsNone(parse_size(None))
+        with self.assertRaises(CommandError):
+            parse_size('1XB')
+
+
+class StatementsTestCase(TestCase):
+
+    introspection = PgFTSIntrospection()
+
+    def test_aggregate(self):
+        statements = [
+            ("SELECT ... /*lookup='search',model='testapp.TSQueryModel',"
+             "tag='search_view'*/", 10, 100.0, 50),
+            ("SELECT ... /*lookup='search',model='testapp.TSQueryModel',"
+             "tag='search_view'*/ /*model='testapp.TSQueryModel',"
+             "rank='FTSRank'*/", 10, 300.0, 100),
+            ("UPDATE ... /*action='update_vector',"
+             "model='testapp.TSQueryModel'*/", 1, 1000.0, 1000),
+            ("SELECT ... /*other='comment'*/", 5, 5000.0, 5),
+        ]
+        groups = StatementsCommand.aggregate(statements, ['tag'])
+        self.assertEqual(sorted(groups), [
+            (('-', ), 1, 1000.0, 1000.0, 1000),
+            (('search_view', ), 20, 400.0, 20.0, 150),
+        ])
+        groups = StatementsCommand.aggregate(statements, ['lookup', 'rank'])
+        self.assertEqual(sorted(g[0] for g in groups), [
+            ('-', '-'), ('search', '-'), ('search', 'FTSRank')])
+
+    def test_statements(self):
+        with connection.cursor() as cursor:
+            installed = 'pg_stat_statements' in (
+                self.introspection.get_extension_list(cursor))
+        stdout = six.StringIO()
+        if installed:
+            call_command('fts_statements', group_by='model,tag',
+                         stdout=stdout)
+            self.assertIn('total ms', stdout.getvalue())
+        else:
+            with self.assertRaises(CommandError):
+                call_command('fts_statements', stdout=stdout)
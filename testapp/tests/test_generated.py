@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+from django.apps import apps
+from django.db import connection, models
+from django.db.migrations.state import ProjectState
+from django.test import TestCase, TransactionTestCase
+from pg_fts.fields import TSVectorField
+from pg_fts.introspection import PgFTSIntrospection
+from pg_fts.migrations import AlterFTSStorageOperation
+from pg_fts.ranks import FTSRank, FTSRankDictionay
+from testapp.models import (TSExpressionModel, TSExpressionMultidicModel,
+                            TSGeneratedModel, TSGeneratedMultidicModel,
+                            TSQueryModel)
+
+__all__ = ('GeneratedTestCase', 'AlterStorageTestCase', 'ExpressionTestCase')
+
+
+class GeneratedTestCase(TestCase):
+
+    def test_db_type(self):
+        self.assertEqual(
+            TSGeneratedModel._meta.get_field('tsvector').db_type(connection),
+            "tsvector GENERATED ALWAYS AS (setweight(to_tsvector('english', "
+            "COALESCE(title, '')), 'A') || setweight(to_tsvector('english', "
+            "COALESCE(body, '')), 'D')) STORED")
+        self.assertIn(
+            "CASE dictionary WHEN 'english' THEN 'english'::regconfig "
+            "WHEN 'portuguese' THEN 'portuguese'::regconfig "
+            "ELSE 'english'::regconfig END",
+            TSGeneratedMultidicModel._meta.get_field(
+                'tsvector').db_type(connection))
+
+    def test_search(self):
+        obj = TSGeneratedModel.objects.create(
+            title='para for os the mesmo same malucos crazy',
+            body='malucos crazy como like eu me')
+        obj.title = 'lisbon'
+        obj.save()
+        TSGeneratedModel.objects.create(title='mesmo', body='para')
+        self.assertEqual(
+            TSGeneratedModel.objects.filter(tsvector__search='lisbon').get(),
+            obj)
+        self.assertEqual(
+            TSGeneratedModel.objects.filter(tsvector__search='malucos').count(),
+            1)
+        qs = TSGeneratedModel.objects.annotate(
+            rank=FTSRank(tsvector__search='crazy'))
+        self.assertEqual(len(qs), 1)
+        self.assertIsNone(qs[0].tsvector)
+
+    def test_search_multidict(self):
+        TSGeneratedMultidicModel.objects.create(
+            title='para os mesmo malucos', body='como eu',
+            dictionary='portuguese')
+        TSGeneratedMultidicModel.objects.create(
+            title='for the same crazy', body='like me',
+            dictionary='english')
+        qs = TSGeneratedMultidicModel.objects.filter(
+            tsvector__portuguese__search='maluco')
+        self.assertEqual(qs.get().dictionary, 'portuguese')
+        qs = TSGeneratedMultidicModel.objects.annotate(
+            rank=FTSRankDictionay(tsvector__english__search='crazy'))
+        self.assertEqual(qs.get().dictionary, 'english')
+
+    def test_check(self):
+        class TSGeneratedModelError(models.Model):
+            title = models.CharField(max_length=50)
+            dictionary = models.CharField(max_length=15)
+
+            tsvector = TSVectorField(('title',), dictionary='dictionary',
+                                     storage='generated')
+
+        self.assertEqual(len(TSGeneratedModelError._meta.get_field(
+            'tsvector').check()), 1)
+        with self.assertRaises(AssertionError):
+            TSVectorField(('title',), storage='invalid')
+
+
+class ExpressionTestCase(TestCase):
+
+    def test_db_type(self):
+        self.assertIsNone(
+            TSExpressionModel._meta.get_field('tsvector').db_type(connection))
+        self.assertEqual(
+            str(TSExpressionModel.objects.filter(tsvector__search='malucos'
+                                                 ).query),
+            'SELECT "testapp_tsexpressionmodel"."id", '
+            '"testapp_tsexpressionmodel"."title", '
+            '"testapp_tsexpressionmodel"."body" FROM '
+            '"testapp_tsexpressionmodel" WHERE '
+            'testapp_tsexpressionmodel_tsvector_vector('
+            '"testapp_tsexpressionmodel"."title", '
+            '"testapp_tsexpressionmodel"."body") @@ '
+            "to_tsquery('english', malucos)")
+
+    def test_function(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT provolatile, proparallel FROM pg_proc WHERE "
+                "proname = 'testapp_tsexpressionmultidicmodel_tsvector_vector'")
+            self.assertEqual(cursor.fetchone(), ('i', 's'))
+
+    def test_search(self):
+        obj = TSExpressionModel.objects.create(
+            title='para for os the mesmo same malucos crazy',
+            body='malucos crazy como like eu me')
+        obj.title = 'lisbon'
+        obj.save()
+        TSExpressionModel.objects.create(title='mesmo', body='para')
+        self.assertEqual(
+            TSExpressionModel.objects.filter(tsvector__search='lisbon').get(),
+            obj)
+        self.assertEqual(
+            TSExpressionModel.objects.filter(
+                tsvector__isearch='malucos mesmo').count(), 2)
+        qs = TSExpressionModel.objects.annotate(
+            rank=FTSRank(tsvector__search='crazy'))
+        self.assertEqual(len(qs), 1)
+        self.assertIsNone(qs[0].tsvector)
+
+    def test_search_multidict(self):
+        TSExpressionMultidicModel.objects.create(
+            title='para os mesmo malucos', body='como eu',
+            dictionary='portuguese')
+        TSExpressionMultidicModel.objects.create(
+            title='for the same crazy', body='like me',
+            dictionary='english')
+        qs = TSExpressionMultidicModel.objects.filter(
+            tsvector__portuguese__search='maluco')
+        self.assertEqual(qs.get().dictionary, 'portuguese')
+        qs = TSExpressionMultidicModel.objects.annotate(
+            rank=FTSRankDictionay(tsvector__english__search='crazy'))
+        self.assertEqual(qs.get().dictionary, 'english')
+
+    def test_index(self):
+        qs = TSExpressionModel.objects.filter(tsvector__search='malucos')
+        sql, params = qs.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute('EXPLAIN ' + sql, params)
+            plan = '\n'.join(r[0] for r in cursor.fetchall())
+        self.assertIn('testapp_tsexpressionmodel_tsvector', plan)
+
+
+class AlterStorageTestCase(TransactionTestCase):
+
+    introspection = PgFTSIntrospection()
+
+    def _alter(self, operation, backwards=False):
+        from_state = ProjectState.from_apps(apps)
+        to_state = from_state.clone()
+        operation.state_forwards('testapp', to_state)
+        with connection.schema_editor() as schema_editor:
+            if backwards:
+                operation.database_backwards('testapp', schema_editor,
+                                             to_state, from_state)
+            else:
+                operation.database_forwards('testapp', schema_editor,
+                                            from_state, to_state)
+        return to_state
+
+    def test_alter_storage(self):
+        TSQueryModel.objects.create(title='para mesmo', body='malucos')
+        operation = AlterFTSStorageOperation('TSQueryModel', 'tsvector',
+                                             'generated', index='gin')
+        to_state = self._alter(operation)
+        self.assertEqual(to_state.apps.get_model(
+            'testapp', 'TSQueryModel')._meta.get_field('tsvector').storage,
+            'generated')
+        with connection.cursor() as cursor:
+            self.assertNotIn('testapp_tsquerymodel_tsvector_update',
+                             self.introspection.get_trigger_list(cursor))
+            self.assertTrue(self.introspection.get_index_valid(
+                cursor, 'testapp_tsquerymodel_tsvector'))
+            cursor.execute("SELECT count(*) FROM testapp_tsquerymodel WHERE "
+                           "tsvector @@ to_tsquery('english', 'malucos')")
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+        self._alter(operation, backwards=True)
+        with connection.cursor() as cursor:
+            self.assertIn('testapp_tsquerymodel_tsvector_update',
+                          self.introspection.get_trigger_list(cursor))
+            self.assertTrue(self.introspection.get_index_valid(
+                cursor, 'testapp_tsquerymodel_tsvector'))
+        TSQueryModel.objects.create(title='other', body='crazy')
+        self.assertEqual(
+            TSQueryModel.objects.filter(tsvector__isearch='malucos crazy'
+                                        ).count(), 2)
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import threading
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from pg_fts.metrics import registry
+from pg_fts.ranks import FTSRank, FTSRankCdDictionary
+from testapp.models import TSQueryModel, TSMultidicModel, Related
+
+__all__ = ('MetricsTestCase', )
+
+
+class MetricsTestCase(TestCase):
+
+    def setUp(self):
+        TSQueryModel.objects.create(title='hello crazy world',
+                                    body='the crazy same')
+        TSQueryModel.objects.create(title='hello', body='same')
+        TSMultidicModel.objects.create(title='olá mundo', body='malucos',
+                                       dictionary='portuguese')
+        registry.reset()
+        registry.enable()
+
+    def tearDown(self):
+        registry.disable()
+        registry.reset()
+
+    def get_metrics(self):
+        return dict((tuple(m['labels'][l] for l in registry.LABELS), m)
+                    for m in registry.collect())
+
+    def test_disabled(self):
+        registry.disable()
+        list(TSQueryModel.objects.filter(tsvector__search='hello'))
+        self.assertEqual(registry.collect(), [])
+
+    def test_lookup(self):
+        list(TSQueryModel.objects.filter(tsvector__search='hello'))
+        list(TSQueryModel.objects.filter(tsvector__isearch='hello crazy'))
+        list(TSQueryModel.objects.filter(tsvector__isearch='world'))
+        metrics = self.get_metrics()
+        self.assertEqual(sorted(metrics), [
+            ('testapp.TSQueryModel', 'tsvector', 'isearch', 'english', ''),
+            ('testapp.TSQueryModel', 'tsvector', 'search', 'english', ''),
+        ])
+        isearch = metrics[
+            ('testapp.TSQueryModel', 'tsvector', 'isearch', 'english', '')]
+        self.assertEqual(isearch['count'], 2)
+        self.assertEqual(isearch['rows'], 3)
+        self.assertEqual(isearch['terms'], 3)
+        self.assertEqual(isearch['buckets'][-1], (float('inf'), 2))
+        self.assertEqual(len(isearch['buckets']), len(registry.BUCKETS) + 1)
+        self.assertGreater(isearch['sum_ms'], 0)
+
+    def test_rank(self):
+        list(TSQueryModel.objects.annotate(
+            rank=FTSRank(tsvector__search='crazy')).order_by('-rank'))
+        list(TSMultidicModel.objects.annotate(rank=FTSRankCdDictionary(
+            tsvector__portuguese__search='mundo')).order_by('-rank'))
+        # the lookup of the rank is recorded with the rank
+        self.assertEqual(sorted(self.get_metrics()), [
+            ('testapp.TSMultidicModel', 'tsvector', 'search', 'portuguese',
+             'FTSRankCdDictionary'),
+            ('testapp.TSQueryModel', 'tsvector', 'search', 'english',
+             'FTSRank'),
+        ])
+
+    def test_related(self):
+        self.assertEqual(Related.objects.filter(
+            single__tsvector__search='hello').count(), 0)
+        metrics = self.get_metrics()
+        self.assertEqual(list(metrics), [
+            ('testapp.TSQueryModel', 'tsvector', 'search', 'english', '')])
+
+    def test_not_executed(self):
+        str(TSQueryModel.objects.filter(tsvector__tsquery='hello').query)
+        list(TSQueryModel.objects.filter(pk=0))
+        list(TSQueryModel.objects.filter(tsvector__search='world'))
+        self.assertEqual(list(self.get_metrics()), [
+            ('testapp.TSQueryModel', 'tsvector', 'search', 'english', '')])
+
+    def test_compiled(self):
+        sql, params = TSQueryModel.objects.filter(
+            tsvector__search='hello').query.sql_with_params()
+        list(TSQueryModel.objects.filter(pk=0))
+        with CaptureQueriesContext(connection) as queries:
+            with connection.cursor() as cursor:
+                cursor.execute(sql, params)
+        # the labels are removed from the executed SQL
+        self.assertNotIn('/*', queries[0]['sql'])
+        self.assertEqual(list(self.get_metrics()), [
+            ('testapp.TSQueryModel', 'tsvector', 'search', 'english', '')])
+
+    def test_threads(self):
+        def search():
+            list(TSQueryModel.objects.filter(tsvector__search='hello'))
+            connection.close()
+
+        threads = [threading.Thread(target=search) for i in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        list(TSQueryModel.objects.filter(tsvector__search='hello'))
+        metrics = self.get_metrics()[
+            ('testapp.TSQueryModel', 'tsvector', 'search', 'english', '')]
+        self.assertEqual(metrics['count'], 4)
+        # the rows of the other threads aren't visible in the test
+        # transaction
+        self.assertEqual(metrics['rows'], 2)
+        # the shards of the finished threads are merged
+        self.assertEqual([ref() for ref, shard in registry._shards],
+                         [threading.current_thread()])
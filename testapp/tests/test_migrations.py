@@ -1,20 +1,35 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
-from django.db import connection
+from django.apps import apps
+from django.db import connection, transaction
+from django.db.transaction import TransactionManagementError
+from django.db.migrations.state import ProjectState
 from pg_fts.introspection import PgFTSIntrospection
+from pg_fts.migrations import (PgFtsSQL, UpdateVectorOperation,
+                               CreateFTSIndexOperation,
+                               DeleteFTSIndexOperation,
+                               CreateFTSTriggerOperation,
+                               DeleteFTSTriggerOperation)
+from testapp.models import TSQueryModel, TSMultidicModel
 from django.test import (override_settings, override_system_checks,
                          TestCase, TransactionTestCase)
 from django.utils import six
 from django.core.management import call_command
 
 try:
-    from django.db.backends import TableInfo
+    from django.db.backends.base.introspection import TableInfo
     table_info = True
-except:
-    table_info = False
+except ImportError:
+    try:
+        from django.db.backends import TableInfo
+        table_info = True
+    except ImportError:
+        table_info = False
 
 __all__ = ('FTSTestBase', 'CreateOperationTestSQL',
-           'TransactionsMigrationsTest')
+           'TransactionsMigrationsTest', 'UpdateVectorBatchTest',
+           'CreateIndexConcurrentlyTest', 'StatementTriggerTest',
+           'UpdateOfTriggerTest', 'PerDictionaryIndexTest')
 
 
 class FTSTestBase(TransactionTestCase):
@@ -76,7 +91,7 @@ class CreateOperationTestSQL(TestCase):
         call_command('sqlmigrate', 'testapp', '0002', stdout=stdout)
         self.assertIn('"tsvector" tsvector null', stdout.getvalue().lower())
         self.assertIn(
-            "UPDATE testapp_tsvectormodel SET tsvector = setweight(to_tsvector('english', COALESCE(title, '')), 'D') || setweight(to_tsvector('english', COALESCE(body, '')), 'D');",
+            "UPDATE \"testapp_tsvectormodel\" SET tsvector = setweight(to_tsvector('english', COALESCE(title, '')), 'D') || setweight(to_tsvector('english', COALESCE(body, '')), 'D');",
             stdout.getvalue())
 
     @override_system_checks([])
@@ -86,7 +101,7 @@ class CreateOperationTestSQL(TestCase):
         call_command('sqlmigrate', 'testapp', '0003', stdout=stdout)
         self.assertIn(
             ('CREATE INDEX testapp_tsvectormodel_tsvector ON '
-             'testapp_tsvectormodel USING gin(tsvector);'),
+             '"testapp_tsvectormodel" USING gin(tsvector);'),
             stdout.getvalue())
 
     @override_system_checks([])
@@ -98,11 +113,14 @@ class CreateOperationTestSQL(TestCase):
         """
 CREATE FUNCTION testapp_tsvectormodel_tsvector_update() RETURNS TRIGGER AS $$
 BEGIN
+    IF current_setting('pg_fts.testapp_tsvectormodel_tsvector', true) = 'on' THEN
+        RETURN NEW;
+    END IF;
     IF TG_OP = 'INSERT' THEN
         new.tsvector = setweight(to_tsvector('english', COALESCE(NEW.title, '')), 'D') || setweight(to_tsvector('english', COALESCE(NEW.body, '')), 'D');
     END IF;
     IF TG_OP = 'UPDATE' THEN
-        IF NEW.title <> OLD.title OR NEW.body <> OLD.body THEN
+        IF NEW.title IS DISTINCT FROM OLD.title OR NEW.body IS DISTINCT FROM OLD.body THEN
             new.tsvector = setweight(to_tsvector('english', COALESCE(NEW.title, '')), 'D') || setweight(to_tsvector('english', COALESCE(NEW.body, '')), 'D');
         ELSE
             new.tsvector = old.tsvector;
@@ -111,7 +129,9 @@ BEGIN
 RETURN NEW;
 END;
 $$ LANGUAGE 'plpgsql';
-CREATE TRIGGER testapp_tsvectormodel_tsvector_update BEFORE INSERT OR UPDATE ON testapp_tsvectormodel
+CREATE TRIGGER testapp_tsvectormodel_tsvector_insert BEFORE INSERT ON "testapp_tsvectormodel"
+FOR EACH ROW EXECUTE PROCEDURE testapp_tsvectormodel_tsvector_update();
+CREATE TRIGGER testapp_tsvectormodel_tsvector_update BEFORE UPDATE OF title, body, tsvector ON "testapp_tsvectormodel"
 FOR EACH ROW EXECUTE PROCEDURE testapp_tsvectormodel_tsvector_update();
 """.split()),
             ''.join(stdout.getvalue().split())
@@ -125,7 +145,7 @@ FOR EACH ROW EXECUTE PROCEDURE testapp_tsvectormodel_tsvector_update();
         call_command('sqlmigrate', 'testapp', '0002', stdout=stdout)
         self.assertIn('"tsvector" tsvector null', stdout.getvalue().lower())
         self.assertIn(
-            "UPDATE testapp_tsvectormodel SET tsvector = setweight(to_tsvector(dictionary::regconfig, COALESCE(title, '')), 'D') || setweight(to_tsvector(dictionary::regconfig, COALESCE(body, '')), 'D');",
+            "UPDATE \"testapp_tsvectormodel\" SET tsvector = setweight(to_tsvector(dictionary::regconfig, COALESCE(title, '')), 'D') || setweight(to_tsvector(dictionary::regconfig, COALESCE(body, '')), 'D');",
             stdout.getvalue())
 
     @override_system_checks([])
@@ -136,11 +156,11 @@ FOR EACH ROW EXECUTE PROCEDURE testapp_tsvectormodel_tsvector_update();
         call_command('sqlmigrate', 'testapp', '0003', stdout=stdout)
         self.assertIn(
             ('CREATE INDEX testapp_tsvectormodel_tsvector ON '
-             'testapp_tsvectormodel USING gin(tsvector);'),
+             '"testapp_tsvectormodel" USING gin(tsvector);'),
             stdout.getvalue())
         self.assertIn(
             ('CREATE INDEX testapp_tsvectormodel_tsvector ON '
-             'testapp_tsvectormodel USING gin(tsvector);'),
+             '"testapp_tsvectormodel" USING gin(tsvector);'),
             stdout.getvalue())
 
     @override_system_checks([])
@@ -152,11 +172,14 @@ FOR EACH ROW EXECUTE PROCEDURE testapp_tsvectormodel_tsvector_update();
             """
 CREATE FUNCTION testapp_tsvectormodel_tsvector_update() RETURNS TRIGGER AS $$
 BEGIN
+    IF current_setting('pg_fts.testapp_tsvectormodel_tsvector', true) = 'on' THEN
+        RETURN NEW;
+    END IF;
     IF TG_OP = 'INSERT' THEN
         new.tsvector = setweight(to_tsvector(NEW.dictionary::regconfig, COALESCE(NEW.title, '')), 'D') || setweight(to_tsvector(NEW.dictionary::regconfig, COALESCE(NEW.body, '')), 'D');
     END IF;
     IF TG_OP = 'UPDATE' THEN
-        IF NEW.dictionary <> OLD.dictionary OR NEW.title <> OLD.title OR NEW.body <> OLD.body THEN
+        IF NEW.dictionary IS DISTINCT FROM OLD.dictionary OR NEW.title IS DISTINCT FROM OLD.title OR NEW.body IS DISTINCT FROM OLD.body THEN
             new.tsvector = setweight(to_tsvector(NEW.dictionary::regconfig, COALESCE(NEW.title, '')), 'D') || setweight(to_tsvector(NEW.dictionary::regconfig, COALESCE(NEW.body, '')), 'D');
         ELSE
             new.tsvector = old.tsvector;
@@ -165,7 +188,9 @@ BEGIN
 RETURN NEW;
 END;
 $$ LANGUAGE 'plpgsql';
-CREATE TRIGGER testapp_tsvectormodel_tsvector_update BEFORE INSERT OR UPDATE ON testapp_tsvectormodel
+CREATE TRIGGER testapp_tsvectormodel_tsvector_insert BEFORE INSERT ON "testapp_tsvectormodel"
+FOR EACH ROW EXECUTE PROCEDURE testapp_tsvectormodel_tsvector_update();
+CREATE TRIGGER testapp_tsvectormodel_tsvector_update BEFORE UPDATE OF dictionary, title, body, tsvector ON "testapp_tsvectormodel"
 FOR EACH ROW EXECUTE PROCEDURE testapp_tsvectormodel_tsvector_update();
 """.split()),
             ''.join(stdout.getvalue().split())
@@ -237,3 +262,359 @@ class TransactionsMigrationsTest(FTSTestBase):
         self.assertIndexNotExists('tsvector',
                                   'testapp_tsvectormodel')
         call_command('migrate', 'testapp', '0001', stdout=stdout)
+
+
+class UpdateVectorBatchTest(FTSTestBase):
+
+    def setUp(self):
+        for i in range(7):
+            TSQueryModel.objects.create(title='para mesmo %s' % i,
+                                        body='malucos crazy')
+        # with the trigger installed, the vectors as before the migration
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(PgFtsSQL().skip_trigger(
+                TSQueryModel, TSQueryModel._meta.get_field('tsvector')),
+                ['on'])
+            cursor.execute('UPDATE testapp_tsquerymodel SET tsvector = NULL')
+
+    def tearDown(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TABLE IF EXISTS pg_fts_progress')
+
+    def _migrate(self, operation):
+        state = ProjectState.from_apps(apps)
+        with connection.schema_editor() as schema_editor:
+            operation.database_forwards('testapp', schema_editor, state,
+                                        state)
+
+    def _null_vectors(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT id FROM testapp_tsquerymodel '
+                           'WHERE tsvector IS NULL ORDER BY id')
+            return [r[0] for r in cursor.fetchall()]
+
+    def test_batches(self):
+        self.assertEqual(len(self._null_vectors()), 7)
+        self._migrate(UpdateVectorOperation('TSQueryModel', 'tsvector',
+                                            batch_size=3))
+        self.assertEqual(self._null_vectors(), [])
+        self.assertTriggerExists('testapp_tsquerymodel_tsvector_update')
+        self.assertTableNotExists('pg_fts_progress')
+
+    def test_single_update(self):
+        self._migrate(UpdateVectorOperation('TSQueryModel', 'tsvector'))
+        self.assertEqual(self._null_vectors(), [])
+        # the trigger isn't skipped after the update
+        TSQueryModel.objects.update(title='porto')
+        self.assertEqual(TSQueryModel.objects.filter(
+            tsvector__search='porto').count(), 7)
+
+    def test_resume(self):
+        pks = self._null_vectors()
+        with connection.cursor() as cursor:
+            cursor.execute(PgFtsSQL.sql_create_progress)
+            cursor.execute(PgFtsSQL.sql_insert_progress,
+                           [pks[2], 'testapp_tsquerymodel.tsvector'])
+            cursor.execute(PgFtsSQL.sql_insert_progress,
+                           [1, 'testapp_other.tsvector'])
+        self._migrate(UpdateVectorOperation('TSQueryModel', 'tsvector',
+                                            batch_size=2))
+        self.assertEqual(self._null_vectors(), pks[:3])
+        # other update in progress
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT name FROM pg_fts_progress')
+            self.assertEqual(cursor.fetchall(), [('testapp_other.tsvector', )])
+
+    def test_migration_transaction(self):
+        state = ProjectState.from_apps(apps)
+        with self.assertRaises(TransactionManagementError):
+            with connection.schema_editor() as schema_editor:
+                schema_editor.execute('SELECT 1')
+                UpdateVectorOperation(
+                    'TSQueryModel', 'tsvector', batch_size=3
+                ).database_forwards('testapp', schema_editor, state, state)
+        self.assertEqual(len(self._null_vectors()), 7)
+
+    def test_batch_size(self):
+        with self.assertRaises(AssertionError):
+            UpdateVectorOperation('TSQueryModel', 'tsvector', batch_size=0)
+
+
+class CreateIndexConcurrentlyTest(FTSTestBase):
+
+    index = 'testapp_tsquerymodel_tsvector'
+
+    def _migrate(self, operation, backwards=False):
+        state = ProjectState.from_apps(apps)
+        with connection.schema_editor() as schema_editor:
+            if backwards:
+                operation.database_backwards('testapp', schema_editor, state,
+                                             state)
+            else:
+                operation.database_forwards('testapp', schema_editor, state,
+                                            state)
+
+    def _index_valid(self):
+        with connection.cursor() as cursor:
+            return self.introspection.get_index_valid(cursor, self.index)
+
+    def _reloptions(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT reloptions FROM pg_class WHERE relname = %s',
+                           [self.index])
+            return cursor.fetchone()[0]
+
+    def test_sql(self):
+        operation = CreateFTSIndexOperation(
+            'TSQueryModel', 'tsvector', 'gin', concurrently=True,
+            fastupdate=False, gin_pending_list_limit=512,
+            maintenance_work_mem='256MB')
+        self.assertFalse(operation.atomic)
+        self.assertTrue(CreateFTSIndexOperation(
+            'TSQueryModel', 'tsvector', 'gin').atomic)
+        state = ProjectState.from_apps(apps)
+        with connection.schema_editor(collect_sql=True) as schema_editor:
+            operation.database_forwards('testapp', schema_editor, state,
+                                        state)
+        self.assertEqual(schema_editor.collected_sql, [
+            "SET maintenance_work_mem = '256MB';",
+            PgFtsSQL.sql_delete_invalid_index.format(
+                index_name=self.index) + ';',
+            'CREATE INDEX CONCURRENTLY %s ON "testapp_tsquerymodel" USING '
+            'gin(tsvector) WITH (fastupdate = off, '
+            'gin_pending_list_limit = 512);' % self.index,
+            'RESET maintenance_work_mem;',
+        ])
+
+    def test_sql_replayed(self):
+        operation = CreateFTSIndexOperation(
+            'TSQueryModel', 'tsvector', 'gin', concurrently=True)
+        state = ProjectState.from_apps(apps)
+        with connection.schema_editor(collect_sql=True) as schema_editor:
+            operation.database_forwards('testapp', schema_editor, state,
+                                        state)
+        with connection.cursor() as cursor:
+            # the valid index is kept
+            cursor.execute(schema_editor.collected_sql[0])
+            self.assertTrue(self._index_valid())
+            cursor.execute('UPDATE pg_index SET indisvalid = false '
+                           'WHERE indexrelid = %s::regclass', [self.index])
+            cursor.execute(schema_editor.collected_sql[0])
+            self.assertIsNone(self._index_valid())
+            cursor.execute(schema_editor.collected_sql[1])
+            self.assertTrue(self._index_valid())
+
+    def test_migration_transaction(self):
+        state = ProjectState.from_apps(apps)
+        with self.assertRaises(TransactionManagementError):
+            with connection.schema_editor() as schema_editor:
+                schema_editor.execute('SELECT 1')
+                DeleteFTSIndexOperation(
+                    'TSQueryModel', 'tsvector', 'gin', concurrently=True
+                ).database_forwards('testapp', schema_editor, state, state)
+        self.assertTrue(self._index_valid())
+
+    def test_invalid_options(self):
+        with self.assertRaises(AssertionError):
+            CreateFTSIndexOperation('TSQueryModel', 'tsvector', 'gin',
+                                    siglen=64)
+        with self.assertRaises(AssertionError):
+            CreateFTSIndexOperation('TSQueryModel', 'tsvector', 'gist',
+                                    fastupdate=False)
+
+    def test_concurrently(self):
+        self.assertTrue(self._index_valid())
+        operation = DeleteFTSIndexOperation(
+            'TSQueryModel', 'tsvector', 'gin', concurrently=True,
+            fastupdate=False, maintenance_work_mem='64MB',
+            max_parallel_maintenance_workers=2)
+        self._migrate(operation)
+        self.assertIsNone(self._index_valid())
+        self._migrate(operation, backwards=True)
+        self.assertTrue(self._index_valid())
+        self.assertEqual(self._reloptions(), ['fastupdate=off'])
+
+    def test_invalid_index_rebuilt(self):
+        with connection.cursor() as cursor:
+            cursor.execute('UPDATE pg_index SET indisvalid = false '
+                           'WHERE indexrelid = %s::regclass', [self.index])
+        self.assertFalse(self._index_valid())
+        self._migrate(CreateFTSIndexOperation(
+            'TSQueryModel', 'tsvector', 'gist', concurrently=True,
+            siglen=256))
+        self.assertTrue(self._index_valid())
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_get_indexdef(%s::regclass)',
+                           [self.index])
+            self.assertIn("siglen='256'", cursor.fetchone()[0])
+        # back to the gin index of testapp migrations
+        self._migrate(DeleteFTSIndexOperation(
+            'TSQueryModel', 'tsvector', 'gist', concurrently=True))
+        self._migrate(CreateFTSIndexOperation(
+            'TSQueryModel', 'tsvector', 'gin', concurrently=True))
+
+
+class StatementTriggerTest(FTSTestBase):
+
+    def setUp(self):
+        self.models = []
+
+    def _migrate(self, model='TSQueryModel'):
+        state = ProjectState.from_apps(apps)
+        with connection.schema_editor() as schema_editor:
+            DeleteFTSTriggerOperation(model, 'tsvector').database_forwards(
+                'testapp', schema_editor, state, state)
+            CreateFTSTriggerOperation(
+                model, 'tsvector', level='statement').database_forwards(
+                'testapp', schema_editor, state, state)
+        self.models.append(model)
+
+    def tearDown(self):
+        state = ProjectState.from_apps(apps)
+        with connection.schema_editor() as schema_editor:
+            for model in self.models:
+                DeleteFTSTriggerOperation(
+                    model, 'tsvector', level='statement').database_forwards(
+                    'testapp', schema_editor, state, state)
+                CreateFTSTriggerOperation(model, 'tsvector').database_forwards(
+                    'testapp', schema_editor, state, state)
+
+    def test_sql(self):
+        sql = PgFtsSQL().create_fts_trigger(
+            TSQueryModel, TSQueryModel._meta.get_field('tsvector'),
+            'statement')
+        self.assertIn('REFERENCING NEW TABLE AS new_rows\n'
+                      'FOR EACH STATEMENT', sql)
+        self.assertIn(
+            "new_rows.title IS DISTINCT FROM old_rows.title OR "
+            "new_rows.body IS DISTINCT FROM old_rows.body", sql)
+        self.assertIn(
+            "setweight(to_tsvector('english', COALESCE(new_rows.title, '')), "
+            "'D')", sql)
+        with self.assertRaises(AssertionError):
+            CreateFTSTriggerOperation('TSQueryModel', 'tsvector',
+                                      level='invalid')
+
+    def test_bulk(self):
+        self._migrate()
+        self.assertTriggerExists('testapp_tsquerymodel_tsvector_insert')
+        TSQueryModel.objects.bulk_create([
+            TSQueryModel(title='para mesmo %s' % i, body='malucos crazy')
+            for i in range(20)])
+        TSQueryModel.objects.create(title='lisbon', body='porto')
+        self.assertEqual(TSQueryModel.objects.filter(
+            tsvector__search='malucos crazy').count(), 20)
+        TSQueryModel.objects.filter(title__startswith='para').update(
+            body='coimbra')
+        TSQueryModel.objects.update(sometext='unchanged')
+        self.assertEqual(TSQueryModel.objects.filter(
+            tsvector__search='malucos').count(), 0)
+        self.assertEqual(TSQueryModel.objects.filter(
+            tsvector__search='coimbra').count(), 20)
+        self.assertEqual(TSQueryModel.objects.filter(
+            tsvector__search='porto').count(), 1)
+
+    def test_multidict(self):
+        self._migrate('TSMultidicModel')
+        obj = TSMultidicModel.objects.create(
+            title='para os mesmo malucos', body='como eu',
+            dictionary='english')
+        self.assertEqual(TSMultidicModel.objects.filter(
+            tsvector__portuguese__search='maluco').count(), 0)
+        obj.dictionary = 'portuguese'
+        obj.save()
+        self.assertEqual(TSMultidicModel.objects.filter(
+            tsvector__portuguese__search='maluco').count(), 1)
+
+
+class UpdateOfTriggerTest(FTSTestBase):
+
+    def test_unrelated_update(self):
+        obj = TSQueryModel.objects.create(title='para mesmo', body='malucos')
+        with connection.cursor() as cursor:
+            # the trigger isn't fired, the vector isn't changed
+            cursor.execute('ALTER TABLE testapp_tsquerymodel '
+                           'DISABLE TRIGGER testapp_tsquerymodel_tsvector_update')
+            cursor.execute("UPDATE testapp_tsquerymodel SET tsvector = "
+                           "to_tsvector('english', 'lisbon')")
+            cursor.execute('ALTER TABLE testapp_tsquerymodel '
+                           'ENABLE TRIGGER testapp_tsquerymodel_tsvector_update')
+        TSQueryModel.objects.update(sometext='counter')
+        self.assertEqual(TSQueryModel.objects.filter(
+            tsvector__search='lisbon').count(), 1)
+        # the fields changed, the vector is updated
+        TSQueryModel.objects.update(body='porto')
+        self.assertEqual(TSQueryModel.objects.filter(
+            tsvector__search='porto').count(), 1)
+        # without changes, the vector is kept
+        obj = TSQueryModel.objects.get(pk=obj.pk)
+        obj.tsvector = ''
+        obj.save()
+        self.assertEqual(TSQueryModel.objects.filter(
+            tsvector__search='porto').count(), 1)
+
+    def test_null_field(self):
+        TSQueryModel.objects.create(title='para mesmo', body='malucos')
+        with connection.cursor() as cursor:
+            cursor.execute('ALTER TABLE testapp_tsquerymodel '
+                           'ALTER COLUMN body DROP NOT NULL')
+            cursor.execute('UPDATE testapp_tsquerymodel SET body = NULL')
+            self.assertEqual(TSQueryModel.objects.filter(
+                tsvector__search='malucos').count(), 0)
+            cursor.execute("UPDATE testapp_tsquerymodel SET body = 'porto'")
+            self.assertEqual(TSQueryModel.objects.filter(
+                tsvector__search='porto').count(), 1)
+            cursor.execute("DELETE FROM testapp_tsquerymodel")
+            cursor.execute('ALTER TABLE testapp_tsquerymodel '
+                           'ALTER COLUMN body SET NOT NULL')
+
+
+class PerDictionaryIndexTest(FTSTestBase):
+
+    def _migrate(self, operation, backwards=False):
+        state = ProjectState.from_apps(apps)
+        with connection.schema_editor() as schema_editor:
+            if backwards:
+                operation.database_backwards('testapp', schema_editor, state,
+                                             state)
+            else:
+                operation.database_forwards('testapp', schema_editor, state,
+                                            state)
+
+    def test_sql(self):
+        operation = CreateFTSIndexOperation(
+            'TSMultidicModel', 'tsvector', 'gin', per_dictionary=True)
+        state = ProjectState.from_apps(apps)
+        with connection.schema_editor(collect_sql=True) as schema_editor:
+            operation.database_forwards('testapp', schema_editor, state,
+                                        state)
+        self.assertEqual(schema_editor.collected_sql, [
+            'CREATE INDEX testapp_tsmultidicmodel_tsvector_english ON '
+            '"testapp_tsmultidicmodel" USING gin(tsvector) '
+            "WHERE dictionary = 'english';",
+            'CREATE INDEX testapp_tsmultidicmodel_tsvector_portuguese ON '
+            '"testapp_tsmultidicmodel" USING gin(tsvector) '
+            "WHERE dictionary = 'portuguese';",
+        ])
+
+    def test_single_dictionary(self):
+        with self.assertRaises(AttributeError):
+            self._migrate(CreateFTSIndexOperation(
+                'TSQueryModel', 'tsvector', 'gin', per_dictionary=True))
+
+    def _index_valid(self, dictionary):
+        with connection.cursor() as cursor:
+            return self.introspection.get_index_valid(
+                cursor, 'testapp_tsmultidicmodel_tsvector_%s' % dictionary)
+
+    def test_per_dictionary(self):
+        for concurrently in (False, True):
+            operation = CreateFTSIndexOperation(
+                'TSMultidicModel', 'tsvector', 'gin', per_dictionary=True,
+                concurrently=concurrently)
+            self._migrate(operation)
+            self.assertTrue(self._index_valid('english'))
+            self.assertTrue(self._index_valid('portuguese'))
+            self._migrate(operation, backwards=True)
+            self.assertIsNone(self._index_valid('english'))
+            self.assertIsNone(self._index_valid('portuguese'))
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.core.paginator import InvalidPage
+from django.db import connection
+from django.db.models.expressions import RawSQL
+from django.db.models.fields import FloatField
+from testapp.models import TSQueryModel, TSMultidicModel
+from pg_fts.ranks import (FTSRank, FTSRankCd, FTSRankDictionay,
+                          FTSRankCdDictionary)
+from pg_fts.paginator import FTSCursorPaginator, FTSCount, FTSPaginator
+
+__all__ = ('FTSCursorPaginatorTestCase', 'FTSPaginatorTestCase')
+
+
+class FTSCursorPaginatorTestCase(TestCase):
+
+    def setUp(self):
+        # same title and body, all the ranks tie
+        for i in range(5):
+            TSQueryModel.objects.create(
+                title='para for os the mesmo same malucos crazy',
+                body='malucos crazy como like eu me'
+            )
+        TSQueryModel.objects.create(
+            title='para mesmo para mesmo',
+            body='para mesmo'
+        )
+        for dictionary in ('english', 'portuguese', 'english'):
+            TSMultidicModel.objects.create(
+                title='para for os the mesmo same malucos crazy',
+                body='malucos crazy como like eu me',
+                dictionary=dictionary
+            )
+
+    def _get_all(self, paginator):
+        rows = []
+        page = paginator.page()
+        rows.extend(page)
+        while page.has_next():
+            page = paginator.page(page.next_cursor)
+            rows.extend(page)
+        return rows
+
+    def test_pages(self):
+        for rank in (FTSRank, FTSRankCd):
+            qs = TSQueryModel.objects.annotate(
+                rank=rank(tsvector__search='para mesmo'))
+            paginator = FTSCursorPaginator(qs, 2)
+            page = paginator.page()
+            self.assertEqual(len(page), 2)
+            self.assertTrue(page.has_next())
+            self.assertEqual(page[0].title, 'para mesmo para mesmo')
+
+            rows = self._get_all(paginator)
+            self.assertEqual(len(rows), 6)
+            self.assertEqual(len(set(r.pk for r in rows)), 6)
+            self.assertEqual(
+                [r.pk for r in rows],
+                [r.pk for r in qs.order_by('-rank', '-pk')])
+
+    def test_seek_sql(self):
+        qs = TSQueryModel.objects.annotate(
+            rank=FTSRank(tsvector__search='para mesmo'))
+        paginator = FTSCursorPaginator(qs, 2)
+        page = paginator.page()
+        sql = str(paginator.get_queryset(page.next_cursor).query)
+        self.assertIn(
+            '''(ts_rank("testapp_tsquerymodel"."tsvector", "pg_fts_tsquery"."pg_fts_tsquery"), "testapp_tsquerymodel"."id") < (CAST(''',
+            sql)
+        self.assertIn('ORDER BY "rank" DESC, "testapp_tsquerymodel"."id" DESC',
+                      sql)
+        self.assertNotIn('OFFSET', sql)
+
+    def test_ascending(self):
+        qs = TSQueryModel.objects.annotate(
+            rank=FTSRank(tsvector__search='para mesmo'))
+        rows = self._get_all(FTSCursorPaginator(qs, 4, descending=False))
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(rows[-1].title, 'para mesmo para mesmo')
+
+    def test_dictionary(self):
+        for rank in (FTSRankDictionay, FTSRankCdDictionary):
+            qs = TSMultidicModel.objects.filter(dictionary='english').annotate(
+                rank=rank(tsvector__english__search='malucos crazy'))
+            rows = self._get_all(FTSCursorPaginator(qs, 1))
+            self.assertEqual(len(rows), 2)
+            self.assertEqual(len(set(r.pk for r in rows)), 2)
+
+    def test_values(self):
+        qs = TSQueryModel.objects.annotate(
+            rank=FTSRank(tsvector__search='para mesmo')).values('id', 'rank')
+        rows = self._get_all(FTSCursorPaginator(qs, 4))
+        self.assertEqual(len(rows), 6)
+
+    def test_near_ties(self):
+        # distinct ranks printed as 1 with the 6 digits of PostgreSQL < 12
+        qs = TSQueryModel.objects.annotate(rank=RawSQL(
+            'CAST(1 + %s * "testapp_tsquerymodel"."id" AS real)', (2.4e-7, ),
+            output_field=FloatField()))
+        with connection.cursor() as cursor:
+            cursor.execute('SET extra_float_digits = 0')
+        try:
+            for per_page in (1, 2, 4):
+                rows = self._get_all(FTSCursorPaginator(qs, per_page))
+                self.assertEqual(
+                    [r.pk for r in rows],
+                    [r.pk for r in qs.order_by('-rank', '-pk')])
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute('RESET extra_float_digits')
+
+    def test_invalid_cursor(self):
+        qs = TSQueryModel.objects.annotate(
+            rank=FTSRank(tsvector__search='para mesmo'))
+        with self.assertRaises(InvalidPage):
+            FTSCursorPaginator(qs, 2).page('invalid')
+        with self.assertRaises(InvalidPage):
+            FTSCursorPaginator(qs, 2, rank='norank').page(
+                FTSCursorPaginator(qs, 2).page().next_cursor)
+
+
+class FTSPaginatorTestCase(TestCase):
+
+    def setUp(self):
+        for i in range(10):
+            TSQueryModel.objects.create(
+                title='para for os the mesmo same malucos crazy',
+                body='malucos crazy como like eu me'
+            )
+
+    def test_count_modes(self):
+        qs = TSQueryModel.objects.filter(tsvector__search='para mesmo')
+        counter = FTSCount()
+        self.assertEqual(counter.exact(qs), 10)
+        self.assertEqual(counter.bounded(qs, 3), 4)
+        self.assertEqual(counter.bounded(qs, 20), 10)
+        self.assertIsInstance(counter.estimate(qs), int)
+
+    def test_paginator_auto(self):
+        qs = TSQueryModel.objects.filter(tsvector__search='para mesmo')
+        paginator = FTSPaginator(qs, 2, count_threshold=20)
+        self.assertEqual(paginator.count, 10)
+        self.assertFalse(paginator.count_estimated)
+        self.assertEqual(paginator.num_pages, 5)
+
+        paginator = FTSPaginator(qs, 2, count_threshold=3)
+        self.assertGreaterEqual(paginator.count, 4)
+        self.assertTrue(paginator.count_estimated)
+        self.assertEqual(len(paginator.page(1)), 2)
+
+    def test_paginator_modes(self):
+        qs = TSQueryModel.objects.filter(tsvector__search='para mesmo')
+        paginator = FTSPaginator(qs, 2, count_mode='bounded',
+                                 count_threshold=3)
+        self.assertEqual(paginator.count, 4)
+        self.assertTrue(paginator.count_estimated)
+
+        paginator = FTSPaginator(qs, 2, count_mode='exact')
+        self.assertEqual(paginator.count, 10)
+        self.assertFalse(paginator.count_estimated)
+
+        paginator = FTSPaginator(qs, 2, count_mode='estimate')
+        self.assertIsInstance(paginator.count, int)
+        self.assertTrue(paginator.count_estimated)
+
+        with self.assertRaises(AssertionError):
+            FTSPaginator(qs, 2, count_mode='nomode')
+
+    def test_bounded_ranked(self):
+        qs = TSQueryModel.objects.annotate(
+            rank=FTSRank(tsvector__search='para mesmo')).order_by('-rank')
+        counter = FTSCount()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(counter.bounded(qs, 3), 4)
+            self.assertEqual(counter.exact(qs), 10)
+            self.assertIsInstance(counter.estimate(qs), int)
+        # the rows aren't ranked, sorted or grouped
+        for query in queries:
+            self.assertNotIn('GROUP BY', query['sql'])
+            self.assertNotIn('ts_rank', query['sql'])
+            self.assertNotIn('ORDER BY', query['sql'])
+        self.assertIn('LIMIT 4', queries[0]['sql'])
+        paginator = FTSPaginator(qs, 2, count_threshold=3)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertGreaterEqual(paginator.count, 4)
+        self.assertEqual(len(queries), 2)
+        for query in queries:
+            self.assertNotIn('ts_rank', query['sql'])
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+from django.test import TestCase
+from pg_fts.profile import FTSQuerySet, fts_profile, parse_profile
+from pg_fts.ranks import FTSRank, FTSHeadline
+from testapp.models import TSQueryModel, TSMultidicModel
+
+__all__ = ('ProfileTestCase', )
+
+
+class ProfileTestCase(TestCase):
+
+    def setUp(self):
+        for i in range(20):
+            TSQueryModel.objects.create(title='hello world %d' % i,
+                                        body='crazy world %d' % (i % 5))
+
+    def test_profile(self):
+        profile = fts_profile(TSQueryModel.objects.annotate(
+            rank=FTSRank(tsvector__search='crazy')
+        ).order_by('-rank')[:5])
+        self.assertEqual(profile['rows'], 5)
+        self.assertGreater(profile['execution_ms'], 0)
+        self.assertEqual(profile['sort']['nodes'], ['Sort'])
+        self.assertIsNotNone(profile['sort']['method'])
+        # the rank is computed by the scan
+        self.assertEqual(len(profile['functions']['in_scan']), 1)
+        self.assertEqual(profile['heap']['rows'], 20)
+        self.assertGreater(profile['buffers']['shared_hit'] +
+                           profile['buffers']['shared_read'], 0)
+        for stage in ('index_scan', 'heap', 'functions', 'sort', 'other'):
+            self.assertGreaterEqual(profile[stage]['ms'], 0)
+
+    def test_headline(self):
+        profile = fts_profile(FTSHeadline(
+            'body', tsvector__search='crazy').apply(
+                TSQueryModel.objects.annotate(
+                    rank=FTSRank(tsvector__search='crazy')
+                ).order_by('-rank')[:5]))
+        self.assertEqual(profile['rows'], 5)
+        # the headline of the rows returned
+        self.assertEqual(profile['functions']['nodes'], ['Subquery Scan'])
+        self.assertEqual(profile['functions']['rows'], 5)
+        self.assertEqual(len(profile['functions']['in_scan']), 1)
+
+    def test_empty(self):
+        self.assertIsNone(fts_profile(TSQueryModel.objects.none()))
+        self.assertEqual(fts_profile(TSMultidicModel.objects.filter(
+            tsvector__english__search='crazy'))['rows'], 0)
+
+    def test_queryset(self):
+        profile = FTSQuerySet(TSQueryModel).filter(
+            tsvector__search='crazy').fts_profile()
+        self.assertEqual(profile['rows'], 20)
+        self.assertIsNone(FTSQuerySet(TSQueryModel).none().fts_profile())
+
+    def test_parse(self):
+        profile = parse_profile([{
+            'Plan': {
+                'Node Type': 'Limit',
+                'Actual Total Time': 10.0,
+                'Actual Rows': 20,
+                'Actual Loops': 1,
+                'Shared Hit Blocks': 100,
+                'Shared Read Blocks': 50,
+                'Output': ['(ts_rank(fts, q))'],
+                'Plans': [{
+                    'Node Type': 'Sort',
+                    'Sort Method': 'top-N heapsort',
+                    'Sort Space Used': 30,
+                    'Actual Total Time': 9.5,
+                    'Actual Rows': 20,
+                    'Actual Loops': 1,
+                    'Output': ['(ts_rank(fts, q))'],
+                    'Plans': [{
+                        'Node Type': 'Bitmap Heap Scan',
+                        'Relation Name': 'article',
+                        'Actual Total Time': 7.0,
+                        'Actual Rows': 500,
+                        'Actual Loops': 1,
+                        'Rows Removed by Index Recheck': 40,
+                        'Lossy Heap Blocks': 3,
+                        'Exact Heap Blocks': 10,
+                        'Output': ['ts_rank(fts, q)'],
+                        'Plans': [{
+                            'Node Type': 'Bitmap Index Scan',
+                            'Index Name': 'article_fts',
+                            'Actual Total Time': 2.0,
+                            'Actual Rows': 540,
+                            'Actual Loops': 1,
+                        }],
+                    }],
+                }],
+            },
+            'Planning Time': 0.2,
+            'Execution Time': 10.1,
+        }])
+        self.assertEqual(profile['index_scan']['nodes'],
+                         ['Bitmap Index Scan on article_fts'])
+        self.assertAlmostEqual(profile['index_scan']['ms'], 2.0)
+        self.assertAlmostEqual(profile['heap']['ms'], 5.0)
+        self.assertEqual(profile['heap']['rows_removed_by_recheck'], 40)
+        self.assertEqual(profile['heap']['lossy_blocks'], 3)
+        self.assertAlmostEqual(profile['sort']['ms'], 2.5)
+        self.assertEqual(profile['sort']['space_kb'], 30)
+        self.assertAlmostEqual(profile['other']['ms'], 0.5)
+        self.assertEqual(profile['functions']['in_scan'],
+                         ['Bitmap Heap Scan on article'])
+        self.assertEqual(profile['buffers']['shared_read'], 50)
+        self.assertEqual(profile['rows'], 20)
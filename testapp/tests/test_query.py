@@ -188,6 +188,21 @@ salvão save o the planeta planet"""
             )
             ), 1)
 
+    def test_dictionary_transform_predicate(self):
+        qs = TSMultidicModel.objects.filter(
+            tsvector__english__search='malucos')
+        self.assertIn(
+            '("testapp_tsmultidicmodel"."tsvector" @@ to_tsquery(\'english\', '
+            'malucos) AND "testapp_tsmultidicmodel"."dictionary" = english)',
+            str(qs.query))
+        # without the predicate the portuguese row would also match
+        self.assertEqual(qs.get().dictionary, 'english')
+        self.assertEqual(TSMultidicModel.objects.exclude(
+            tsvector__english__search='malucos').get().dictionary,
+            'portuguese')
+        self.assertEqual(Related.objects.filter(
+            multiple__tsvector__portuguese__search='maluco').count(), 1)
+
     def test_5_multidict_make_trigger_function_protect_fts_field_against_django_updates(self):
         q = TSMultidicModel.objects.all()[0]
         old_tsvector = q.tsvector
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import logging
+from django.db import connection, transaction
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from pg_fts.metrics import registry
+from pg_fts.ranks import FTSRank
+from pg_fts.slowlog import SlowSearchLog
+from testapp.models import TSQueryModel
+
+__all__ = ('SlowSearchLogTestCase', )
+
+
+class ListHandler(logging.Handler):
+
+    def __init__(self):
+        super(ListHandler, self).__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class SlowSearchLogTestCase(TestCase):
+
+    def setUp(self):
+        TSQueryModel.objects.create(title='hello crazy world',
+                                    body='the crazy same')
+        self.log = SlowSearchLog(threshold=0, timeout=10000)
+        self.log.enable()
+        self.handler = ListHandler()
+        logging.getLogger('pg_fts').addHandler(self.handler)
+
+    def tearDown(self):
+        self.log.disable()
+        self.log.close()
+        logging.getLogger('pg_fts').removeHandler(self.handler)
+
+    def test_enable(self):
+        self.assertTrue(registry.enabled)
+        self.assertFalse(registry.recording)
+        self.log.disable()
+        self.assertFalse(registry.enabled)
+        list(TSQueryModel.objects.filter(tsvector__search='hello'))
+        self.log.flush()
+        self.assertEqual(len(self.log.records), 0)
+
+    def test_record(self):
+        list(TSQueryModel.objects.annotate(
+            rank=FTSRank(tsvector__search='crazy')).order_by('-rank'))
+        self.log.flush()
+        self.assertEqual(len(self.log.records), 1)
+        record = self.log.records[0]
+        self.assertEqual([r.record for r in self.handler.records], [record])
+        self.assertNotIn('error', record)
+        self.assertEqual(record['dictionaries'], ['english'])
+        self.assertEqual(record['labels'], [{
+            'model': 'testapp.TSQueryModel', 'field': 'tsvector',
+            'lookup': 'search', 'dictionary': 'english', 'rank': 'FTSRank'}])
+        self.assertEqual(record['params'], ['crazy'])
+        self.assertIn('Sort', record['nodes'])
+        self.assertIsNotNone(record['execution_ms'])
+        self.assertEqual(record['seq_scans'] + record['index_scans'] != [],
+                         True)
+        for key in ('shared_hit', 'shared_read', 'rows_removed_by_recheck',
+                    'exact_blocks', 'lossy_blocks'):
+            self.assertGreaterEqual(record[key], 0)
+
+    def test_threshold_sample(self):
+        self.log.configure(threshold=10 ** 6)
+        list(TSQueryModel.objects.filter(tsvector__search='hello'))
+        self.log.configure(threshold=0, sample=0)
+        list(TSQueryModel.objects.filter(tsvector__search='hello'))
+        self.log.flush()
+        self.assertEqual(len(self.log.records), 0)
+
+    def test_size(self):
+        self.log.configure(threshold=0, size=2)
+        for i in range(3):
+            list(TSQueryModel.objects.filter(tsvector__search='hello'))
+        self.log.flush()
+        self.assertEqual(len(self.log.records), 2)
+        # one connection for all the EXPLAIN
+        self.assertEqual(len(self.log._connections), 1)
+
+    def test_only_select(self):
+        TSQueryModel.objects.filter(tsvector__search='hello').update(
+            sometext='updated')
+        self.log.flush()
+        self.assertEqual(len(self.log.records), 0)
+
+    def test_transaction(self):
+        with transaction.atomic():
+            TSQueryModel.objects.create(title='hello uncommitted',
+                                        body='the crazy same')
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(TSQueryModel.objects.filter(
+                    tsvector__search='uncommitted').count(), 1)
+            self.log.flush()
+            # the EXPLAIN is executed in the other connection
+            self.assertEqual(len(queries), 1)
+            self.assertTrue(connection.in_atomic_block)
+            self.assertFalse(connection.needs_rollback)
+            self.assertEqual(TSQueryModel.objects.count(), 2)
+        self.assertEqual(len(self.log.records), 1)
+        self.assertNotIn('error', self.log.records[0])
+
+    def test_condense(self):
+        record = self.log.condense([{
+            'Plan': {
+                'Node Type': 'Bitmap Heap Scan',
+                'Relation Name': 'article',
+                'Shared Hit Blocks': 10,
+                'Shared Read Blocks': 5,
+                'Rows Removed by Index Recheck': 40,
+                'Exact Heap Blocks': 3,
+                'Lossy Heap Blocks': 7,
+                'Plans': [{
+                    'Node Type': 'Bitmap Index Scan',
+                    'Index Name': 'article_fts_index',
+                }],
+            },
+            'Planning Time': 0.1,
+            'Execution Time': 12.5,
+        }])
+        self.assertEqual(record['nodes'], [
+            'Bitmap Heap Scan on article',
+            'Bitmap Index Scan on article_fts_index'])
+        self.assertEqual(record['index_scans'], ['article_fts_index'])
+        self.assertEqual(record['seq_scans'], [])
+        self.assertEqual(record['rows_removed_by_recheck'], 40)
+        self.assertEqual(record['lossy_blocks'], 7)
+        self.assertEqual(record['shared_read'], 5)
+        self.assertEqual(record['execution_ms'], 12.5)
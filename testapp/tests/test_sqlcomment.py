@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from pg_fts.migrations import PgFtsSQL
+from pg_fts.ranks import FTSRank
+from pg_fts.sqlcomment import comment, parse_comments, tag
+from testapp.models import TSQueryModel, Related
+
+__all__ = ('SQLCommentTestCase', )
+
+
+class SQLCommentTestCase(TestCase):
+
+    def setUp(self):
+        TSQueryModel.objects.create(title='hello crazy world',
+                                    body='the crazy same')
+
+    def test_disabled(self):
+        self.assertEqual(comment(model='testapp.TSQueryModel'), '')
+        qs = TSQueryModel.objects.filter(tsvector__search='hello')
+        self.assertNotIn('/*', str(qs.query))
+        self.assertNotIn('/*', PgFtsSQL().update_vector(
+            TSQueryModel, TSQueryModel._meta.get_field('tsvector')))
+
+    def execute(self, qs):
+        with CaptureQueriesContext(connection) as queries:
+            list(qs)
+        return queries[-1]['sql']
+
+    @override_settings(PG_FTS_SQL_COMMENT=True)
+    def test_lookup(self):
+        sql = self.execute(TSQueryModel.objects.filter(
+            tsvector__search='hello'))
+        self.assertTrue(sql.endswith(
+            "@@ to_tsquery('english', 'hello') /*field='tsvector',"
+            "lookup='search',model='testapp.TSQueryModel'*/"))
+        sql = self.execute(Related.objects.filter(
+            single__tsvector__isearch='hello'))
+        self.assertTrue(sql.endswith(
+            " /*field='tsvector',lookup='isearch',"
+            "model='testapp.TSQueryModel'*/"))
+
+    @override_settings(PG_FTS_SQL_COMMENT=True)
+    def test_rank(self):
+        sql = self.execute(TSQueryModel.objects.annotate(
+            rank=FTSRank(tsvector__search='crazy')).order_by('-rank'))
+        self.assertIn(
+            "\"pg_fts_tsquery\".\"pg_fts_tsquery\") AS \"rank\"", sql)
+        # a single comment for the rank and the lookup
+        self.assertEqual(sql.count('/*'), 1)
+        self.assertTrue(sql.endswith(
+            "DESC /*field='tsvector',lookup='search',"
+            "model='testapp.TSQueryModel',rank='FTSRank'*/"))
+
+    @override_settings(PG_FTS_SQL_COMMENT=True)
+    def test_lookups(self):
+        sql = self.execute(TSQueryModel.objects.filter(
+            tsvector__search='hello', tsvector__isearch='crazy'))
+        self.assertEqual(sql.count('/*'), 1)
+        self.assertEqual(parse_comments(sql), {
+            'field': 'tsvector',
+            'lookup': 'search,isearch',
+            'model': 'testapp.TSQueryModel',
+        })
+
+    @override_settings(PG_FTS_SQL_COMMENT={'application': 'blog'})
+    def test_tag(self):
+        with tag("it's 100%"):
+            sql = self.execute(TSQueryModel.objects.filter(
+                tsvector__search='hello'))
+
+            @tag('view')
+            def view():
+                return comment(model='testapp.TSQueryModel')
+            self.assertIn("tag='view'", view())
+        self.assertNotIn('tag=', comment(model='testapp.TSQueryModel'))
+        self.assertIn("tag='it%27s%20100%25'", sql)
+        self.assertEqual(parse_comments(sql), {
+            'application': 'blog',
+            'field': 'tsvector',
+            'lookup': 'search',
+            'model': 'testapp.TSQueryModel',
+            'tag': "it's 100%",
+        })
+
+    @override_settings(PG_FTS_SQL_COMMENT=True)
+    def test_migrations(self):
+        sql_creator = PgFtsSQL()
+        field = TSQueryModel._meta.get_field('tsvector')
+        for action, sql in (
+                ('update_vector', sql_creator.update_vector(
+                    TSQueryModel, field)),
+                ('update_vector', sql_creator.update_vector_range(
+                    TSQueryModel, field)),
+                ('create_index', sql_creator.create_index(
+                    TSQueryModel, field, 'gin')),
+                ('delete_index', sql_creator.delete_index(
+                    TSQueryModel, field)),
+                ('create_trigger', sql_creator.create_fts_trigger(
+                    TSQueryModel, field)),
+                ('delete_trigger', sql_creator.delete_trigger(
+                    TSQueryModel, field))):
+            self.assertEqual(parse_comments(sql), {
+                'action': action,
+                'field': 'tsvector',
+                'model': 'testapp.TSQueryModel',
+            })
+        self.assertIn(
+            "BETWEEN %s AND %s /*action='update_vector'",
+            sql_creator.update_vector_range(TSQueryModel, field))